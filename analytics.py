@@ -0,0 +1,318 @@
+from sqlalchemy import func, insert, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+
+import models
+
+logger = logging.getLogger("sklep")
+
+# --- KONFIGURACJA ---
+STATUS_ANULOWANE = "Anulowane"
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+# Co ile sekund przyrosty z bufora procesu trafiają do tabel zbiorczych
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "5"))
+
+# Tabele zbiorcze: (model, kolumny klucza, kolumny sumowane)
+_DZIEN = (models.StatystykaDzienna, ["dzien"], ["liczba_zamowien", "przychod"])
+_PRODUKT = (models.SprzedazProduktuDzienna, ["dzien", "id_modelu"], ["sztuki", "przychod"])
+_KATEGORIA = (models.SprzedazKategoriiDzienna, ["dzien", "id_kategorii"], ["sztuki", "przychod"])
+_STATUS = (models.LicznikStatusow, ["status_zamowienia"], ["liczba"])
+
+
+def clamp_days(days) -> int:
+    if not days or days < 1:
+        return DEFAULT_DAYS
+    return min(days, MAX_DAYS)
+
+
+# --- AKTUALIZACJA PRZYROSTOWA ---
+
+def _add(db: Session, rollup, rows: list):
+    # "INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x" - jedno zapytanie (executemany)
+    # na tabelę, bez SELECT-a i bez wyścigu między workerami
+    if not rows:
+        return
+    model, keys, amounts = rollup
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={c: table.c[c] + stmt.excluded[c] for c in amounts},
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Inne bazy: UPDATE, a gdy wiersza nie ma - INSERT
+    for row in rows:
+        where = [table.c[k] == row[k] for k in keys]
+        result = db.execute(table.update().where(*where).values({c: table.c[c] + row[c] for c in amounts}))
+        if result.rowcount == 0:
+            db.execute(table.insert().values(row))
+
+
+class PendingRollups:
+    """Przyrosty tabel zbiorczych zebrane w pamięci procesu i zapisywane paczką co ANALYTICS_FLUSH_SECONDS.
+
+    Cztery dodatkowe UPSERT-y w transakcji zamówienia wydłużały trzymanie blokady zapisu
+    (SQLite ma jednego pisarza) - p95 checkoutu w benchmark.py rósł kilkukrotnie. Przyrosty są
+    addytywne, więc każdy worker może zapisywać swoje niezależnie. Odczyty dla paneli najpierw
+    opróżniają bufor swojego procesu; po awarii procesu brakujące przyrosty odtwarza backfill.
+    """
+
+    def __init__(self, flush_seconds: float = ANALYTICS_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._last_flush = time.monotonic()
+
+    def add(self, rollup, rows: list):
+        _, keys, amounts = rollup
+        with self._lock:
+            pending = self._rows.setdefault(rollup[0].__tablename__, (rollup, {}))[1]
+            for row in rows:
+                key = tuple(row[k] for k in keys)
+                current = pending.get(key)
+                if current is None:
+                    pending[key] = dict(row)
+                else:
+                    for c in amounts:
+                        current[c] += row[c]
+
+    def _take(self):
+        with self._lock:
+            rows, self._rows = self._rows, {}
+            self._last_flush = time.monotonic()
+            return rows
+
+    def flush(self, db: Session):
+        # Osobna, krótka transakcja - wołać po commit zamówienia albo przed odczytem
+        taken = self._take()
+        if not taken:
+            return
+        try:
+            for rollup, pending in taken.values():
+                _add(db, rollup, list(pending.values()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Nie gubimy przyrostów - wrócą do bufora i zapiszą się przy następnej okazji
+            for rollup, pending in taken.values():
+                self.add(rollup, list(pending.values()))
+            raise
+
+    def flush_if_due(self, db: Session, force: bool = False):
+        # Wołane po commit zamówienia - błąd zapisu statystyk nie może go cofnąć
+        if not force and time.monotonic() - self._last_flush < self.flush_seconds:
+            return
+        try:
+            self.flush(db)
+        except Exception:
+            logger.exception("Nie udało się zapisać przyrostów analityki (spróbujemy ponownie)")
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._rows)
+
+
+pending = PendingRollups()
+
+
+@atexit.register
+def _flush_on_exit():
+    if pending.has_pending():
+        from database import SessionLocal
+        with SessionLocal() as db:
+            pending.flush_if_due(db, force=True)
+
+
+def _sales_rows(dzien: date, lines, sign: int):
+    # lines: [(id_modelu, id_kategorii, ilosc, cena)] -> wiersze dla tabel produktów i kategorii
+    products, categories = {}, {}
+    for id_modelu, id_kategorii, qty, price in lines:
+        product = products.setdefault(id_modelu, {"dzien": dzien, "id_modelu": id_modelu, "id_kategorii": id_kategorii,
+                                                  "sztuki": 0, "przychod": 0.0})
+        product["sztuki"] += sign * qty
+        product["przychod"] += sign * qty * price
+        category = categories.setdefault(id_kategorii, {"dzien": dzien, "id_kategorii": id_kategorii,
+                                                        "sztuki": 0, "przychod": 0.0})
+        category["sztuki"] += sign * qty
+        category["przychod"] += sign * qty * price
+    return list(products.values()), list(categories.values())
+
+
+def _apply_sales(dzien: date, lines, sign: int):
+    products, categories = _sales_rows(dzien, lines, sign)
+    pending.add(_DZIEN, [{
+        "dzien": dzien,
+        "liczba_zamowien": sign,
+        "przychod": sum(p["przychod"] for p in products),
+    }])
+    pending.add(_PRODUKT, products)
+    pending.add(_KATEGORIA, categories)
+
+
+def record_order(dzien: date, status: str, lines):
+    """Nowe zamówienie (po commit): lines to [(id_modelu, id_kategorii, ilosc, cena_w_chwili_zakupu)]."""
+    if status != STATUS_ANULOWANE:
+        _apply_sales(dzien, lines, +1)
+    pending.add(_STATUS, [{"status_zamowienia": status, "liczba": 1}])
+
+
+def record_status_change(db: Session, order, old_status: str, new_status: str):
+    if old_status == new_status:
+        return
+    pending.add(_STATUS, [
+        {"status_zamowienia": old_status, "liczba": -1},
+        {"status_zamowienia": new_status, "liczba": 1},
+    ])
+
+    # Anulowanie zdejmuje zamówienie ze sprzedaży, przywrócenie - dodaje z powrotem
+    if (old_status == STATUS_ANULOWANE) == (new_status == STATUS_ANULOWANE):
+        return
+    lines = (
+        db.query(models.PozycjaZamowienia.id_modelu, models.ModelProduktu.id_kategorii,
+                 models.PozycjaZamowienia.ilosc, models.PozycjaZamowienia.cena_w_chwili_zakupu)
+        .join(models.ModelProduktu, models.ModelProduktu.id_modelu == models.PozycjaZamowienia.id_modelu)
+        .filter(models.PozycjaZamowienia.id_zamowienia == order.id_zamowienia)
+        .all()
+    )
+    sign = -1 if new_status == STATUS_ANULOWANE else +1
+    _apply_sales(order.data_zlozenia.date(), lines, sign)
+
+
+# --- PRZELICZENIE OD ZERA ---
+def backfill(db: Session):
+    """Odbudowuje tabele zbiorcze z pełnej historii zamówień (python analytics.py backfill)."""
+    # Przyrosty z bufora są już uwzględnione w zamówieniach, które zaraz przeliczymy
+    pending._take()
+    for model in (models.StatystykaDzienna, models.SprzedazProduktuDzienna,
+                  models.SprzedazKategoriiDzienna, models.LicznikStatusow):
+        db.execute(delete(model))
+
+    Z, P, M = models.Zamowienie, models.PozycjaZamowienia, models.ModelProduktu
+    dzien = func.date(Z.data_zlozenia)
+    sprzedane = Z.status_zamowienia != STATUS_ANULOWANE
+    przychod = func.sum(P.ilosc * P.cena_w_chwili_zakupu)
+
+    db.execute(insert(models.StatystykaDzienna).from_select(
+        ["dzien", "liczba_zamowien", "przychod"],
+        db.query(dzien, func.count(Z.id_zamowienia), func.sum(Z.suma_calkowita))
+        .filter(sprzedane).group_by(dzien).statement,
+    ))
+    db.execute(insert(models.SprzedazProduktuDzienna).from_select(
+        ["dzien", "id_modelu", "id_kategorii", "sztuki", "przychod"],
+        db.query(dzien, P.id_modelu, func.max(M.id_kategorii), func.sum(P.ilosc), przychod)
+        .join(P, P.id_zamowienia == Z.id_zamowienia).join(M, M.id_modelu == P.id_modelu)
+        .filter(sprzedane).group_by(dzien, P.id_modelu).statement,
+    ))
+    db.execute(insert(models.SprzedazKategoriiDzienna).from_select(
+        ["dzien", "id_kategorii", "sztuki", "przychod"],
+        db.query(dzien, M.id_kategorii, func.sum(P.ilosc), przychod)
+        .join(P, P.id_zamowienia == Z.id_zamowienia).join(M, M.id_modelu == P.id_modelu)
+        .filter(sprzedane).group_by(dzien, M.id_kategorii).statement,
+    ))
+    db.execute(insert(models.LicznikStatusow).from_select(
+        ["status_zamowienia", "liczba"],
+        db.query(Z.status_zamowienia, func.count(Z.id_zamowienia)).group_by(Z.status_zamowienia).statement,
+    ))
+    db.commit()
+
+
+# --- ODCZYT DLA PANELI ---
+# Każdy odczyt to jedno zapytanie po tabelach zbiorczych - liczba wierszy zależy od okna (dni),
+# a nie od liczby zamówień w historii.
+
+def _since(days: int) -> date:
+    return date.today() - timedelta(days=days - 1)
+
+
+def sales_per_day(db: Session, days: int) -> list:
+    since = _since(days)
+    rows = {
+        r.dzien: r for r in
+        db.query(models.StatystykaDzienna).filter(models.StatystykaDzienna.dzien >= since).all()
+    }
+    # Dni bez sprzedaży też są na wykresie (z zerami)
+    result = []
+    for offset in range(days):
+        dzien = since + timedelta(days=offset)
+        row = rows.get(dzien)
+        result.append({
+            "day": dzien.isoformat(),
+            "orders": row.liczba_zamowien if row else 0,
+            "revenue": round(row.przychod, 2) if row else 0.0,
+        })
+    return result
+
+
+def top_products(db: Session, days: int, limit: int = 10) -> list:
+    S, M = models.SprzedazProduktuDzienna, models.ModelProduktu
+    sztuki = func.sum(S.sztuki).label("sztuki")
+    przychod = func.sum(S.przychod).label("przychod")
+    rows = (
+        db.query(S.id_modelu, M.nazwa_modelu, M.stan_magazynowy, sztuki, przychod)
+        .join(M, M.id_modelu == S.id_modelu)
+        .filter(S.dzien >= _since(days))
+        .group_by(S.id_modelu, M.nazwa_modelu, M.stan_magazynowy)
+        .having(func.sum(S.sztuki) > 0)
+        .order_by(przychod.desc())
+        .limit(limit)
+        .all()
+    )
+    result = []
+    for r in rows:
+        stock = r.stan_magazynowy or 0
+        per_day = r.sztuki / days
+        result.append({
+            "id": r.id_modelu,
+            "name": r.nazwa_modelu,
+            "units": r.sztuki,
+            "revenue": round(r.przychod, 2),
+            "stock": stock,
+            # Rotacja zapasu: sprzedane w okresie / obecny stan; na ile dni starczy towaru przy tym tempie
+            "turnover": round(r.sztuki / stock, 2) if stock else None,
+            "days_of_stock": round(stock / per_day, 1) if per_day else None,
+        })
+    return result
+
+
+def sales_per_category(db: Session, days: int) -> list:
+    S, K = models.SprzedazKategoriiDzienna, models.Kategoria
+    przychod = func.sum(S.przychod).label("przychod")
+    rows = (
+        db.query(S.id_kategorii, K.nazwa_kategorii, func.sum(S.sztuki).label("sztuki"), przychod)
+        .join(K, K.id_kategorii == S.id_kategorii)
+        .filter(S.dzien >= _since(days))
+        .group_by(S.id_kategorii, K.nazwa_kategorii)
+        .order_by(przychod.desc())
+        .all()
+    )
+    return [{"id": r.id_kategorii, "name": r.nazwa_kategorii, "units": r.sztuki, "revenue": round(r.przychod, 2)}
+            for r in rows]
+
+
+def status_counts(db: Session) -> dict:
+    return {r.status_zamowienia: r.liczba for r in db.query(models.LicznikStatusow).all() if r.liczba}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("Użycie: python analytics.py backfill")
+    import migrate
+    from database import SessionLocal, engine
+    migrate.check(engine)
+    with SessionLocal() as session:
+        backfill(session)
+    print("Przeliczono tabele analityczne.")
@@ -0,0 +1,183 @@
+# Pliki statyczne z odciskiem treści w nazwie: w szablonach {{ asset('css/style.css') }}
+# daje /static/css/style.3f2a9c1b7e.css. Treść pod takim adresem nigdy się nie zmienia,
+# więc przeglądarka dostaje Cache-Control: immutable na rok i nie pyta serwera ponownie.
+#
+# Warianty skompresowane (.gz, a z pakietem brotli także .br) przygotowuje krok budowania:
+#   python assets.py compress
+# Serwowane są tylko wtedy, gdy są nowsze od źródła; bez nich pliki idą nieskompresowane.
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+from typing import Optional
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Rozszerzenia, które warto kompresować (obrazy i fonty są już skompresowane)
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".html", ".json", ".txt")
+_VARIANTS = {"br": ".br", "gzip": ".gz"}
+
+
+# --- KOMPRESJA (wspólna z pagecache) ---
+def compress(data: bytes) -> dict:
+    """{kodowanie: treść} - gzip zawsze, br gdy jest pakiet brotli."""
+    variants = {"gzip": gzip.compress(data, compresslevel=6, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=5)
+    return variants
+
+
+def pick_encoding(accept_encoding: str, available) -> Optional[str]:
+    # Brotli przed gzip; q=0 oznacza "nie akceptuję"
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip())
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in accepted:
+            return encoding
+    return None
+
+
+# --- MANIFEST ---
+_HASHED = re.compile(r"^(?P<base>.+)\.(?P<digest>[0-9a-f]{10})(?P<ext>\.[^./]+)$")
+
+
+def _hashed_name(path: str, digest: str) -> str:
+    base, ext = os.path.splitext(path)
+    return f"{base}.{digest}{ext}"
+
+
+class AssetManifest:
+    """Ścieżka pliku w static/ -> ścieżka z odciskiem treści (i odwrotnie).
+
+    Odcisk jest przeliczany, gdy zmieni się mtime lub rozmiar pliku (edycja CSS bez restartu
+    w trybie --reload). Stare odciski zostają w mapie, żeby otwarte strony nie dostały 404,
+    ale pod starą nazwą jest już inna treść - tej odpowiedzi nie wolno oznaczyć jako immutable.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static/"):
+        self.directory = directory
+        self.prefix = prefix
+        self._current = {}   # ścieżka -> (mtime, rozmiar, ścieżka z odciskiem)
+        self._originals = {}  # ścieżka z odciskiem -> ścieżka
+        self._lock = threading.Lock()
+
+    def hashed_path(self, path: str) -> Optional[str]:
+        full = os.path.join(self.directory, path)
+        try:
+            stat = os.stat(full)
+        except OSError:
+            return None
+        entry = self._current.get(path)
+        if entry is not None and entry[:2] == (stat.st_mtime, stat.st_size):
+            return entry[2]
+        with open(full, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:10]
+        hashed = _hashed_name(path, digest)
+        with self._lock:
+            self._current[path] = (stat.st_mtime, stat.st_size, hashed)
+            self._originals[hashed] = path
+        return hashed
+
+    def url(self, path: str) -> str:
+        # Nieznany plik: zwykły adres (StaticFiles zwróci 404 jak dotąd)
+        hashed = self.hashed_path(path)
+        return self.prefix + (hashed or path)
+
+    def original(self, hashed: str) -> Optional[str]:
+        # Tylko odcisk zgodny z bieżącą treścią pliku
+        known = self._originals.get(hashed)
+        if known is not None:
+            return known if self.hashed_path(known) == hashed else None
+        # Adres wyrenderowany przez inny worker (albo przed restartem) - sprawdzamy odcisk z nazwy
+        match = _HASHED.match(hashed)
+        if match is None:
+            return None
+        path = match["base"] + match["ext"]
+        return path if self.hashed_path(path) == hashed else None
+
+    def previous(self, hashed: str) -> Optional[str]:
+        # Odcisk wydany wcześniej przez ten proces dla pliku, który od tego czasu się zmienił
+        known = self._originals.get(hashed)
+        return known if known is not None and self.hashed_path(known) != hashed else None
+
+
+class HashedStaticFiles(StaticFiles):
+    """StaticFiles rozpoznające adresy z odciskiem: immutable + warianty .br/.gz."""
+
+    def __init__(self, *, manifest: AssetManifest, **kwargs):
+        super().__init__(**kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope):
+        hashed = path.replace(os.sep, "/")
+        original = self.manifest.original(hashed)
+        if original is None:
+            previous = self.manifest.previous(hashed)
+            if previous is None:
+                return await super().get_response(path, scope)
+            # Nieaktualny odcisk (otwarta strona sprzed zmiany pliku): bieżąca treść, ale bez immutable
+            response = await super().get_response(previous, scope)
+            if response.status_code in (200, 304):
+                response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        source = os.path.join(self.manifest.directory, original)
+        variants = {}
+        if original.endswith(COMPRESSIBLE):
+            for encoding, suffix in _VARIANTS.items():
+                try:
+                    if os.stat(source + suffix).st_mtime >= os.stat(source).st_mtime:
+                        variants[encoding] = source + suffix
+                except OSError:
+                    continue
+        encoding = pick_encoding(Headers(scope=scope).get("accept-encoding", ""), variants)
+
+        if encoding is not None:
+            response = FileResponse(
+                variants[encoding],
+                media_type=mimetypes.guess_type(original)[0] or "application/octet-stream",
+                headers={"Content-Encoding": encoding},
+            )
+        else:
+            response = await super().get_response(original, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE
+            if original.endswith(COMPRESSIBLE):
+                response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+def compress_directory(directory: str) -> int:
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            for encoding, content in compress(data).items():
+                with open(path + _VARIANTS[encoding], "wb") as f:
+                    f.write(content)
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["compress"]:
+        sys.exit("Użycie: python assets.py compress")
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    print(f"Zapisano wariantów: {compress_directory(directory)}" + ("" if brotli else " (bez .br - brak pakietu brotli)"))
@@ -0,0 +1,346 @@
+# Benchmark sklepu: zasiewa syntetyczną bazę, uruchamia prawdziwą aplikację FastAPI w procesie
+# (httpx + ASGITransport, bez sieci) z wieloma równoległymi klientami i mierzy każdy endpoint:
+# p50/p95/p99, przepustowość i liczbę zapytań SQL na request.
+#
+#   python benchmark.py                                   # domyślny zestaw, porównanie z benchmark_baseline.json
+#   python benchmark.py --products 50000 --orders 200000  # większy katalog / historia zamówień
+#   python benchmark.py --save-baseline                   # zapisz wyniki jako nowy punkt odniesienia
+#   python benchmark.py --database-url postgresql://... --reset
+#
+# Kod wyjścia 1 oznacza regresję względem zapisanych wyników (wolniejsze p95 albo więcej zapytań SQL).
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+BENCH_PASSWORD = "bench"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sklepu (endpointy sklepu, checkout, panele pracowników)")
+    parser.add_argument("--database-url", help="baza do zasiania (domyślnie świeży plik SQLite w katalogu tymczasowym)")
+    parser.add_argument("--reset", action="store_true", help="usuń i utwórz od nowa tabele w --database-url")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200, help="liczba requestów na scenariusz")
+    parser.add_argument("--concurrency", type=int, default=8, help="liczba równoległych klientów")
+    parser.add_argument("--warmup", type=int, default=5, help="requesty rozgrzewające (niemierzone) na scenariusz")
+    parser.add_argument("--only", help="lista scenariuszy oddzielona przecinkami")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", dest="json_path", help="zapisz wyniki do pliku JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="dopuszczalny wzrost p95 względem baseline (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+# --- DANE ---
+SLOWA = ["Ryzen", "GeForce", "Radeon", "Core", "SSD", "NVMe", "DDR5", "Monitor", "Klawiatura", "Mysz",
+         "Zasilacz", "Obudowa", "Chłodzenie", "Płyta", "Router", "Dysk", "Laptop", "Słuchawki"]
+
+
+def seed_database(engine, args, rng):
+    # Wstawiamy przez Core w paczkach - ORM byłby tu wąskim gardłem, nie aplikacja
+    from sqlalchemy import insert
+    import models
+    from order_feed import STATUSY_ZAMOWIEN
+    import passwords
+
+    batch = 5000
+    # Jeden skrót dla wszystkich kont - liczenie scrypta osobno dla każdego klienta trwałoby minuty
+    bench_hash = passwords.hash_password(BENCH_PASSWORD)
+
+    def insert_all(model, rows):
+        with engine.begin() as conn:
+            for start in range(0, len(rows), batch):
+                conn.execute(insert(model), rows[start:start + batch])
+
+    insert_all(models.Rola, [
+        {"id_roli": 1, "nazwa_roli": "Administrator"},
+        {"id_roli": 2, "nazwa_roli": "Sprzedawca"},
+        {"id_roli": 3, "nazwa_roli": "Magazynier"},
+    ])
+    insert_all(models.Pracownik, [
+        {"login": login, "haslo_hash": bench_hash, "imie": login, "nazwisko": "Bench", "id_roli": rola}
+        for login, rola in [("bench_admin", 1), ("bench_sprzedawca", 2), ("bench_magazynier", 3)]
+    ])
+    insert_all(models.Kategoria, [
+        {"id_kategorii": k, "nazwa_kategorii": f"Kategoria {k}", "opis_kategorii": f"Opis kategorii {k}"}
+        for k in range(1, args.categories + 1)
+    ])
+    products = []
+    for p in range(1, args.products + 1):
+        slowa = rng.sample(SLOWA, 3)
+        products.append({
+            "id_modelu": p,
+            "nazwa_modelu": f"{slowa[0]} {slowa[1]} {p}",
+            "opis": f"{slowa[2]} - produkt testowy numer {p}",
+            "cena_katalogowa": round(rng.uniform(9.99, 9999.0), 2),
+            "stan_magazynowy": 10 ** 6,
+            "id_kategorii": rng.randint(1, args.categories),
+        })
+    insert_all(models.ModelProduktu, products)
+    insert_all(models.Klient, [
+        {"id_klienta": k, "imie": "Klient", "nazwisko": str(k), "adres_email": f"bench{k}@sklep.test",
+         "haslo_hash": bench_hash, "data_rejestracji": datetime(2024, 1, 1)}
+        for k in range(1, args.clients + 1)
+    ])
+
+    now = datetime.now()
+    adresy, zamowienia, pozycje = [], [], []
+    for z in range(1, args.orders + 1):
+        data = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        linie = [(rng.randint(1, args.products), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+        adresy.append({"id_adresu": z, "ulica": "Testowa", "nr_domu": str(z % 200 + 1),
+                       "kod_pocztowy": "00-001", "miejscowosc": "Warszawa"})
+        zamowienia.append({
+            "id_zamowienia": z,
+            "numer_zamowienia": f"ZAM-{data:%Y%m%d}-B{z:07d}",
+            "data_zlozenia": data,
+            "status_zamowienia": rng.choice(STATUSY_ZAMOWIEN),
+            "suma_calkowita": 0.0,
+            "id_klienta": rng.randint(1, args.clients),
+            "id_adresu": z,
+        })
+        for pid, qty in linie:
+            pozycje.append({"ilosc": qty, "cena_w_chwili_zakupu": products[pid - 1]["cena_katalogowa"],
+                            "id_modelu": pid, "id_zamowienia": z})
+            zamowienia[-1]["suma_calkowita"] += products[pid - 1]["cena_katalogowa"] * qty
+    insert_all(models.Adres, adresy)
+    insert_all(models.Zamowienie, zamowienia)
+    insert_all(models.PozycjaZamowienia, pozycje)
+
+
+# --- SCENARIUSZE ---
+# (nazwa, kto jest zalogowany, funkcja losująca request: rng, args -> (metoda, ścieżka, dane formularza))
+def _checkout(rng, args):
+    cart = [{"id": rng.randint(1, args.products), "qty": 1} for _ in range(rng.randint(1, 3))]
+    return "POST", "/order/submit", {
+        "ulica": "Testowa", "nr_domu": "1", "kod_pocztowy": "00-001", "miejscowosc": "Warszawa",
+        "cart_json": json.dumps(cart),
+    }
+
+
+SCENARIOS = [
+    ("home", None, lambda rng, args: ("GET", "/", None)),
+    ("home_sorted_page", None, lambda rng, args: ("GET", f"/?sort={rng.choice('1234')}&page={rng.randint(1, 10)}", None)),
+    ("home_category", None, lambda rng, args: ("GET", f"/?category_id={rng.randint(1, args.categories)}&price_max=5000", None)),
+    ("home_search", None, lambda rng, args: ("GET", f"/?search={rng.choice(SLOWA)}", None)),
+    ("search_suggest", None, lambda rng, args: ("GET", f"/api/search/suggest?q={rng.choice(SLOWA)[:3]}", None)),
+    ("product_details", None, lambda rng, args: ("GET", f"/szczegoly.html?id={rng.randint(1, args.products)}", None)),
+    ("cart_details", None, lambda rng, args: (
+        "GET", "/api/products-details?ids=" + ",".join(str(rng.randint(1, args.products)) for _ in range(10)), None)),
+    ("login", None, lambda rng, args: ("POST", "/login", {
+        "identyfikator": f"bench{rng.randint(1, args.clients)}@sklep.test", "password": BENCH_PASSWORD})),
+    ("cart_page", "klient", lambda rng, args: ("GET", "/koszyk.html", None)),
+    ("checkout_page", "klient", lambda rng, args: ("GET", "/podsumowanie", None)),
+    ("submit_order", "klient", _checkout),
+    ("account", "klient", lambda rng, args: ("GET", "/konto.html", None)),
+    ("admin_panel", "bench_admin", lambda rng, args: ("GET", "/admin.html", None)),
+    ("seller_panel", "bench_sprzedawca", lambda rng, args: ("GET", "/sprzedawca.html", None)),
+    ("warehouse_panel", "bench_magazynier", lambda rng, args: ("GET", "/magazynier.html", None)),
+    ("orders_feed", "bench_sprzedawca", lambda rng, args: ("GET", "/api/orders?status=Nowe", None)),
+    ("analytics", "bench_sprzedawca", lambda rng, args: ("GET", f"/api/analytics/products?days={rng.choice((7, 30, 365))}", None)),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def _login(client, who, rng, args):
+    if who is None:
+        return
+    identyfikator = f"bench{rng.randint(1, args.clients)}@sklep.test" if who == "klient" else who
+    response = await client.post("/login", data={"identyfikator": identyfikator, "password": BENCH_PASSWORD})
+    if response.status_code != 303:
+        raise RuntimeError(f"Logowanie {identyfikator} nie powiodło się ({response.status_code})")
+
+
+async def run_scenario(app, name, who, make_request, args):
+    import httpx
+    import querybudget
+
+    latencies, sql_counts, errors = [], [], 0
+    remaining = args.requests
+    ready = 0
+    wall_started = 0.0
+    # Pomiar rusza dopiero, gdy wszyscy klienci są zalogowani i rozgrzani
+    start = asyncio.Event()
+
+    async def worker(worker_id):
+        nonlocal remaining, errors, ready, wall_started
+        rng = random.Random(f"{args.seed}-{name}-{worker_id}")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await _login(client, who, rng, args)
+            for _ in range(args.warmup):
+                method, path, data = make_request(rng, args)
+                await client.request(method, path, data=data)
+
+            ready += 1
+            if ready == args.concurrency:
+                wall_started = time.perf_counter()
+                start.set()
+            await start.wait()
+            while remaining > 0:
+                remaining -= 1
+                method, path, data = make_request(rng, args)
+                with querybudget.count_statements() as counter:
+                    started = time.perf_counter()
+                    response = await client.request(method, path, data=data)
+                    elapsed = time.perf_counter() - started
+                # Formularze POST w tej aplikacji kończą się przekierowaniem 303 - inna odpowiedź
+                # (np. 200 z komunikatem "Wystąpił błąd") też jest błędem
+                if response.status_code >= 400 or (method == "POST" and response.status_code != 303):
+                    errors += 1
+                latencies.append(elapsed * 1000)
+                sql_counts.append(counter.count)
+
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    wall = time.perf_counter() - wall_started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "rps": round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+        "sql_mean": round(sum(sql_counts) / len(sql_counts), 2) if sql_counts else 0.0,
+        "sql_max": max(sql_counts, default=0),
+    }
+
+
+# --- RAPORT I BASELINE ---
+def print_report(results):
+    header = f"{'scenariusz':<18} {'req':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'SQL śr':>7} {'SQL max':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<18} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['rps']:>8.1f} {r['sql_mean']:>7.2f} {r['sql_max']:>7}")
+
+
+def benchmark_params(args, db_async):
+    params = {key: getattr(args, key) for key in ("categories", "products", "clients", "orders", "concurrency")}
+    params["db_async"] = db_async
+    return params
+
+
+def compare_with_baseline(results, baseline, params, args):
+    # Zwraca listę regresji albo None, gdy wyniki nie są porównywalne (inny rozmiar danych / tryb bazy)
+    if baseline.get("params") != params:
+        print(f"\nBaseline zmierzony dla innych parametrów ({baseline.get('params')}) - pomijam porównanie.")
+        return None
+
+    regressions = []
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        # +1 ms luzu, żeby szum przy bardzo szybkich endpointach nie dawał fałszywych alarmów
+        if r["p95_ms"] > base["p95_ms"] * (1 + args.tolerance) + 1.0:
+            regressions.append(f"{name}: p95 {r['p95_ms']} ms (baseline {base['p95_ms']} ms)")
+        if r["sql_max"] > base["sql_max"]:
+            regressions.append(f"{name}: {r['sql_max']} zapytań SQL (baseline {base['sql_max']})")
+        if r["errors"] > base["errors"]:
+            regressions.append(f"{name}: {r['errors']} błędów (baseline {base['errors']})")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    # DATABASE_URL musi być ustawiony przed importem aplikacji - database.py czyta go przy imporcie
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        db_path = os.path.join(tempfile.gettempdir(), "sklep_benchmark.db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    # Wszyscy klienci scenariusza logują się naraz na to samo konto pracownika, a każda próba
+    # w toku liczy się do limitu logowań (passwords.LoginRateLimiter.reserve)
+    os.environ.setdefault("LOGIN_MAX_FAILURES", "1000")
+
+    # Szablony i pliki statyczne są podawane względem katalogu projektu
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    import database
+    import models
+    import migrate
+    import catalog
+    import analytics
+
+    if args.database_url and args.reset:
+        # Razem z tabelami znika schemat_wersja - migracje przejdą od początku
+        models.Base.metadata.drop_all(bind=database.engine)
+    migrate.upgrade(database.engine)
+
+    import main as app_module
+
+    with database.SessionLocal() as db:
+        if db.query(models.ModelProduktu).count():
+            sys.exit("Baza nie jest pusta - użyj --reset, żeby ją wyczyścić.")
+
+    started = time.perf_counter()
+    seed_database(database.engine, args, rng)
+    with database.SessionLocal() as db:
+        analytics.backfill(db)
+    catalog.cache.invalidate()
+    print(f"Zasiano bazę ({os.environ['DATABASE_URL']}) w {time.perf_counter() - started:.1f} s: "
+          f"{args.categories} kategorii, {args.products} produktów, {args.clients} klientów, {args.orders} zamówień\n")
+
+    wanted = set(args.only.split(",")) if args.only else None
+    results = {}
+    for name, who, make_request in SCENARIOS:
+        if wanted is not None and name not in wanted:
+            continue
+        results[name] = asyncio.run(run_scenario(app_module.app, name, who, make_request, args))
+
+    print_report(results)
+
+    params = benchmark_params(args, database.DB_ASYNC)
+    report = {"params": params, "results": results}
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nZapisano baseline: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f), params, args)
+        if regressions:
+            print("\nREGRESJE:")
+            for line in regressions:
+                print(f"- {line}")
+            return 1
+        if regressions is not None:
+            print("\nBrak regresji względem baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+from dataclasses import dataclass, field, replace
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+import json
+import os
+import threading
+import time
+import uuid
+
+import database
+import models
+import pagination
+import facets
+
+# --- KONFIGURACJA ---
+# Po ilu sekundach snapshot jest przeładowywany z bazy (zmiany z innych workerów)
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+# Powyżej tej liczby produktów nie trzymamy katalogu w pamięci - czytamy z bazy
+CATALOG_CACHE_MAX_PRODUCTS = int(os.getenv("CATALOG_CACHE_MAX_PRODUCTS", "50000"))
+
+
+# Wersje katalogu są lokalne dla procesu - token wersji zawiera identyfikator procesu,
+# żeby token z innego workera nigdy nie został uznany za aktualny
+BOOT_ID = uuid.uuid4().hex[:8]
+
+# Limit pozycji w jednym zapytaniu o szczegóły koszyka
+MAX_CART_IDS = 100
+
+
+def normalize_ids(ids) -> list:
+    # Usuwa duplikaty (zachowując kolejność) i przycina listę do MAX_CART_IDS
+    return list(dict.fromkeys(int(i) for i in ids))[:MAX_CART_IDS]
+
+
+def product_summary(p) -> dict:
+    # Skrócony opis produktu dla koszyka i podsumowania zamówienia
+    return {
+        "id": p.id_modelu,
+        "name": p.nazwa_modelu,
+        "price": p.cena_katalogowa,
+        "image": p.zdjecie_url,
+        "stock": p.stan_magazynowy
+    }
+
+
+# Niemutowalne kopie wierszy - szablony czytają te same atrybuty co z modeli ORM
+@dataclass(frozen=True)
+class ProduktSnapshot:
+    id_modelu: int
+    nazwa_modelu: str
+    opis: Optional[str]
+    cena_katalogowa: float
+    zdjecie_url: Optional[str]
+    stan_magazynowy: int
+    id_kategorii: int
+
+
+@dataclass(frozen=True)
+class KategoriaSnapshot:
+    id_kategorii: int
+    nazwa_kategorii: str
+    opis_kategorii: Optional[str]
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    loaded_at: float
+    products: Tuple[ProduktSnapshot, ...]
+    categories: Tuple[KategoriaSnapshot, ...]
+    # Wersja, z którą snapshot został wczytany z bazy, i wersje produktów załatanych później
+    base_version: int = 0
+    product_versions: dict = field(default_factory=dict)
+    # Liczniki nawigacji fasetowej (facets.FacetIndex) - budowane przy wczytaniu, potem łatane
+    facet_index: Optional[facets.FacetIndex] = field(default=None, compare=False, repr=False)
+    # Posortowane kopie produktów per tryb ?sort= (i indeks po id) - liczone leniwie, raz na snapshot
+    _sorted: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def sorted_products(self, sort) -> Tuple[ProduktSnapshot, ...]:
+        mode = pagination.sort_mode(sort)
+        ordered = self._sorted.get(mode)
+        if ordered is None:
+            key, descending = pagination.sort_key(sort)
+            ordered = tuple(sorted(self.products, key=key, reverse=descending))
+            self._sorted[mode] = ordered
+        return ordered
+
+    def list_products(self, category_id=None, price_min=None, price_max=None, product_ids=None,
+                      sort=None, by_relevance=False) -> list:
+        # product_ids: wynik wyszukiwarki (od najtrafniejszego); by_relevance zachowuje tę kolejność
+        if product_ids is not None and by_relevance:
+            by_id = self.products_by_id()
+            products = [by_id[pid] for pid in product_ids if pid in by_id]
+        else:
+            # Filtrowanie zachowuje kolejność, więc sortujemy tylko raz na snapshot
+            products = self.sorted_products(sort)
+            if product_ids is not None:
+                wanted = set(product_ids)
+                products = [p for p in products if p.id_modelu in wanted]
+
+        if category_id:
+            products = [p for p in products if p.id_kategorii == category_id]
+        if price_min is not None:
+            products = [p for p in products if p.cena_katalogowa >= price_min]
+        if price_max is not None:
+            products = [p for p in products if p.cena_katalogowa <= price_max]
+
+        return list(products)
+
+    @property
+    def version_token(self) -> str:
+        return f"{BOOT_ID}.{self.version}"
+
+    def changed_ids(self, ids, since_token: str) -> list:
+        # Które z ids zmieniły się po wersji since_token (nieznany token = wszystkie)
+        boot_id, _, since = (since_token or "").partition(".")
+        if boot_id != BOOT_ID or not since.isdigit() or int(since) < self.base_version:
+            return list(ids)
+        since = int(since)
+        return [pid for pid in ids if self.product_versions.get(pid, self.base_version) > since]
+
+    def summary_json(self, product_id: int) -> Optional[str]:
+        # Zakodowany JSON skrótu produktu - liczony raz na snapshot, None gdy produktu nie ma
+        summaries = self._sorted.setdefault("summary_json", {})
+        if product_id not in summaries:
+            product = self.products_by_id().get(product_id)
+            summaries[product_id] = json.dumps(product_summary(product)) if product else None
+        return summaries[product_id]
+
+    def facets(self, category_id=None, price_min=None, price_max=None) -> facets.Facets:
+        return self.facet_index.facets(category_id, price_min, price_max)
+
+    def products_by_id(self) -> dict:
+        by_id = self._sorted.get("by_id")
+        if by_id is None:
+            by_id = {p.id_modelu: p for p in self.products}
+            self._sorted["by_id"] = by_id
+        return by_id
+
+
+def _product_from_row(p) -> ProduktSnapshot:
+    return ProduktSnapshot(
+        id_modelu=p.id_modelu,
+        nazwa_modelu=p.nazwa_modelu,
+        opis=p.opis,
+        cena_katalogowa=p.cena_katalogowa,
+        zdjecie_url=p.zdjecie_url,
+        stan_magazynowy=p.stan_magazynowy if p.stan_magazynowy is not None else 0,
+        id_kategorii=p.id_kategorii,
+    )
+
+
+class CatalogCache:
+    """Wersjonowany snapshot katalogu (produkty + kategorie) trzymany w pamięci procesu.
+
+    Odczyty nie biorą blokady - snapshot jest niemutowalny i podmieniany w całości.
+    Endpointy zmieniające katalog łatają snapshot (patch_product, patch_products)
+    albo go unieważniają (invalidate).
+    """
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, max_products: int = CATALOG_CACHE_MAX_PRODUCTS):
+        self.ttl = ttl
+        self.max_products = max_products
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    def _is_fresh(self, snap: Optional[CatalogSnapshot]) -> bool:
+        return snap is not None and time.monotonic() - snap.loaded_at < self.ttl
+
+    def fresh_version(self) -> Optional[int]:
+        # Wersja aktualnego snapshotu bez dotykania bazy; None, gdy snapshotu nie ma albo trzeba
+        # go przeładować (wtedy odpowiedzi zależnych od katalogu nie wolno brać z cache)
+        snap = self._snapshot
+        return snap.version if self._is_fresh(snap) else None
+
+    def get(self, db: Session) -> Optional[CatalogSnapshot]:
+        # Zwraca None, gdy katalog jest za duży, żeby go trzymać w pamięci
+        snap = self._snapshot
+        if self._is_fresh(snap):
+            return snap
+
+        # Zapytania wykonujemy BEZ blokady: w trybie DB_ASYNC request czeka na bazę
+        # w greenlecie na wątku pętli zdarzeń, a trzymany wtedy threading.Lock
+        # zablokowałby wszystkie inne requesty na tej pętli.
+        version_before = self._version
+
+        # Snapshot łatają potem zapisy tego procesu, więc musi zawierać wszystkie wcześniejsze -
+        # ładujemy go z bazy głównej, nawet gdy request czyta z repliki
+        with database.primary_session(db) as source:
+            product_count = source.query(models.ModelProduktu).count()
+            if product_count > self.max_products:
+                with self._lock:
+                    self._snapshot = None
+                return None
+
+            categories = source.query(models.Kategoria).order_by(models.Kategoria.id_kategorii).all()
+            products = source.query(models.ModelProduktu).all()
+
+        with self._lock:
+            if self._version != version_before:
+                # W trakcie ładowania ktoś zmienił katalog - ten snapshot może być nieaktualny,
+                # więc służy tylko bieżącemu requestowi. Kolejny przeładuje katalog od nowa.
+                version = self._version
+                store = False
+            else:
+                version = self._next_version()
+                store = True
+            snapshot_products = tuple(_product_from_row(p) for p in products)
+            snap = CatalogSnapshot(
+                version=version,
+                base_version=version,
+                loaded_at=time.monotonic(),
+                products=snapshot_products,
+                facet_index=facets.FacetIndex.build(snapshot_products),
+                categories=tuple(
+                    KategoriaSnapshot(c.id_kategorii, c.nazwa_kategorii, c.opis_kategorii) for c in categories
+                ),
+            )
+            if store:
+                self._snapshot = snap
+            return snap
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._next_version()
+
+    def _swap_products(self, changes, added=(), removed=()):
+        # changes: {id_modelu: funkcja(ProduktSnapshot) -> ProduktSnapshot}
+        # added: nowe ProduktSnapshot, removed: id usuniętych produktów
+        with self._lock:
+            snap = self._snapshot
+            if snap is None:
+                self._next_version()
+                return
+            # Snapshot wczytany tuż po commit może już mieć "nowy" produkt - wtedy to zwykła podmiana
+            present = {p.id_modelu for p in added} & snap.products_by_id().keys()
+            if present:
+                changes = {**changes, **{p.id_modelu: (lambda _, n=p: n) for p in added if p.id_modelu in present}}
+                added = [p for p in added if p.id_modelu not in present]
+            old, new, products = [], list(added), []
+            for p in snap.products:
+                if p.id_modelu in removed:
+                    old.append(p)
+                elif p.id_modelu in changes:
+                    changed = changes[p.id_modelu](p)
+                    products.append(changed)
+                    old.append(p)
+                    new.append(changed)
+                else:
+                    products.append(p)
+            products.extend(added)
+            version = self._next_version()
+            product_versions = dict(snap.product_versions)
+            product_versions.update({pid: version for pid in changes})
+            product_versions.update({p.id_modelu: version for p in added})
+            product_versions.update({pid: version for pid in removed})
+            self._snapshot = replace(snap, version=version, products=tuple(products),
+                                     product_versions=product_versions, _sorted={},
+                                     facet_index=snap.facet_index.updated(old, new))
+
+    def add_product(self, row):
+        # Nowy wiersz ModelProduktu (po commit)
+        self._swap_products({}, added=(_product_from_row(row),))
+
+    def remove_product(self, product_id: int):
+        self._swap_products({}, removed={product_id})
+
+    def patch_product(self, product_id: int, **fields):
+        self._swap_products({product_id: lambda p: replace(p, **fields)})
+
+    def patch_products(self, changes: dict):
+        # changes: {id_modelu: {pole: nowa wartość}} - wiele produktów jedną podmianą snapshotu
+        self._swap_products({
+            pid: (lambda p, f=fields: replace(p, **f))
+            for pid, fields in changes.items()
+        })
+
+
+cache = CatalogCache()
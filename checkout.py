@@ -0,0 +1,243 @@
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+import models
+import catalog
+import analytics
+import jobs
+import events
+import order_numbers
+
+
+class CheckoutError(Exception):
+    # Błąd biznesowy składania zamówienia (pusty koszyk, brak towaru itp.)
+    pass
+
+
+# Kolumny Integer na PostgreSQL są 32-bitowe - większe id/ilość i tak nie przeszłyby przez bazę
+_MAX_INT = 2 ** 31 - 1
+
+
+def _cart_int(raw) -> int:
+    # Liczba całkowita z JSON (2 albo 2.0) albo napis ("2"); true, 2.5, null to błąd
+    if isinstance(raw, bool) or not isinstance(raw, (int, float, str)):
+        raise ValueError(raw)
+    value = int(raw.strip()) if isinstance(raw, str) else int(raw)
+    if not isinstance(raw, str) and value != raw:
+        raise ValueError(raw)
+    if not 0 < value <= _MAX_INT:
+        raise ValueError(raw)
+    return value
+
+
+def _merge_cart(cart_items):
+    # Sklejamy powtórzone pozycje koszyka: {id_modelu: ilosc}.
+    # Koszyk przychodzi z przeglądarki (localStorage) - zły format to błąd użytkownika, nie wyjątek serwera.
+    if not isinstance(cart_items, list):
+        raise CheckoutError("Nieprawidłowa zawartość koszyka. Odśwież koszyk.")
+    merged = {}
+    for item in cart_items:
+        if not isinstance(item, dict):
+            raise CheckoutError("Nieprawidłowa zawartość koszyka. Odśwież koszyk.")
+        try:
+            pid = _cart_int(item.get('id'))
+        except (ValueError, OverflowError):
+            raise CheckoutError("Nieprawidłowy produkt w koszyku. Odśwież koszyk.")
+        try:
+            qty = _cart_int(item.get('qty'))
+        except (ValueError, OverflowError):
+            raise CheckoutError("Nieprawidłowa ilość produktu w koszyku.")
+        merged[pid] = merged.get(pid, 0) + qty
+    return merged
+
+
+# Warunkowa dekrementacja stanu - jeden UPDATE na pozycję, wysłany jako executemany.
+# WHERE stan_magazynowy >= ilosc sprawia, że dwa równoległe zamówienia nie zejdą poniżej zera.
+_tabela_produktow = models.ModelProduktu.__table__
+_zdejmij_ze_stanu = (
+    _tabela_produktow.update()
+    .where(_tabela_produktow.c.id_modelu == bindparam("b_id"))
+    .where(_tabela_produktow.c.stan_magazynowy >= bindparam("b_qty"))
+    .values(stan_magazynowy=_tabela_produktow.c.stan_magazynowy - bindparam("b_qty"))
+)
+
+
+def place_order(db: Session, klient, adres_data: dict, cart_items: list) -> int:
+    """Składa zamówienie w jednej transakcji (jeden SELECT produktów, jeden commit). Zwraca id zamówienia."""
+    quantities = _merge_cart(cart_items)
+    if not quantities:
+        raise CheckoutError("Twój koszyk jest pusty.")
+
+    # 0. Numer zamówienia - zwykle z bloku w pamięci workera, bez zapytania. Przed pierwszym
+    # zapisem w tej sesji: po wyczerpaniu bloku rezerwacja idzie osobnym połączeniem.
+    now = datetime.now()
+    numer = order_numbers.allocator.next_number(db.get_bind(), now)
+
+    # 1. Wszystkie produkty z koszyka jednym zapytaniem IN (...).
+    # Na PostgreSQL wiersze są blokowane (SELECT ... FOR UPDATE), w kolejności id, żeby uniknąć deadlocków.
+    # SQLite nie zna FOR UPDATE - tam chroni nas warunkowy UPDATE poniżej.
+    products = (
+        db.query(models.ModelProduktu)
+        .filter(models.ModelProduktu.id_modelu.in_(quantities.keys()))
+        .order_by(models.ModelProduktu.id_modelu)
+        .with_for_update(of=models.ModelProduktu)
+        .all()
+    )
+
+    # Produkty, których już nie ma w bazie, pomijamy (jak wcześniej)
+    order_lines = []
+    suma_calkowita = 0.0
+    for prod in products:
+        qty = quantities[prod.id_modelu]
+        if (prod.stan_magazynowy or 0) < qty:
+            raise CheckoutError(f"Brak wystarczającej ilości produktu: {prod.nazwa_modelu}")
+        suma_calkowita += prod.cena_katalogowa * qty
+        order_lines.append((prod, qty))
+
+    if not order_lines:
+        raise CheckoutError("Twój koszyk jest pusty.")
+
+    # 2. Stan magazynowy - atomowo, bez read-modify-write na obiektach ORM
+    result = db.execute(
+        _zdejmij_ze_stanu,
+        [{"b_id": prod.id_modelu, "b_qty": qty} for prod, qty in order_lines],
+    )
+    if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(order_lines):
+        # Ktoś inny wykupił towar między SELECT-em a UPDATE-em
+        raise CheckoutError("Część produktów została właśnie wyprzedana. Odśwież koszyk.")
+
+    # 3. Adres i zamówienie (flush zamiast commit - potrzebujemy tylko kluczy)
+    new_adres = models.Adres(**adres_data)
+    db.add(new_adres)
+    db.flush()
+
+    new_order = models.Zamowienie(
+        numer_zamowienia=numer,
+        data_zlozenia=now,
+        status_zamowienia="Nowe",
+        suma_calkowita=suma_calkowita,
+        id_klienta=klient.id_klienta,
+        id_adresu=new_adres.id_adresu,
+        email_kontakt_do_zam=klient.adres_email
+    )
+    db.add(new_order)
+    db.flush()
+
+    # 4. Pozycje zamówienia - jeden INSERT wielowierszowy
+    db.execute(insert(models.PozycjaZamowienia), [
+        {
+            "ilosc": qty,
+            "cena_w_chwili_zakupu": prod.cena_katalogowa,
+            "id_modelu": prod.id_modelu,
+            "id_zamowienia": new_order.id_zamowienia,
+        }
+        for prod, qty in order_lines
+    ])
+
+    # 5. Mail z potwierdzeniem wysyła worker kolejki (jobs.py) - request tylko zapisuje zadanie
+    jobs.enqueue(db, "mail_potwierdzenie_zamowienia", id_zamowienia=new_order.id_zamowienia)
+
+    # Wartości potrzebne po commit odczytujemy przed nim - commit wygasza obiekty ORM
+    # i każdy odczyt atrybutu robiłby osobny SELECT
+    order_id = new_order.id_zamowienia
+    sales_lines = [(prod.id_modelu, prod.id_kategorii, qty, prod.cena_katalogowa) for prod, qty in order_lines]
+    # Nowe stany - odczyt po UPDATE, jeszcze pod blokadą, więc dokładny także przy równoległych
+    # zamówieniach. Snapshot katalogu dostaje wartości bezwzględne: gdyby przeładował się między
+    # commit a łataniem, zmiana względna zdjęłaby zamówione sztuki drugi raz.
+    new_stock = dict(db.execute(
+        select(_tabela_produktow.c.id_modelu, _tabela_produktow.c.stan_magazynowy)
+        .where(_tabela_produktow.c.id_modelu.in_([prod.id_modelu for prod, _ in order_lines]))
+    ).all())
+
+    db.commit()
+
+    # Snapshot katalogu na stronie głównej musi widzieć nowe stany
+    stock_patches = {pid: {"stan_magazynowy": stan} for pid, stan in new_stock.items()}
+    catalog.cache.patch_products(stock_patches)
+    events.publish_products(stock_patches)
+    events.publish_order(order_id, numer, "Nowe", klient.id_klienta)
+    # Statystyki sprzedaży - poza transakcją zamówienia, zapisywane paczkami (analytics.PendingRollups)
+    analytics.record_order(now.date(), "Nowe", sales_lines)
+    analytics.pending.flush_if_due(db)
+    return order_id
+
+
+# --- SPRAWDZENIE: RÓWNOLEGŁE ZAMÓWIENIA NIE WYPRZEDAJĄ PONIŻEJ STANU (python checkout.py check) ---
+def check(bind, threads: int, stock: int) -> int:
+    """Składa `threads` zamówień naraz na 1 szt. produktu ze stanem `stock`; zwraca liczbę złożonych."""
+    import threading
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy.orm import sessionmaker
+
+    make_session = sessionmaker(bind=bind, autoflush=False)
+    with make_session() as db:
+        kategoria = models.Kategoria(nazwa_kategorii="check")
+        db.add(kategoria)
+        db.flush()
+        produkt = models.ModelProduktu(nazwa_modelu="check", cena_katalogowa=1.0, stan_magazynowy=stock,
+                                       id_kategorii=kategoria.id_kategorii)
+        klient = models.Klient(imie="check", nazwisko="check", haslo_hash="-",
+                               adres_email=f"check-{uuid.uuid4().hex[:12]}@example.invalid")
+        db.add_all([produkt, klient])
+        db.commit()
+        product_id, client_id = produkt.id_modelu, klient.id_klienta
+
+    adres = {"ulica": "check", "nr_domu": "1", "kod_pocztowy": "00-000", "miejscowosc": "check"}
+    start = threading.Barrier(threads)
+
+    def buy(_) -> bool:
+        start.wait()
+        with make_session() as db:
+            klient = db.get(models.Klient, client_id)
+            try:
+                place_order(db, klient, adres, [{"id": product_id, "qty": 1}])
+                return True
+            except CheckoutError:
+                db.rollback()
+                return False
+
+    with ThreadPoolExecutor(threads) as pool:
+        placed = sum(pool.map(buy, range(threads)))
+
+    with make_session() as db:
+        left = db.get(models.ModelProduktu, product_id).stan_magazynowy
+        orders = db.query(models.Zamowienie).filter(models.Zamowienie.id_klienta == client_id).count()
+        # Statystyki sprzedaży do tej samej bazy - inaczej zapisałby je atexit do DATABASE_URL
+        analytics.pending.flush_if_due(db, force=True)
+    if placed != min(threads, stock) or orders != placed or left != stock - placed:
+        raise AssertionError(f"Złożono {placed} zamówień (w bazie {orders}), stan {left} z {stock}")
+    return placed
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Składanie zamówień")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--threads", type=int, default=20, help="równoległych zamówień po 1 szt.")
+    parser.add_argument("--stock", type=int, default=5, help="początkowy stan produktu")
+    parser.add_argument("--url", default=None,
+                        help="baza testowa (np. PostgreSQL - sprawdza też FOR UPDATE); domyślnie tymczasowy plik SQLite")
+    args = parser.parse_args()
+
+    import database
+    import migrate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{os.path.join(tmp, 'check.db')}"
+        # Połączenie na wątek i drugie na rezerwację numerów (order_numbers) - bez czekania na pulę
+        check_engine = create_engine(url, **dict(database.engine_options(url), pool_size=args.threads,
+                                                 max_overflow=args.threads))
+        if database._is_sqlite(url):
+            database.install_sqlite_pragmas(check_engine)
+        migrate.upgrade(check_engine)
+        try:
+            placed = check(check_engine, args.threads, args.stock)
+        finally:
+            check_engine.dispose()
+    print(f"OK: {placed} z {args.threads} równoległych zamówień, stan {args.stock} -> {args.stock - placed}")
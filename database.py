@@ -1,6 +1,17 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, MissingGreenlet, OperationalError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from typing import Optional
+import functools
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # 1. Załaduj zmienne z pliku .env
@@ -13,19 +24,380 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("BŁĄD: Nie znaleziono DATABASE_URL w pliku .env")
 
-# 3. Utwórz silnik bazy danych (engine)
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# 3. Konfiguracja puli połączeń i silnika (zmienne środowiskowe, wartości domyślne poniżej)
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
 
-# 4. Utwórz fabrykę sesji (to pozwala na zapytania do bazy)
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def engine_options(url: str) -> dict:
+    options = {
+        # Cache skompilowanych zapytań SQLAlchemy (liczba instrukcji)
+        "query_cache_size": _env_int("DB_STATEMENT_CACHE_SIZE", 500),
+        # Na SQLite połączenie nie "umiera" po stronie serwera - ping tylko dla prawdziwych serwerów
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "0" if _is_sqlite(url) else "1") == "1",
+    }
+    if not _is_memory_sqlite(url):
+        options.update(
+            pool_size=_env_int("DB_POOL_SIZE", 5),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+        )
+    return options
+
+
+# PRAGMA dla SQLite ustawiane na każdym nowym połączeniu:
+# - WAL: czytelnicy nie czekają na zapis (checkout), zapis nie czeka na czytelników,
+# - synchronous=NORMAL: w trybie WAL bezpieczne, a bez fsync przy każdym commit,
+# - busy_timeout: zamiast od razu "database is locked" czekamy na zwolnienie blokady.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT", 5000),
+    "cache_size": _env_int("SQLITE_CACHE_SIZE", -20000),  # ujemna wartość = KiB
+    "temp_store": "MEMORY",
+}
+
+
+def install_sqlite_pragmas(sync_engine, query_only: bool = False):
+    pragmas = dict(SQLITE_PRAGMAS, query_only=1) if query_only else SQLITE_PRAGMAS
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def pool_stats(target_engine) -> dict:
+    pool = target_engine.pool
+    stats = {"class": type(pool).__name__, "status": pool.status()}
+    # size/checkedin/checkedout/overflow mają tylko pule kolejkowe (QueuePool)
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+# 4. Utwórz silnik bazy danych (engine)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+if _is_sqlite(SQLALCHEMY_DATABASE_URL):
+    install_sqlite_pragmas(engine)
+
+# 5. Utwórz fabrykę sesji (to pozwala na zapytania do bazy)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# 5. Baza dla modeli
+# 6. Baza dla modeli
 Base = declarative_base()
 
-# 6. Funkcja (Dependency), której używamy w main.py do pobrania sesji
-def get_db():
-    db = SessionLocal()
+# 7. Tryb asynchroniczny (DB_ASYNC=1): osobny silnik na sterowniku async (aiosqlite / asyncpg).
+# Synchroniczny `engine` zostaje do DDL przy starcie i zadań poza requestami.
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+_ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    # sqlite:///sklep.db -> sqlite+aiosqlite:///sklep.db, postgresql://... -> postgresql+asyncpg://...
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"BŁĄD: Brak sterownika async dla bazy {parsed.get_backend_name()}")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    ASYNC_DATABASE_URL = os.getenv("DATABASE_ASYNC_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+    if _is_sqlite(ASYNC_DATABASE_URL):
+        install_sqlite_pragmas(async_engine.sync_engine)
+    # expire_on_commit=False - po commit szablon nie może dociągać atrybutów z bazy
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# 8. Replika tylko do odczytu (DATABASE_REPLICA_URL, np. standby PostgreSQL albo kopia pliku SQLite).
+# Endpointy z Depends(get_read_db) czytają z repliki, gdy odpowiada i nie jest za bardzo w tyle,
+# a pozostałe (get_db) - jak dotąd z bazy głównej.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Maksymalne opóźnienie repliki (s); większe - odczyty idą do bazy głównej
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+# Co ile sekund sprawdzamy replikę (ping + opóźnienie) - przy okazji jednego z requestów
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "5"))
+# Po własnej zmianie (POST itp.) użytkownik czyta z bazy głównej przez tyle sekund,
+# żeby zobaczył swoje zamówienie czy zmianę statusu, zanim dotrą do repliki
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+REPLICA_CONNECT_TIMEOUT = _env_int("REPLICA_CONNECT_TIMEOUT", 2)
+
+logger = logging.getLogger("sklep.db")
+
+
+def replica_engine_options(url: str) -> dict:
+    options = engine_options(url)
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        # Nieosiągalna replika ma szybko oddać request bazie głównej, a nie wisieć na połączeniu
+        timeout_arg = "timeout" if parsed.get_driver_name() == "asyncpg" else "connect_timeout"
+        options["connect_args"] = {timeout_arg: REPLICA_CONNECT_TIMEOUT}
+        options["execution_options"] = {"postgresql_readonly": True}
+    return options
+
+
+def _create_replica_engine(url: str, create):
+    replica = create(url, **replica_engine_options(url))
+    if _is_sqlite(url):
+        sync_replica = getattr(replica, "sync_engine", replica)
+        install_sqlite_pragmas(sync_replica, query_only=True)
+    return replica
+
+
+replica_engine = None
+ReplicaSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if DATABASE_REPLICA_URL and DB_ASYNC:
+    ASYNC_REPLICA_URL = os.getenv("DATABASE_REPLICA_ASYNC_URL") or async_database_url(DATABASE_REPLICA_URL)
+    async_replica_engine = _create_replica_engine(ASYNC_REPLICA_URL, create_async_engine)
+    AsyncReplicaSessionLocal = async_sessionmaker(async_replica_engine, autoflush=False, expire_on_commit=False,
+                                                  info={"replica": True})
+elif DATABASE_REPLICA_URL:
+    replica_engine = _create_replica_engine(DATABASE_REPLICA_URL, create_engine)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine, info={"replica": True})
+
+# Opóźnienie repliki w sekundach; NULL = replika nie nadaje się do odczytu
+_LAG_QUERIES = {
+    # Bez nowych zmian z bazy głównej czas ostatniego odtworzenia rośnie, choć replika jest aktualna
+    "postgresql": "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                  "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END",
+    # Kopia pliku: pusty plik (np. zła ścieżka - SQLite tworzy nowy) to brak repliki
+    "sqlite": "SELECT CASE WHEN count(*) > 0 THEN 0 END FROM sqlite_master",
+}
+
+
+class ReplicaRouter:
+    """Stan repliki widziany przez ten proces: wynik ostatniego sprawdzenia i liczniki odczytów."""
+
+    def __init__(self, max_lag: float = REPLICA_MAX_LAG, check_interval: float = REPLICA_CHECK_SECONDS):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Optional[float] = None  # None = niedostępna (albo jeszcze nie sprawdzona)
+        self.checked_at = float("-inf")
+        self.reads = {"replica": 0, "primary": 0}
+        self._checking = False
+        self._lock = threading.Lock()
+
+    def check_due(self) -> bool:
+        # Sprawdza tylko jeden request naraz; pozostałe korzystają z poprzedniego wyniku
+        with self._lock:
+            if self._checking or time.monotonic() - self.checked_at < self.check_interval:
+                return False
+            self._checking = True
+            return True
+
+    def record(self, lag: Optional[float]):
+        with self._lock:
+            if (lag is None) != (self.lag is None):
+                logger.warning("Replika %s", "niedostępna - odczyty z bazy głównej" if lag is None else "znów dostępna")
+            self.lag = lag
+            self.checked_at = time.monotonic()
+            self._checking = False
+
+    def mark_down(self):
+        # Błąd połączenia w trakcie requestu - do następnego sprawdzenia czytamy z bazy głównej
+        self.record(None)
+
+    def usable(self) -> bool:
+        lag = self.lag
+        return lag is not None and lag <= self.max_lag
+
+    def count(self, replica: bool):
+        with self._lock:
+            self.reads["replica" if replica else "primary"] += 1
+
+
+replica_router = ReplicaRouter()
+
+
+def _lag_query(dialect_name: str):
+    return text(_LAG_QUERIES.get(dialect_name, "SELECT 0"))
+
+
+def _measure_lag() -> Optional[float]:
     try:
+        with replica_engine.connect() as conn:
+            lag = conn.execute(_lag_query(conn.dialect.name)).scalar()
+    except DBAPIError:
+        return None
+    return None if lag is None else float(lag)
+
+
+async def _measure_lag_async() -> Optional[float]:
+    try:
+        async with async_replica_engine.connect() as conn:
+            lag = (await conn.execute(_lag_query(conn.dialect.name))).scalar()
+    except (DBAPIError, OSError):
+        # asyncpg zgłasza odmowę połączenia i timeout jako OSError, bez opakowania SQLAlchemy
+        return None
+    return None if lag is None else float(lag)
+
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+_STICKY_KEY = "db_primary_until"
+
+
+def mark_write(request: Request):
+    # Znacznik w ciasteczku sesji - działa niezależnie od tego, który worker dostanie następny request
+    if DATABASE_REPLICA_URL and "session" in request.scope:
+        request.session[_STICKY_KEY] = time.time() + REPLICA_STICKY_SECONDS
+
+
+def _reads_primary(request: Request) -> bool:
+    return "session" in request.scope and request.session.get(_STICKY_KEY, 0) > time.time()
+
+
+def is_replica(db) -> bool:
+    return bool(db.info.get("replica"))
+
+
+# 9. Funkcje (Dependency), których używamy w main.py do pobrania sesji:
+# get_db - baza główna (zapisy), get_read_db - replika, gdy można (odczyty)
+if DB_ASYNC:
+    async def get_db(request: Request):
+        if request.method not in _SAFE_METHODS:
+            mark_write(request)
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    async def get_read_db(request: Request):
+        use_replica = False
+        if AsyncReplicaSessionLocal is not None and not _reads_primary(request):
+            if replica_router.check_due():
+                replica_router.record(await _measure_lag_async())
+            use_replica = replica_router.usable()
+        replica_router.count(use_replica)
+        async with (AsyncReplicaSessionLocal if use_replica else AsyncSessionLocal)() as db:
+            try:
+                yield db
+            except OperationalError:
+                # Replika padła w trakcie requestu - ten request kończy się błędem, kolejne idą do głównej
+                if use_replica:
+                    replica_router.mark_down()
+                raise
+else:
+    def get_db(request: Request):
+        if request.method not in _SAFE_METHODS:
+            mark_write(request)
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def get_read_db(request: Request):
+        use_replica = False
+        if ReplicaSessionLocal is not None and not _reads_primary(request):
+            if replica_router.check_due():
+                replica_router.record(_measure_lag())
+            use_replica = replica_router.usable()
+        replica_router.count(use_replica)
+        db = (ReplicaSessionLocal if use_replica else SessionLocal)()
+        try:
+            yield db
+        except OperationalError:
+            # Replika padła w trakcie requestu - ten request kończy się błędem, kolejne idą do głównej
+            if use_replica:
+                replica_router.mark_down()
+            raise
+        finally:
+            db.close()
+
+
+@contextmanager
+def primary_session(db):
+    """Sesja na bazie głównej dla kodu, który dostał sesję repliki, a musi czytać najświeższe dane
+    (np. snapshot katalogu, który potem łatają zapisy tego procesu). Działa też wewnątrz run_sync."""
+    if not is_replica(db):
         yield db
+        return
+    session = Session(bind=async_engine.sync_engine if DB_ASYNC else engine)
+    try:
+        yield session
     finally:
-        db.close()
\ No newline at end of file
+        session.close()
+
+
+# 10. Dekorator endpointów korzystających z `db`.
+# W trybie sync nic nie zmienia - FastAPI uruchamia endpoint w puli wątków jak dotąd.
+# W trybie async endpoint staje się `async def`, a jego ciało wykonuje się przez
+# AsyncSession.run_sync: każde zapytanie ORM jest awaitowane na sterowniku async
+# (greenlet SQLAlchemy), bez blokowania wątku z puli na czas I/O.
+# run_sync działa na wątku pętli zdarzeń, więc szablon (np. pełna tabela produktów w panelu)
+# nie renderuje się w nim: endpoint zwraca DeferredResponse, a HTML powstaje po await,
+# w puli wątków - inne requesty i strumienie SSE tego workera nie czekają na render.
+_deferring_render: ContextVar[bool] = ContextVar("db_endpoint_deferring_render", default=False)
+
+
+def deferring_render() -> bool:
+    return _deferring_render.get()
+
+
+class DeferredResponse:
+    """Odpowiedź do wyrenderowania po zakończeniu run_sync (render() zwraca właściwą odpowiedź)."""
+
+    def __init__(self, render):
+        self.render = render
+
+
+async def _render_deferred(async_db, response: DeferredResponse):
+    try:
+        return await run_in_threadpool(response.render)
+    except MissingGreenlet:
+        # Szablon dociąga relację z bazy (lazy load) - to wymaga greenleta, renderujemy w run_sync.
+        # Działa, ale blokuje pętlę: relację trzeba załadować w endpoincie (joinedload/selectinload).
+        logger.warning("Szablon ładuje dane z bazy podczas renderowania - render na wątku pętli zdarzeń")
+        return await async_db.run_sync(lambda sync_db: response.render())
+
+
+def db_endpoint(fn):
+    if not DB_ASYNC:
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        async_db = kwargs.pop("db")
+        token = _deferring_render.set(True)
+        try:
+            result = await async_db.run_sync(lambda sync_db: fn(*args, db=sync_db, **kwargs))
+        finally:
+            _deferring_render.reset(token)
+        if isinstance(result, DeferredResponse):
+            return await _render_deferred(async_db, result)
+        return result
+
+    return wrapper
+
+# 11. Kod w `async def` endpointach, który między zapytaniami czeka na coś innego
+# (np. weryfikacja hasła w osobnym procesie): `await run_db(db, funkcja)` wykonuje
+# funkcja(sync_session) - w trybie sync w puli wątków, w trybie async przez run_sync.
+async def run_db(db, fn, *args):
+    if DB_ASYNC:
+        return await db.run_sync(lambda sync_db: fn(sync_db, *args))
+    return await run_in_threadpool(fn, db, *args)
@@ -0,0 +1,161 @@
+# Zdarzenia na żywo (Server-Sent Events): zmiany stanów/cen produktów i statusów zamówień.
+# Broker działa w obrębie jednego procesu - publikują endpointy po commit, subskrybują
+# połączenia GET /api/events. Przy kilku workerach uvicorna każdy widzi tylko zmiany
+# zrobione w swoim procesie (stan po przeładowaniu strony jest zawsze aktualny).
+#
+# Zdarzenia mają numery "<BOOT_ID>.<n>"; przeglądarka po zerwaniu połączenia wysyła
+# Last-Event-ID i dostaje zaległe zdarzenia z historii, a gdy ich już nie ma (restart,
+# za długa przerwa, połączenie z innym workerem) - zdarzenie "reset", po którym strona
+# pobiera bieżące stany produktów i listę zamówień (static/live.js), bez przeładowania.
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+# --- KONFIGURACJA ---
+EVENTS_ENABLED = os.getenv("EVENTS", "1") == "1"
+# Komentarz ": ping" co tyle sekund - proxy nie zamknie bezczynnego połączenia
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+# Po tylu sekundach serwer kończy strumień, a przeglądarka łączy się ponownie (z Last-Event-ID);
+# dzięki temu restart aplikacji nie czeka na otwarte połączenia w nieskończoność
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "600"))
+EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "1000"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "500"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "500"))
+
+BOOT_ID = uuid.uuid4().hex[:8]
+RETRY_MS = 3000
+
+
+@dataclass(frozen=True)
+class Event:
+    seq: int
+    kind: str            # "product" albo "order"
+    data: dict
+    product_id: Optional[int] = None
+    client_id: Optional[int] = None  # zamówienie widzi personel i jego właściciel
+
+    @property
+    def id(self) -> str:
+        return f"{BOOT_ID}.{self.seq}"
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {json.dumps(self.data, ensure_ascii=False)}\n\n"
+
+
+@dataclass(eq=False)
+class Subscriber:
+    loop: asyncio.AbstractEventLoop
+    staff: bool = False
+    client_id: Optional[int] = None
+    product_ids: Optional[frozenset] = None  # None = wszystkie produkty
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(EVENTS_QUEUE_SIZE))
+
+    def wants(self, event: Event) -> bool:
+        if event.kind == "product":
+            return self.product_ids is None or event.product_id in self.product_ids
+        return self.staff or (event.client_id is not None and event.client_id == self.client_id)
+
+    def push(self, event: Optional[Event]):
+        # Wywoływane na pętli subskrybenta. Przepełniona kolejka (klient nie nadąża) kończy
+        # strumień - przeglądarka połączy się ponownie i nadrobi zaległości z historii
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class Broker:
+    def __init__(self, history: int = EVENTS_HISTORY):
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, subscriber: Subscriber, last_event_id: Optional[str] = None):
+        """Rejestruje subskrybenta; zwraca (zaległe zdarzenia, czy potrzebny reset)."""
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if not last_event_id:
+                return [], False
+            boot_id, _, seq = last_event_id.partition(".")
+            if boot_id != BOOT_ID or not seq.isdigit():
+                return [], True
+            last = int(seq)
+            if last >= self._seq:
+                return [], False
+            if not self._history or self._history[0].seq > last + 1:
+                return [], True
+            return [e for e in self._history if e.seq > last and subscriber.wants(e)], False
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, kind: str, data: dict, product_id: Optional[int] = None, client_id: Optional[int] = None):
+        # Bezpieczne z dowolnego wątku (endpointy synchroniczne działają w puli wątków)
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, kind, data, product_id, client_id)
+            self._history.append(event)
+            subscribers = [s for s in self._subscribers if s.wants(event)]
+            self.published += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, event)
+            except RuntimeError:
+                # Pętla już zamknięta (zamykanie aplikacji)
+                pass
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+broker = Broker()
+
+
+# --- PUBLIKACJA (wołać po commit) ---
+def publish_products(values: dict):
+    # values: {id_modelu: {"stan_magazynowy": ..., "cena_katalogowa": ...}} - tylko zmienione pola
+    for product_id, fields in sorted(values.items()):
+        broker.publish("product", {"id": product_id, **fields}, product_id=product_id)
+
+
+def publish_order(order_id: int, numer: str, status: str, client_id: Optional[int]):
+    broker.publish("order", {"id": order_id, "numer": numer, "status": status}, client_id=client_id)
+
+
+# --- STRUMIEŃ SSE ---
+async def stream(subscriber: Subscriber, last_event_id: Optional[str] = None):
+    """Generator dla StreamingResponse(media_type="text/event-stream")."""
+    backlog, reset = broker.subscribe(subscriber, last_event_id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if reset:
+            yield f"id: {BOOT_ID}.{broker._seq}\nevent: reset\ndata: {{}}\n\n"
+        for event in backlog:
+            yield event.encode()
+
+        deadline = time.monotonic() + EVENTS_MAX_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), min(EVENTS_HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                return
+            yield event.encode()
+    finally:
+        broker.unsubscribe(subscriber)
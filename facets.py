@@ -0,0 +1,257 @@
+# Liczniki nawigacji fasetowej: ile produktów (i ile dostępnych) jest w każdej kategorii
+# przy bieżącym filtrze ceny oraz w każdym przedziale cenowym przy bieżącej kategorii.
+#
+# FacetIndex to posortowane listy cen per kategoria - liczniki dla dowolnego zakresu cen to
+# dwa bisect-y na kategorię, bez przeglądania produktów. Indeks jest częścią snapshotu
+# katalogu (catalog.py) i przy zmianie produktu aktualizuje się przyrostowo (usuń starą cenę,
+# wstaw nową), więc strona główna nie płaci za liczniki ani zapytaniem, ani pętlą po katalogu.
+# Gdy katalog jest za duży na pamięć, liczniki liczy GROUP BY w bazie - raz na wersję katalogu.
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import quote_plus, urlencode
+import os
+import threading
+import time
+
+import models
+
+# --- KONFIGURACJA ---
+# Granice przedziałów cenowych (zł): "0,100,500" -> do 100, 100-500, od 500
+FACET_PRICE_BOUNDS = tuple(float(b) for b in os.getenv("FACET_PRICE_BOUNDS", "0,100,250,500,1000,2500,5000").split(","))
+FACET_DB_CACHE_SIZE = int(os.getenv("FACET_DB_CACHE_SIZE", "256"))
+# Zmiany z innych workerów nie podbijają lokalnej wersji - wynik z bazy wygasa też po czasie
+FACET_DB_TTL = float(os.getenv("FACET_DB_TTL", "60"))
+
+
+@dataclass(frozen=True)
+class PriceBucket:
+    low: float
+    high: Optional[float]  # None = bez górnej granicy
+
+    @property
+    def label(self) -> str:
+        if self.high is None:
+            return f"od {self.low:g} zł"
+        if self.low <= 0:
+            return f"do {self.high:g} zł"
+        return f"{self.low:g} - {self.high:g} zł"
+
+    @property
+    def price_max(self) -> Optional[float]:
+        # Filtr ceny jest domknięty (<= price_max), przedział prawostronnie otwarty - ceny mają grosze
+        return None if self.high is None else round(self.high - 0.01, 2)
+
+
+PRICE_BUCKETS = tuple(
+    PriceBucket(low, FACET_PRICE_BOUNDS[i + 1] if i + 1 < len(FACET_PRICE_BOUNDS) else None)
+    for i, low in enumerate(FACET_PRICE_BOUNDS)
+)
+
+
+@dataclass(frozen=True)
+class FacetCount:
+    count: int
+    in_stock: int
+
+
+@dataclass(frozen=True)
+class Facets:
+    categories: dict          # id_kategorii -> FacetCount (przy bieżącym filtrze ceny)
+    all_categories: FacetCount
+    price_buckets: List[Tuple[PriceBucket, FacetCount]]  # przy bieżącej kategorii
+
+    def category(self, category_id: int) -> FacetCount:
+        return self.categories.get(category_id, _EMPTY)
+
+
+_EMPTY = FacetCount(0, 0)
+
+
+def _count(prices, price_min, price_max) -> int:
+    # Domknięty zakres [price_min, price_max] jak w filtrze listy
+    lo = 0 if price_min is None else bisect_left(prices, price_min)
+    hi = len(prices) if price_max is None else bisect_right(prices, price_max)
+    return max(hi - lo, 0)
+
+
+def _bucket_count(prices, bucket: PriceBucket) -> int:
+    lo = bisect_left(prices, bucket.low)
+    hi = len(prices) if bucket.high is None else bisect_left(prices, bucket.high)
+    return hi - lo
+
+
+class FacetIndex:
+    """Posortowane ceny produktów per kategoria: wszystkie i tylko dostępne (stan > 0).
+
+    Niemutowalny z punktu widzenia czytelników - updated() zwraca nowy indeks, kopiując
+    tylko listy kategorii, których dotyczy zmiana.
+    """
+    __slots__ = ("prices", "in_stock")
+
+    def __init__(self, prices: dict, in_stock: dict):
+        self.prices = prices
+        self.in_stock = in_stock
+
+    @classmethod
+    def build(cls, products) -> "FacetIndex":
+        prices, in_stock = {}, {}
+        for p in products:
+            prices.setdefault(p.id_kategorii, []).append(p.cena_katalogowa)
+            if p.stan_magazynowy > 0:
+                in_stock.setdefault(p.id_kategorii, []).append(p.cena_katalogowa)
+        for lists in (prices, in_stock):
+            for values in lists.values():
+                values.sort()
+        return cls(prices, in_stock)
+
+    def updated(self, old_products=(), new_products=()) -> "FacetIndex":
+        # old_products: wersje sprzed zmiany (albo usunięte), new_products: po zmianie (albo dodane)
+        prices, in_stock = dict(self.prices), dict(self.in_stock)
+        copied = set()
+
+        def writable(lists, key, category_id):
+            if (key, category_id) not in copied:
+                lists[category_id] = list(lists.get(category_id, ()))
+                copied.add((key, category_id))
+            return lists[category_id]
+
+        for p in old_products:
+            values = writable(prices, "all", p.id_kategorii)
+            del values[bisect_left(values, p.cena_katalogowa)]
+            if p.stan_magazynowy > 0:
+                values = writable(in_stock, "stock", p.id_kategorii)
+                del values[bisect_left(values, p.cena_katalogowa)]
+        for p in new_products:
+            insort(writable(prices, "all", p.id_kategorii), p.cena_katalogowa)
+            if p.stan_magazynowy > 0:
+                insort(writable(in_stock, "stock", p.id_kategorii), p.cena_katalogowa)
+        return FacetIndex(prices, in_stock)
+
+    def facets(self, category_id=None, price_min=None, price_max=None) -> Facets:
+        categories = {
+            cid: FacetCount(_count(values, price_min, price_max),
+                            _count(self.in_stock.get(cid, ()), price_min, price_max))
+            for cid, values in self.prices.items()
+        }
+        selected = [category_id] if category_id else list(self.prices)
+        buckets = [
+            (bucket, FacetCount(
+                sum(_bucket_count(self.prices.get(cid, ()), bucket) for cid in selected),
+                sum(_bucket_count(self.in_stock.get(cid, ()), bucket) for cid in selected),
+            ))
+            for bucket in PRICE_BUCKETS
+        ]
+        return Facets(categories, _total(categories), buckets)
+
+
+def _total(categories: dict) -> FacetCount:
+    return FacetCount(sum(c.count for c in categories.values()), sum(c.in_stock for c in categories.values()))
+
+
+def from_products(products, category_id=None, price_min=None, price_max=None) -> Facets:
+    # Liczniki dla wyników wyszukiwania (najwyżej SEARCH_MAX_RESULTS produktów) - zwykła pętla
+    return FacetIndex.build(products).facets(category_id, price_min, price_max)
+
+
+class FacetLink(NamedTuple):
+    label: str
+    url: str
+    count: int
+    in_stock: int
+    active: bool
+
+
+def _url_builder(params, replaced):
+    # Wspólna część zapytania (bez page/cursor i podmienianych filtrów) kodowana raz na stronę -
+    # linków jest kilkadziesiąt, a zmiana filtra i tak zaczyna od pierwszej strony
+    base = urlencode([(k, v) for k, v in params.items() if k not in ("page", "cursor", *replaced)])
+
+    def url(**values) -> str:
+        query = "&".join([base] * bool(base) + [f"{k}={quote_plus(str(v))}" for k, v in values.items() if v is not None])
+        return "/?" + query if query else "/"
+    return url
+
+
+def navigation(facet_counts: Facets, categories, params, category_id=None, price_min=None, price_max=None) -> dict:
+    """Gotowe linki dla szablonu: {"all": FacetLink, "categories": [...], "prices": [...]}.
+
+    Linki zachowują pozostałe filtry (wyszukiwanie, sortowanie, cenę albo kategorię).
+    Przedziały bez produktów są pomijane; kliknięcie aktywnego przedziału zdejmuje filtr ceny.
+    """
+    category_url = _url_builder(params, ("category_id",))
+    price_url = _url_builder(params, ("price_min", "price_max"))
+    total = facet_counts.all_categories
+    links = {
+        "all": FacetLink("Wszystkie", category_url(), total.count, total.in_stock, not category_id),
+        "categories": [],
+        "prices": [],
+    }
+    for cat in categories:
+        counts = facet_counts.category(cat.id_kategorii)
+        links["categories"].append(FacetLink(cat.nazwa_kategorii, category_url(category_id=cat.id_kategorii),
+                                             counts.count, counts.in_stock, category_id == cat.id_kategorii))
+    for bucket, counts in facet_counts.price_buckets:
+        if not counts.count:
+            continue
+        active = price_min == bucket.low and price_max == bucket.price_max
+        url = price_url() if active else price_url(price_min=f"{bucket.low:g}",
+                                                   price_max=None if bucket.price_max is None else f"{bucket.price_max:g}")
+        links["prices"].append(FacetLink(bucket.label, url, counts.count, counts.in_stock, active))
+    return links
+
+
+# --- DUŻY KATALOG: GROUP BY W BAZIE, WYNIK ZAPAMIĘTANY DO ZMIANY KATALOGU ---
+_db_cache = OrderedDict()
+_db_cache_lock = threading.Lock()
+
+
+def _bucket_expression(price):
+    return case(
+        *[(price < bucket.high, i) for i, bucket in enumerate(PRICE_BUCKETS) if bucket.high is not None],
+        else_=len(PRICE_BUCKETS) - 1,
+    )
+
+
+def db_facets(db: Session, version: int, category_id=None, price_min=None, price_max=None,
+              product_ids=None) -> Facets:
+    """Liczniki z bazy - dwa zapytania GROUP BY, zapamiętane pod wersją katalogu (catalog.cache.version)."""
+    key = (version, category_id, price_min, price_max, tuple(product_ids) if product_ids is not None else None)
+    with _db_cache_lock:
+        cached = _db_cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] < FACET_DB_TTL:
+            _db_cache.move_to_end(key)
+            return cached[0]
+
+    produkt = models.ModelProduktu
+    in_stock = func.sum(case((produkt.stan_magazynowy > 0, 1), else_=0))
+
+    by_category = db.query(produkt.id_kategorii, func.count(), in_stock)
+    if price_min is not None:
+        by_category = by_category.filter(produkt.cena_katalogowa >= price_min)
+    if price_max is not None:
+        by_category = by_category.filter(produkt.cena_katalogowa <= price_max)
+
+    bucket = _bucket_expression(produkt.cena_katalogowa)
+    by_bucket = db.query(bucket, func.count(), in_stock).filter(produkt.cena_katalogowa >= PRICE_BUCKETS[0].low)
+    if category_id:
+        by_bucket = by_bucket.filter(produkt.id_kategorii == category_id)
+
+    if product_ids is not None:
+        by_category = by_category.filter(produkt.id_modelu.in_(product_ids))
+        by_bucket = by_bucket.filter(produkt.id_modelu.in_(product_ids))
+
+    categories = {cid: FacetCount(count, stock or 0) for cid, count, stock in by_category.group_by(produkt.id_kategorii)}
+    bucket_counts = {i: FacetCount(count, stock or 0) for i, count, stock in by_bucket.group_by(bucket)}
+    result = Facets(categories, _total(categories),
+                    [(b, bucket_counts.get(i, _EMPTY)) for i, b in enumerate(PRICE_BUCKETS)])
+
+    with _db_cache_lock:
+        _db_cache[key] = (result, time.monotonic())
+        _db_cache.move_to_end(key)
+        while len(_db_cache) > FACET_DB_CACHE_SIZE:
+            _db_cache.popitem(last=False)
+    return result
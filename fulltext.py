@@ -0,0 +1,118 @@
+from sqlalchemy import and_, case, or_, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+from typing import List
+import logging
+import os
+import re
+
+import models
+
+# --- KONFIGURACJA ---
+# Ile najlepszych trafień bierzemy pod uwagę (dalej filtrowane kategorią/ceną i stronicowane)
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))
+TYPEAHEAD_LIMIT = 8
+
+# Indeks pełnotekstowy nad nazwa_modelu + opis:
+# - SQLite: wirtualna tabela FTS5 (external content) utrzymywana triggerami,
+# - PostgreSQL: indeks GIN na wyrażeniu to_tsvector (aktualizuje się sam).
+# Inne bazy (albo SQLite bez FTS5) wracają do LIKE '%...%'.
+# DDL indeksu jest w migracji migrations/0001_schemat_bazowy.py.
+FTS_TABLE = "model_produktu_fts"
+
+# Wyrażenie musi być identyczne w indeksie (migracja 0001) i w WHERE, inaczej PostgreSQL nie użyje indeksu
+_PG_DOCUMENT = "to_tsvector('simple', coalesce(nazwa_modelu, '') || ' ' || coalesce(opis, ''))"
+_PG_RANKED_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(nazwa_modelu, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(opis, '')), 'B')"
+)
+
+logger = logging.getLogger("sklep.search")
+
+# Dialekty, na których indeks jest gotowy (ustawiane przez detect_search_index)
+_fts_dialects = set()
+
+
+def _index_exists(conn) -> bool:
+    if conn.dialect.name == "sqlite":
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        return conn.execute(text(query), {"name": FTS_TABLE}).first() is not None
+    if conn.dialect.name == "postgresql":
+        query = "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_model_produktu_fts'"
+        return conn.execute(text(query)).first() is not None
+    return False
+
+
+def detect_search_index(conn) -> bool:
+    # Przy starcie tylko sprawdzamy, czy migracja utworzyła indeks - jedno zapytanie
+    try:
+        exists = _index_exists(conn)
+    except (OperationalError, ProgrammingError):
+        exists = False
+    if exists:
+        _fts_dialects.add(conn.dialect.name)
+    else:
+        _fts_dialects.discard(conn.dialect.name)
+    return exists
+
+
+def _tokens(phrase: str) -> List[str]:
+    return re.findall(r"\w+", (phrase or "").lower())
+
+
+def _fts5_query(tokens) -> str:
+    # Każde słowo jako fraza z prefiksem: "ryz"* "5600"* (AND), bez składni FTS od użytkownika
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def _tsquery(tokens) -> str:
+    return " & ".join(f"{t}:*" for t in tokens)
+
+
+def search_product_ids(db: Session, phrase: str, limit: int = SEARCH_MAX_RESULTS) -> List[int]:
+    """Zwraca id produktów pasujących do frazy, od najtrafniejszego."""
+    tokens = _tokens(phrase)
+    if not tokens:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect in _fts_dialects and dialect == "sqlite":
+        rows = db.execute(text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), rowid DESC LIMIT :limit"
+        ), {"q": _fts5_query(tokens), "limit": limit})
+    elif dialect in _fts_dialects and dialect == "postgresql":
+        rows = db.execute(text(
+            f"SELECT id_modelu FROM model_produktu "
+            f"WHERE {_PG_DOCUMENT} @@ to_tsquery('simple', :q) "
+            f"ORDER BY ts_rank({_PG_RANKED_DOCUMENT}, to_tsquery('simple', :q)) DESC, id_modelu DESC "
+            f"LIMIT :limit"
+        ), {"q": _tsquery(tokens), "limit": limit})
+    else:
+        # Te same kolumny co indeks (nazwa i opis), trafienia w nazwie wyżej - jak wagi w bm25/ts_rank
+        produkt = models.ModelProduktu
+        in_name = [produkt.nazwa_modelu.ilike(f"%{t}%") for t in tokens]
+        query = db.query(produkt.id_modelu)
+        for t, name_match in zip(tokens, in_name):
+            query = query.filter(or_(name_match, produkt.opis.ilike(f"%{t}%")))
+        rows = query.order_by(case((and_(*in_name), 0), else_=1), produkt.id_modelu.desc()).limit(limit)
+
+    return [row[0] for row in rows]
+
+
+def typeahead(db: Session, phrase: str, limit: int = TYPEAHEAD_LIMIT) -> List[dict]:
+    ids = search_product_ids(db, phrase, limit)
+    if not ids:
+        return []
+
+    products = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu.in_(ids)).all()
+    by_id = {p.id_modelu: p for p in products}
+    return [
+        {
+            "id": pid,
+            "name": by_id[pid].nazwa_modelu,
+            "price": by_id[pid].cena_katalogowa,
+            "image": by_id[pid].zdjecie_url,
+        }
+        for pid in ids if pid in by_id
+    ]
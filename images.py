@@ -0,0 +1,272 @@
+# Zdjęcia produktów: przesłany plik ląduje w IMAGES_DIR pod nazwą z odciskiem treści
+# (media/produkty/3f2a9c1b7e4d5a60.jpg), a pula procesów robi z niego warianty
+# <odcisk>-<szerokość>.webp/.jpg (miniatura, średni, duży). Nazwy zależą od treści, więc
+# /media/produkty/... idzie z Cache-Control: immutable; nowe zdjęcie = nowy adres.
+#
+# Szablony biorą warianty przez image_src / image_srcset (albo makro picture z _obrazek.html):
+# lista produktów pobiera ~480 px zamiast oryginału. Dopóki warianty się liczą (albo gdy
+# plik zginął), adres wariantu przekierowuje na oryginał. Adresy spoza sklepu (stare
+# zdjecie_url) zostają bez zmian. Warianty wymagają pakietu Pillow - bez niego sklep
+# zapisuje i podaje tylko oryginały.
+#
+# Moduł jest importowany przez procesy puli (start "spawn") - bez importów aplikacji.
+from concurrent.futures import Future, ProcessPoolExecutor
+from starlette.responses import RedirectResponse
+from starlette.staticfiles import StaticFiles
+from typing import BinaryIO, List, Optional
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+from assets import IMMUTABLE
+
+# --- KONFIGURACJA ---
+IMAGES_DIR = os.getenv("IMAGES_DIR", os.path.join("media", "produkty"))
+IMAGES_URL = "/media/produkty"
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+# Procesy liczące warianty; 0 = od razu w procesie aplikacji (dev, testy)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "1"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+# Nazwa wariantu -> szerokość w px: miniatura w panelach (50 px, ekrany 2x-3x),
+# karta na liście produktów, zdjęcie na stronie szczegółów
+VARIANTS = {"thumb": 160, "medium": 480, "large": 1200}
+FORMATS = ("webp", "jpg")
+
+# Rozpoznajemy format po treści, nie po nazwie pliku od użytkownika
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+]
+_ORIGINAL_EXTS = ("jpg", "png", "gif", "webp")
+_LOCAL_URL = re.compile(rf"^{re.escape(IMAGES_URL)}/([0-9a-f]{{16}})\.(?:jpg|png|gif|webp)$")
+_VARIANT_NAME = re.compile(r"^([0-9a-f]{16})-\d+\.(?:webp|jpg)$")
+
+logger = logging.getLogger("sklep.images")
+
+
+class ImageError(Exception):
+    # Plik nie jest obsługiwanym obrazem albo jest za duży
+    pass
+
+
+def enabled() -> bool:
+    return Image is not None
+
+
+def sniff(head: bytes) -> Optional[str]:
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+# --- ZAPIS PRZESŁANEGO PLIKU ---
+def store(fileobj: BinaryIO, directory: str = IMAGES_DIR) -> str:
+    """Zapisuje przesłany obraz (plik z formularza) i zleca warianty. Zwraca adres oryginału."""
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".upload-", delete=False) as tmp:
+        try:
+            while True:
+                chunk = fileobj.read(64 * 1024)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = sniff(chunk)
+                    if ext is None:
+                        raise ImageError("Obsługiwane formaty zdjęć: JPEG, PNG, WebP, GIF.")
+                size += len(chunk)
+                if size > IMAGE_MAX_BYTES:
+                    raise ImageError(f"Zdjęcie jest za duże (limit {IMAGE_MAX_BYTES // (1024 * 1024)} MB).")
+                digest.update(chunk)
+                tmp.write(chunk)
+            if ext is None:
+                raise ImageError("Pusty plik zdjęcia.")
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+
+    name = digest.hexdigest()[:16]
+    path = os.path.join(directory, f"{name}.{ext}")
+    if os.path.exists(path):
+        # To samo zdjęcie już było - warianty też (albo właśnie się liczą)
+        os.unlink(tmp.name)
+    else:
+        os.replace(tmp.name, path)
+        schedule(path)
+    return f"{IMAGES_URL}/{name}.{ext}"
+
+
+# --- WARIANTY (w procesie puli) ---
+def _save(image, path: str, fmt: str):
+    # Zapis do pliku tymczasowego i rename - serwer nigdy nie poda połowy pliku
+    tmp = f"{path}.tmp{os.getpid()}"
+    if fmt == "webp":
+        image.save(tmp, "WEBP", quality=IMAGE_QUALITY, method=4)
+    else:
+        image.save(tmp, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp, path)
+
+
+def make_variants(source: str, force: bool = False) -> List[str]:
+    """Liczy brakujące warianty oryginału; zwraca nazwy zapisanych plików."""
+    base = os.path.splitext(source)[0]
+    formats = [f for f in FORMATS if f != "webp" or features.check("webp")]
+    todo = [(width, fmt) for width in sorted(VARIANTS.values()) for fmt in formats
+            if force or not os.path.exists(f"{base}-{width}.{fmt}")]
+    if not todo:
+        return []
+
+    with Image.open(source) as opened:
+        opened.seek(0)  # GIF/WebP animowany - pierwsza klatka
+        image = ImageOps.exif_transpose(opened)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    written = []
+    for width, fmt in todo:
+        # Bez powiększania - mały oryginał daje warianty w swoim rozmiarze
+        variant = image.copy()
+        variant.thumbnail((width, width * 4), Image.LANCZOS)
+        if fmt == "jpg" and variant.mode == "RGBA":
+            background = Image.new("RGB", variant.size, (255, 255, 255))
+            background.paste(variant, mask=variant.getchannel("A"))
+            variant = background
+        path = f"{base}-{width}.{fmt}"
+        _save(variant, path, fmt)
+        written.append(os.path.basename(path))
+    return written
+
+
+# --- PULA PROCESÓW ---
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if IMAGE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn zamiast fork - proces aplikacji ma już wątki i połączenia z bazą
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _log_result(source: str, future: Future):
+    error = None if future.cancelled() else future.exception()
+    if error is not None:
+        logger.error("Warianty zdjęcia %s: %s", source, error)
+
+
+def schedule(source: str, force: bool = False) -> Optional[Future]:
+    # Request nie czeka na warianty - do czasu ich zapisania adresy wariantów kierują na oryginał
+    if not enabled():
+        return None
+    pool = _get_pool()
+    if pool is None:
+        try:
+            make_variants(source, force)
+        except Exception as e:
+            logger.error("Warianty zdjęcia %s: %s", source, e)
+        return None
+    future = pool.submit(make_variants, source, force)
+    future.add_done_callback(lambda f: _log_result(source, f))
+    return future
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            # Niepoliczone warianty uzupełni python images.py rebuild (do tego czasu - oryginał)
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# --- POMOCNICY SZABLONÓW ---
+def _local_name(url: Optional[str]) -> Optional[str]:
+    match = _LOCAL_URL.match(url or "") if enabled() else None
+    return match.group(1) if match else None
+
+
+def image_src(url: Optional[str], variant: str = "medium", fmt: str = "jpg") -> str:
+    """Adres wariantu zdjęcia; dla adresów spoza sklepu (albo bez Pillow) - adres bez zmian."""
+    name = _local_name(url)
+    if name is None:
+        return url or ""
+    return f"{IMAGES_URL}/{name}-{VARIANTS[variant]}.{fmt}"
+
+
+def image_srcset(url: Optional[str], fmt: str = "jpg") -> str:
+    """Wartość atrybutu srcset ("...-160.webp 160w, ...") albo "" dla zdjęć spoza sklepu."""
+    name = _local_name(url)
+    if name is None:
+        return ""
+    return ", ".join(f"{IMAGES_URL}/{name}-{width}.{fmt} {width}w" for width in sorted(VARIANTS.values()))
+
+
+# --- SERWOWANIE ---
+class ImageFiles(StaticFiles):
+    """StaticFiles dla IMAGES_DIR: immutable (nazwy z odciskiem), brakujący wariant -> oryginał."""
+
+    def _original_of(self, path: str) -> Optional[str]:
+        match = _VARIANT_NAME.match(os.path.basename(path))
+        if not match or self.lookup_path(path)[1] is not None:
+            return None
+        for ext in _ORIGINAL_EXTS:
+            if self.lookup_path(f"{match.group(1)}.{ext}")[1] is not None:
+                return f"{match.group(1)}.{ext}"
+        return None
+
+    async def get_response(self, path: str, scope):
+        original = self._original_of(path)
+        if original is not None:
+            # Wariant jeszcze się liczy - oryginał, a przekierowania nie zapamiętujemy
+            return RedirectResponse(f"{IMAGES_URL}/{original}", status_code=302, headers={"Cache-Control": "no-store"})
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+
+def rebuild(directory: str = IMAGES_DIR, force: bool = False) -> int:
+    """Warianty dla wszystkich oryginałów (po zmianie VARIANTS, przeniesieniu plików). Zwraca liczbę zapisanych."""
+    sources = [os.path.join(directory, f) for f in sorted(os.listdir(directory))
+               if re.fullmatch(r"[0-9a-f]{16}\.(?:jpg|png|gif|webp)", f)]
+    pool = _get_pool()
+    if pool is None:
+        return sum(len(make_variants(source, force)) for source in sources)
+    return sum(len(written) for written in pool.map(make_variants, sources, [force] * len(sources)))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["rebuild"] or sys.argv[2:] not in ([], ["--force"]):
+        sys.exit("Użycie: python images.py rebuild [--force]")
+    if not enabled():
+        sys.exit("Warianty zdjęć wymagają pakietu Pillow (pip install pillow)")
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    try:
+        print(f"Zapisano wariantów: {rebuild(force=sys.argv[2:] == ['--force'])}")
+    finally:
+        shutdown()
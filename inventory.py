@@ -0,0 +1,185 @@
+from sqlalchemy import select, insert, update, bindparam, func
+from sqlalchemy.orm import Session
+from datetime import datetime
+import math
+import os
+
+import models
+import catalog
+import events
+
+# --- KONFIGURACJA ---
+# Maksymalna liczba zmian w jednym żądaniu (inwentaryzacja całego magazynu mieści się z zapasem)
+MAX_BATCH_CHANGES = int(os.getenv("MAX_BATCH_CHANGES", "5000"))
+
+def _stock_value(raw) -> int:
+    # Liczba całkowita z JSON albo napis z formularza ("5", "-2"); 5.5, "5.5" i true to błąd
+    if isinstance(raw, bool):
+        raise ValueError(raw)
+    if isinstance(raw, str):
+        return int(raw.strip())
+    value = int(raw)
+    if value != raw:
+        raise ValueError(raw)
+    return value
+
+
+def _price_value(raw) -> float:
+    # float() przyjmuje też "inf", "nan" i 1e999 - takich cen nie da się zapisać w JSON
+    if isinstance(raw, bool):
+        raise ValueError(raw)
+    value = float(raw)
+    if not math.isfinite(value):
+        raise ValueError(raw)
+    return value
+
+
+# Pole -> (typ wartości, role z prawem zmiany). Stan: admin i magazynier, cena: admin i sprzedawca.
+# Ujemny wynik (stan albo cena po zmianie) odrzuca apply_changes.
+FIELDS = {
+    "stan_magazynowy": (_stock_value, {1, 3}),
+    "cena_katalogowa": (_price_value, {1, 2}),
+}
+OPS = ("set", "add")
+
+_produkty = models.ModelProduktu.__table__
+
+
+class BatchError(Exception):
+    # Błąd całego żądania (zły format, za dużo zmian) - błędy pojedynczych pozycji są w wynikach
+    pass
+
+
+def _parse(change) -> tuple:
+    if not isinstance(change, dict):
+        raise ValueError("Oczekiwano obiektu {id, field, op, value}")
+    field = change.get("field")
+    if field not in FIELDS:
+        raise ValueError(f"Nieznane pole: {field!r}")
+    op = change.get("op", "set")
+    if op not in OPS:
+        raise ValueError(f"Nieznana operacja: {op!r} (dozwolone: set, add)")
+    try:
+        product_id = int(change["id"])
+        raw = change["value"]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Brak albo niepoprawne id / value")
+    try:
+        value = FIELDS[field][0](raw)
+    except (TypeError, ValueError, OverflowError):
+        if field == "stan_magazynowy":
+            raise ValueError("Stan magazynowy musi być liczbą całkowitą")
+        if field == "cena_katalogowa":
+            raise ValueError("Cena musi być skończoną liczbą")
+        raise ValueError("Brak albo niepoprawne id / value")
+    return product_id, field, op, value
+
+
+def _lock_products(db: Session, ids) -> dict:
+    # Bieżące wartości zablokowanych wierszy - do końca transakcji nikt (także checkout) ich nie zmieni,
+    # więc walidacja i log widzą dokładnie to, co zapisujemy
+    query = (
+        select(_produkty.c.id_modelu, _produkty.c.stan_magazynowy, _produkty.c.cena_katalogowa)
+        .where(_produkty.c.id_modelu.in_(ids))
+    )
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite nie zna FOR UPDATE - pusty UPDATE bierze blokadę zapisu bazy do końca transakcji
+        db.execute(update(_produkty).where(_produkty.c.id_modelu.in_(ids)).values(id_modelu=_produkty.c.id_modelu))
+    else:
+        query = query.order_by(_produkty.c.id_modelu).with_for_update()
+    return {row.id_modelu: {"stan_magazynowy": row.stan_magazynowy, "cena_katalogowa": row.cena_katalogowa}
+            for row in db.execute(query)}
+
+
+def apply_changes(db: Session, changes: list, principal) -> tuple:
+    """Stosuje listę zmian {id, field, op: set|add, value} w jednej transakcji.
+
+    Wszystko albo nic: jeśli któraś pozycja jest błędna (brak produktu, ujemny stan, brak
+    uprawnień), nic nie jest zapisywane. Zwraca (zapisano?, wyniki w kolejności zmian).
+    """
+    if not isinstance(changes, list) or not changes:
+        raise BatchError("Brak zmian")
+    if len(changes) > MAX_BATCH_CHANGES:
+        raise BatchError(f"Za dużo zmian w jednym żądaniu (limit {MAX_BATCH_CHANGES})")
+
+    parsed, results = [], []
+    for change in changes:
+        try:
+            parsed.append(_parse(change))
+            results.append({"status": "ok"})
+        except ValueError as e:
+            parsed.append(None)
+            results.append({"status": "error", "message": str(e)})
+
+    current = _lock_products(db, {p[0] for p in parsed if p is not None})
+    # (id, pole) -> [wartość przed, wartość po, suma zmian względnych albo None przy "set"]
+    net = {}
+    for item, result in zip(parsed, results):
+        if item is None:
+            continue
+        product_id, field, op, value = item
+        result.update(id=product_id, field=field)
+        if principal.id_roli not in FIELDS[field][1]:
+            result.update(status="error", message="Brak uprawnień")
+            continue
+        if product_id not in current:
+            result.update(status="error", message="Nie ma takiego produktu")
+            continue
+
+        old = current[product_id][field] or 0
+        new = old + value if op == "add" else value
+        if field == "cena_katalogowa":
+            new = round(new, 2)
+        if new < 0:
+            result.update(status="error", message=f"Wartość nie może być ujemna ({new})")
+            continue
+        if not math.isfinite(new):
+            # "add" do bardzo dużej ceny potrafi przekroczyć zakres float
+            result.update(status="error", message="Wartość poza zakresem")
+            continue
+
+        entry = net.setdefault((product_id, field), [old, old, 0])
+        entry[1] = new
+        entry[2] = None if op == "set" or entry[2] is None else entry[2] + value
+        current[product_id][field] = new
+        result.update(old=old, new=new)
+
+    if any(r["status"] == "error" for r in results):
+        db.rollback()
+        return False, results
+
+    # Zbiorcze UPDATE-y (executemany): względne jako "pole = pole + zmiana", bezwzględne jako "pole = wartość"
+    statements = {}
+    for (product_id, field), (old, new, delta) in net.items():
+        if new == old:
+            continue
+        if delta is not None:
+            statements.setdefault((field, "add"), []).append({"b_id": product_id, "b_value": delta})
+        else:
+            statements.setdefault((field, "set"), []).append({"b_id": product_id, "b_value": new})
+    for (field, op), params in statements.items():
+        column = _produkty.c[field]
+        if op == "set":
+            value = bindparam("b_value")
+        elif field == "cena_katalogowa":
+            value = func.round(column + bindparam("b_value"), 2)
+        else:
+            value = column + bindparam("b_value")
+        db.execute(update(_produkty).where(_produkty.c.id_modelu == bindparam("b_id")).values({field: value}), params)
+
+    now = datetime.now()
+    log_rows = [
+        {"id_modelu": product_id, "id_pracownika": principal.user_id, "pole": field,
+         "stara_wartosc": old, "nowa_wartosc": new, "data_zmiany": now}
+        for (product_id, field), (old, new, _) in net.items() if new != old
+    ]
+    if log_rows:
+        db.execute(insert(models.LogZmianaProduktu), log_rows)
+    db.commit()
+
+    patches = {}
+    for (product_id, field), (old, new, _) in net.items():
+        patches.setdefault(product_id, {})[field] = new
+    catalog.cache.patch_products(patches)
+    events.publish_products(patches)
+    return True, results
@@ -0,0 +1,237 @@
+# Trwała kolejka zadań w tle, na tabeli "zadanie" w bazie sklepu. Request dodaje zadanie
+# w swojej transakcji (enqueue), a osobny proces workera je wykonuje i ponawia błędy
+# z rosnącym odstępem:
+#
+#   python jobs.py worker           # pętla; Ctrl+C / SIGTERM kończy po bieżącym zadaniu
+#   python jobs.py worker --once    # wykonaj gotowe zadania i zakończ (cron, testy)
+#   python jobs.py status           # liczba zadań wg rodzaju i statusu
+#   python jobs.py retry            # zadania zakończone błędem wracają do kolejki
+#
+# Semantyka "co najmniej raz": jeśli worker padnie po wykonaniu zadania, a przed jego
+# oznaczeniem, zadanie wykona się ponownie po upływie dzierżawy (JOBS_LEASE_SECONDS).
+from sqlalchemy import select, insert, update, delete, func, or_, and_
+from sqlalchemy.orm import Session, selectinload
+from collections import namedtuple
+from datetime import datetime, timedelta
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+import models
+import mail
+
+logger = logging.getLogger("sklep.jobs")
+
+# --- KONFIGURACJA ---
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1"))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+# Odstęp przed kolejną próbą: JOBS_RETRY_SECONDS * 2^(próba - 1)
+JOBS_RETRY_SECONDS = float(os.getenv("JOBS_RETRY_SECONDS", "10"))
+# Po ilu dniach wykonane zadania są usuwane z tabeli (błędne zostają do ręcznego przejrzenia)
+JOBS_KEEP_DAYS = float(os.getenv("JOBS_KEEP_DAYS", "7"))
+
+OCZEKUJE = "oczekuje"
+W_TRAKCIE = "w_trakcie"
+WYKONANE = "wykonane"
+BLAD = "blad"
+
+_zadania = models.Zadanie.__table__
+_handlers = {}
+
+_Job = namedtuple("_Job", "id_zadania rodzaj dane proby")
+
+
+def handler(rodzaj: str):
+    """Rejestruje funkcję wykonującą zadanie: fn(db, **dane)."""
+    def register(fn):
+        _handlers[rodzaj] = fn
+        return fn
+    return register
+
+
+def enqueue(db: Session, rodzaj: str, **dane):
+    # Bez commit - zadanie zapisuje się (albo nie) razem z transakcją wołającego
+    if rodzaj not in _handlers:
+        raise ValueError(f"Nieznany rodzaj zadania: {rodzaj}")
+    now = datetime.now()
+    db.execute(insert(_zadania).values(
+        rodzaj=rodzaj, dane=json.dumps(dane), status=OCZEKUJE, proby=0, uruchom_po=now, utworzono=now,
+    ))
+
+
+# --- WORKER ---
+def _claim(db: Session):
+    # Gotowe zadanie albo takie, którego dzierżawa wygasła (worker padł w trakcie).
+    # Przejęcie jest optymistyczne: UPDATE ... WHERE proby = <odczytana wartość> wygrywa
+    # tylko jeden worker, więc działa tak samo na SQLite i PostgreSQL.
+    now = datetime.now()
+    candidates = db.execute(
+        select(_zadania.c.id_zadania, _zadania.c.rodzaj, _zadania.c.dane, _zadania.c.proby)
+        .where(or_(
+            and_(_zadania.c.status == OCZEKUJE, _zadania.c.uruchom_po <= now),
+            and_(_zadania.c.status == W_TRAKCIE, _zadania.c.zablokowane_do < now),
+        ))
+        .order_by(_zadania.c.id_zadania)
+        .limit(10)
+    ).all()
+    for job in candidates:
+        claimed = db.execute(
+            update(_zadania)
+            .where(_zadania.c.id_zadania == job.id_zadania, _zadania.c.proby == job.proby)
+            .values(status=W_TRAKCIE, proby=job.proby + 1,
+                    zablokowane_do=now + timedelta(seconds=JOBS_LEASE_SECONDS))
+        ).rowcount
+        db.commit()
+        if claimed == 1:
+            return _Job(job.id_zadania, job.rodzaj, job.dane, job.proby + 1)
+    return None
+
+
+def _finish(db: Session, job, **values):
+    # Warunek na proby: jeśli dzierżawa wygasła i zadanie przejął inny worker, nie nadpisujemy jego stanu
+    db.execute(
+        update(_zadania)
+        .where(_zadania.c.id_zadania == job.id_zadania, _zadania.c.proby == job.proby)
+        .values(zablokowane_do=None, **values)
+    )
+    db.commit()
+
+
+def run_one(db: Session) -> bool:
+    """Wykonuje jedno gotowe zadanie. Zwraca False, gdy kolejka jest pusta."""
+    job = _claim(db)
+    if job is None:
+        return False
+
+    try:
+        if job.proby > JOBS_MAX_ATTEMPTS:
+            raise RuntimeError("Przekroczono liczbę prób (wygasła dzierżawa workera)")
+        fn = _handlers.get(job.rodzaj)
+        if fn is None:
+            raise LookupError(f"Nieznany rodzaj zadania: {job.rodzaj}")
+        fn(db, **json.loads(job.dane))
+    except Exception as e:
+        db.rollback()
+        logger.exception("Zadanie %s (%s) nie powiodło się, próba %d", job.id_zadania, job.rodzaj, job.proby)
+        blad = f"{type(e).__name__}: {e}"[:2000]
+        if job.proby >= JOBS_MAX_ATTEMPTS:
+            _finish(db, job, status=BLAD, ostatni_blad=blad, zakonczono=datetime.now())
+        else:
+            retry_at = datetime.now() + timedelta(seconds=JOBS_RETRY_SECONDS * 2 ** (job.proby - 1))
+            _finish(db, job, status=OCZEKUJE, ostatni_blad=blad, uruchom_po=retry_at)
+    else:
+        # Zmiany handlera w bazie i oznaczenie zadania - jednym commitem
+        _finish(db, job, status=WYKONANE, ostatni_blad=None, zakonczono=datetime.now())
+    return True
+
+
+def cleanup(db: Session) -> int:
+    cutoff = datetime.now() - timedelta(days=JOBS_KEEP_DAYS)
+    deleted = db.execute(
+        delete(_zadania).where(_zadania.c.status == WYKONANE, _zadania.c.zakonczono < cutoff)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+def work(session_factory, once: bool = False, stop: threading.Event = None):
+    stop = stop or threading.Event()
+    last_cleanup = 0.0
+    while not stop.is_set():
+        with session_factory() as db:
+            while not stop.is_set() and run_one(db):
+                pass
+            if time.monotonic() - last_cleanup > 3600:
+                cleanup(db)
+                last_cleanup = time.monotonic()
+        if once:
+            break
+        stop.wait(JOBS_POLL_SECONDS)
+
+
+def queue_stats(db: Session) -> dict:
+    rows = db.execute(
+        select(_zadania.c.rodzaj, _zadania.c.status, func.count())
+        .group_by(_zadania.c.rodzaj, _zadania.c.status)
+    ).all()
+    return {(rodzaj, status): liczba for rodzaj, status, liczba in rows}
+
+
+def retry_failed(db: Session) -> int:
+    count = db.execute(
+        update(_zadania).where(_zadania.c.status == BLAD)
+        .values(status=OCZEKUJE, proby=0, uruchom_po=datetime.now(), zakonczono=None)
+    ).rowcount
+    db.commit()
+    return count
+
+
+# --- ZADANIA ---
+def _load_order(db: Session, id_zamowienia: int):
+    return (
+        db.query(models.Zamowienie)
+        .options(selectinload(models.Zamowienie.pozycje).joinedload(models.PozycjaZamowienia.model))
+        .filter(models.Zamowienie.id_zamowienia == id_zamowienia)
+        .first()
+    )
+
+
+@handler("mail_potwierdzenie_zamowienia")
+def _mail_order_confirmation(db: Session, id_zamowienia: int):
+    order = _load_order(db, id_zamowienia)
+    if order is None or not order.email_kontakt_do_zam:
+        return
+    lines = [
+        f"- {p.model.nazwa_modelu} x {p.ilosc}: {p.cena_w_chwili_zakupu * p.ilosc:.2f} zł"
+        for p in order.pozycje
+    ]
+    body = "\n".join([
+        "Dziękujemy za zamówienie!",
+        "",
+        f"Numer zamówienia: {order.numer_zamowienia}",
+        f"Data złożenia: {order.data_zlozenia:%Y-%m-%d %H:%M}",
+        "",
+        *lines,
+        "",
+        f"Razem: {order.suma_calkowita:.2f} zł",
+    ])
+    mail.send_mail(order.email_kontakt_do_zam, f"Potwierdzenie zamówienia {order.numer_zamowienia}", body)
+
+
+@handler("mail_zmiana_statusu")
+def _mail_status_change(db: Session, id_zamowienia: int, nowy_status: str):
+    order = db.query(models.Zamowienie).filter(models.Zamowienie.id_zamowienia == id_zamowienia).first()
+    if order is None or not order.email_kontakt_do_zam:
+        return
+    body = f"Status zamówienia {order.numer_zamowienia} zmienił się na: {nowy_status}."
+    mail.send_mail(order.email_kontakt_do_zam, f"Zamówienie {order.numer_zamowienia}: {nowy_status}", body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kolejka zadań w tle")
+    parser.add_argument("command", choices=["worker", "status", "retry"])
+    parser.add_argument("--once", action="store_true", help="worker: wykonaj gotowe zadania i zakończ")
+    args = parser.parse_args()
+
+    import migrate
+    from database import SessionLocal, engine
+    migrate.check(engine)
+
+    if args.command == "worker":
+        logging.basicConfig(level=logging.INFO)
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        work(SessionLocal, once=args.once, stop=stop)
+    elif args.command == "status":
+        with SessionLocal() as session:
+            for (rodzaj, status), liczba in sorted(queue_stats(session).items()):
+                print(f"{rodzaj:35} {status:10} {liczba}")
+    else:
+        with SessionLocal() as session:
+            print(f"Ponowiono zadań: {retry_failed(session)}")
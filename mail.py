@@ -0,0 +1,133 @@
+# Wysyłka maili (SMTP) i lokalny "serwer-zlew" do testów, który niczego nie wysyła,
+# tylko zapisuje odebrane wiadomości do plików .eml:
+#
+#   python mail.py sink                       # nasłuch na localhost:1025, maile w katalogu ./maile
+#   python mail.py sink --port 2525 --dir /tmp/maile
+#
+# Maile wysyła wyłącznie worker kolejki zadań (jobs.py), nigdy request.
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+import argparse
+import asyncio
+import os
+import smtplib
+import time
+
+# --- KONFIGURACJA ---
+# Domyślnie localhost:1025 - tam nasłuchuje "python mail.py sink"
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+MAIL_FROM = os.getenv("MAIL_FROM", "sklep@localhost")
+
+
+def send_mail(to: str, subject: str, body: str):
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    message.set_content(body)
+
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as smtp:
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        smtp.send_message(message)
+
+
+# --- SERWER-ZLEW SMTP ---
+# Minimalny podzbiór protokołu (HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) - wystarcza smtplib.
+class SinkProtocol:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.count = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 sklep-sink ESMTP")
+        recipients = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    await reply("250-sklep-sink")
+                    await reply("250 8BITMIME")
+                elif verb == "HELO":
+                    await reply("250 sklep-sink")
+                elif verb == "MAIL":
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[-1].strip(" <>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 Koniec danych: <CRLF>.<CRLF>")
+                    data = await self._read_data(reader)
+                    path = self._save(data)
+                    print(f"Mail do {', '.join(recipients)} -> {path}")
+                    await reply("250 OK zapisano")
+                elif verb == "RSET":
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "NOOP":
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Do widzenia")
+                    break
+                else:
+                    await reply("502 Nieobsługiwane polecenie")
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_data(reader: asyncio.StreamReader) -> bytes:
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            # Kropka na początku linii jest podwajana przez nadawcę (RFC 5321, 4.5.2)
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+    def _save(self, data: bytes) -> str:
+        self.count += 1
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.count}.eml")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+async def run_sink(host: str, port: int, directory: str):
+    os.makedirs(directory, exist_ok=True)
+    sink = SinkProtocol(directory)
+    server = await asyncio.start_server(sink.handle, host, port)
+    print(f"Serwer-zlew SMTP na {host}:{port}, maile w {os.path.abspath(directory)}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokalny serwer SMTP do testów")
+    parser.add_argument("command", choices=["sink"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=SMTP_PORT)
+    parser.add_argument("--dir", default="maile")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_sink(args.host, args.port, args.dir))
+    except KeyboardInterrupt:
+        pass
@@ -1,45 +1,97 @@
-from fastapi import FastAPI, Request, Depends, Form, Body
-from fastapi.responses import RedirectResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Depends, Form, Body, File, UploadFile
+from fastapi.responses import RedirectResponse, JSONResponse, Response, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import func
 from starlette.middleware.sessions import SessionMiddleware
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional, List
 from fastapi import HTTPException
+import asyncio
+import hashlib
 import json
-import uuid
+import logging
 
 import models
-from database import engine, get_db
-
-models.Base.metadata.create_all(bind=engine)
+import checkout
+import catalog
+import pagination
+import fulltext
+import querybudget
+import metrics
+import order_feed
+import analytics
+import jobs
+import product_io
+import inventory
+import database
+import principal
+import passwords
+import assets
+import pagecache
+import events
+import facets
+import migrate
+import images
+from principal import Principal, current_principal, verified_principal
+from database import engine, get_db, get_read_db, db_endpoint
+
+# Schemat tworzą migracje (python migrate.py upgrade) - przy starcie tylko sprawdzamy wersję
+migrate.check(engine)
 
 app = FastAPI()
+app.add_event_handler("shutdown", passwords.shutdown)
+app.add_event_handler("shutdown", images.shutdown)
 
+# Cache stron musi widzieć sesję (zalogowanym nie podajemy cudzych stron), więc jest dodany
+# przed SessionMiddleware - add_middleware owija aplikację, ostatnio dodany działa najpierw
+if pagecache.PAGE_CACHE_ENABLED:
+    app.add_middleware(pagecache.PageCacheMiddleware)
 app.add_middleware(SessionMiddleware, secret_key="bardzo-tajny-klucz")
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+if querybudget.QUERY_BUDGET_ENABLED:
+    app.add_middleware(querybudget.QueryBudgetMiddleware)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+asset_manifest = assets.AssetManifest("static")
+app.mount("/static", assets.HashedStaticFiles(directory="static", manifest=asset_manifest), name="static")
+app.mount(images.IMAGES_URL, images.ImageFiles(directory=images.IMAGES_DIR, check_dir=False), name="images")
+class Templates(Jinja2Templates):
+    # W trybie DB_ASYNC render odkładamy na po run_sync (database.db_endpoint) - do puli wątków
+    def TemplateResponse(self, *args, **kwargs):
+        if database.deferring_render():
+            return database.DeferredResponse(lambda: super(Templates, self).TemplateResponse(*args, **kwargs))
+        return super().TemplateResponse(*args, **kwargs)
+
+
+templates = Templates(directory="templates")
+templates.env.globals["asset"] = asset_manifest.url
+templates.env.globals["image_src"] = images.image_src
+templates.env.globals["image_srcset"] = images.image_srcset
+logger = logging.getLogger("sklep")
 
 # --- POMOCNICY ---
 def get_current_user(request: Request, db: Session):
+    # Pełny wiersz Klient/Pracownik z bazy - tam, gdzie potrzeba więcej niż nagłówka
+    # (do samego nagłówka wystarczy Depends(current_principal), bez zapytania)
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type") # Nowy klucz w sesji
 
     if not user_id:
         return None
 
-    if user_type == "pracownik":
-        return db.query(models.Pracownik).filter(models.Pracownik.id_pracownika == user_id).first()
-    else:
-        # Domyślnie szukamy klienta
-        return db.query(models.Klient).filter(models.Klient.id_klienta == user_id).first()
+    user = principal.load_user(db, user_id, user_type)
+    if user is None:
+        request.session.clear()
+    elif not principal.is_fresh(request):
+        # Przy okazji odświeżamy dane użytkownika zapisane w sesji
+        principal.remember(request, user)
+    return user
 
 # --- ENDPOINTY ---
 
 @app.get("/")
 @app.get("/index.html")
+@db_endpoint
 def read_root(
     request: Request, 
     category_id: Optional[int] = None,
@@ -47,38 +99,57 @@ def read_root(
     price_max: Optional[float] = None,
     search: Optional[str] = None, 
     sort: Optional[str] = None,
-    db: Session = Depends(get_db)
+    page: int = 1,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    user: Optional[Principal] = Depends(current_principal),
+    db: Session = Depends(get_read_db)
 ):
-    categories = db.query(models.Kategoria).all()
-    query = db.query(models.ModelProduktu)
-
-    if category_id:
-        query = query.filter(models.ModelProduktu.id_kategorii == category_id)
-    if price_min is not None:
-        query = query.filter(models.ModelProduktu.cena_katalogowa >= price_min)
-    if price_max is not None:
-        query = query.filter(models.ModelProduktu.cena_katalogowa <= price_max)
-    if search:
-        query = query.filter(models.ModelProduktu.nazwa_modelu.ilike(f"%{search}%"))
-
-    if sort == '1':
-        query = query.order_by(models.ModelProduktu.cena_katalogowa.asc())
-    elif sort == '2':
-        query = query.order_by(models.ModelProduktu.cena_katalogowa.desc())
-    elif sort == '3':
-        query = query.order_by(models.ModelProduktu.nazwa_modelu.asc())
-    elif sort == '4':
-        query = query.order_by(models.ModelProduktu.nazwa_modelu.desc())
+    # Wyszukiwanie idzie przez indeks pełnotekstowy; bez jawnego sortowania - wg trafności
+    ranked_ids = fulltext.search_product_ids(db, search) if search else None
+    by_relevance = ranked_ids is not None and sort in (None, "", "0")
+
+    # Najpierw snapshot z pamięci - baza tylko przy przeładowaniu katalogu
+    snapshot = catalog.cache.get(db)
+    if snapshot is not None:
+        categories = snapshot.categories
+        products = snapshot.list_products(category_id, price_min, price_max, ranked_ids, sort, by_relevance)
+        product_page = pagination.paginate_list(products, sort, page, limit, cursor, keyset=not by_relevance)
+        if ranked_ids is None:
+            facet_counts = snapshot.facets(category_id, price_min, price_max)
+        else:
+            by_id = snapshot.products_by_id()
+            facet_counts = facets.from_products([by_id[pid] for pid in ranked_ids if pid in by_id],
+                                                category_id, price_min, price_max)
     else:
-        query = query.order_by(models.ModelProduktu.id_modelu.desc())
-
-    products = query.all()
-    user = get_current_user(request, db)
+        # Katalog za duży na cache - filtrujemy i stronicujemy w bazie
+        categories = db.query(models.Kategoria).all()
+        query = db.query(models.ModelProduktu)
+
+        if category_id:
+            query = query.filter(models.ModelProduktu.id_kategorii == category_id)
+        if price_min is not None:
+            query = query.filter(models.ModelProduktu.cena_katalogowa >= price_min)
+        if price_max is not None:
+            query = query.filter(models.ModelProduktu.cena_katalogowa <= price_max)
+        if ranked_ids is not None:
+            query = query.filter(models.ModelProduktu.id_modelu.in_(ranked_ids))
+
+        if by_relevance:
+            # Trafień jest najwyżej SEARCH_MAX_RESULTS - układamy je w kolejności rankingu
+            rank = {pid: i for i, pid in enumerate(ranked_ids)}
+            products = sorted(query.all(), key=lambda p: rank[p.id_modelu])
+            product_page = pagination.paginate_list(products, sort, page, limit, keyset=False)
+        else:
+            product_page = pagination.paginate_query(query, sort, page, limit, cursor)
+        facet_counts = facets.db_facets(db, catalog.cache.version, category_id, price_min, price_max, ranked_ids)
 
     return templates.TemplateResponse("index.html", {
         "request": request, 
-        "products": products,
+        "products": product_page.items,
+        "product_page": product_page,
         "categories": categories,
+        "facets": facets.navigation(facet_counts, categories, request.query_params, category_id, price_min, price_max),
         "user": user,
         "current_category_id": category_id,
         "price_min": price_min,
@@ -88,40 +159,83 @@ def read_root(
     })
 
 
+@app.get("/api/search/suggest")
+@db_endpoint
+def search_suggest(q: str = "", db: Session = Depends(get_read_db)):
+    # Podpowiedzi do pola wyszukiwania (typeahead)
+    return fulltext.typeahead(db, q)
+
+
+def products_details_response(request: Request, db: Session, ids, since: Optional[str]):
+    ids = catalog.normalize_ids(ids)
+    snapshot = catalog.cache.get(db)
+
+    if snapshot is not None:
+        # Skróty produktów są już zakodowane w snapshocie - sklejamy gotowe fragmenty JSON
+        wanted = snapshot.changed_ids(ids, since) if since else ids
+        fragments = [(pid, snapshot.summary_json(pid)) for pid in wanted]
+        items = "[" + ",".join(f for _, f in fragments if f is not None) + "]"
+        removed = [pid for pid, f in fragments if f is None]
+        version = snapshot.version_token
+    else:
+        # Katalog poza cache - jedno zapytanie IN (...)
+        products = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu.in_(ids)).all()
+        items = json.dumps([catalog.product_summary(p) for p in products])
+        found = {p.id_modelu for p in products}
+        removed = [pid for pid in ids if pid not in found]
+        version = None
+
+    if since:
+        # Tryb przyrostowy: tylko zmienione pozycje + wersja do następnego zapytania
+        body = f'{{"version": {json.dumps(version)}, "changed": {items}, "removed": {json.dumps(removed)}}}'
+    else:
+        body = items
+
+    # Silny ETag z treści odpowiedzi - poprawny także między różnymi workerami
+    etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if version:
+        headers["X-Catalog-Version"] = version
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/products-details")
+@db_endpoint
+def get_products_details(request: Request, ids: str = "", since: Optional[str] = None, db: Session = Depends(get_read_db)):
+    # Wersja GET (?ids=1,2,3) - przeglądarka sama wysyła If-None-Match i dostaje 304
+    try:
+        id_list = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        return JSONResponse(status_code=400, content="Nieprawidłowa lista ids")
+    return products_details_response(request, db, id_list, since)
+
+
 @app.post("/api/products-details")
-def get_products_details_api(ids: List[int] = Body(...), db: Session = Depends(get_db)):
+@db_endpoint
+def get_products_details_api(request: Request, ids: List[int] = Body(...), since: Optional[str] = None, db: Session = Depends(get_read_db)):
     # Pobiera listę produktów na podstawie listy ID przesłanej z JS
-    products = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu.in_(ids)).all()
-
-    result = []
-    for p in products:
-        result.append({
-            "id": p.id_modelu,
-            "name": p.nazwa_modelu,
-            "price": p.cena_katalogowa,
-            "image": p.zdjecie_url,
-            "stock": p.stan_magazynowy
-        })
-    return result
+    return products_details_response(request, db, ids, since)
 
 # --- NOWOŚĆ: Strona Podsumowania (Checkout) z autouzupełnianiem ---
 @app.get("/podsumowanie")
-def checkout_page(request: Request, db: Session = Depends(get_db)):
+@db_endpoint
+def checkout_page(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
     if not user:
         return RedirectResponse(url="/login.html")
     
-    klient_adres_entry = db.query(models.KlientAdres).filter(
+    # Adres domyślny jednym zapytaniem (JOIN zamiast dwóch SELECT-ów)
+    default_address = db.query(models.Adres).join(
+        models.KlientAdres, models.KlientAdres.adres2id_adresu == models.Adres.id_adresu
+    ).filter(
         models.KlientAdres.klient2id_klienta == user.id_klienta,
         models.KlientAdres.czy_domyslny == True
     ).first()
 
-    default_address = None
-    if klient_adres_entry:
-        default_address = db.query(models.Adres).filter(
-            models.Adres.id_adresu == klient_adres_entry.adres2id_adresu
-        ).first()
-
     return templates.TemplateResponse("podsumowanie.html", {
         "request": request, 
         "adres": default_address
@@ -129,6 +243,7 @@ def checkout_page(request: Request, db: Session = Depends(get_db)):
 
 # --- NOWOŚĆ: Usuwanie adresu domyślnego (Dezaktywacja flagi) ---
 @app.post("/address/remove-default")
+@db_endpoint
 def remove_default_address(request: Request, db: Session = Depends(get_db)):
     user = get_current_user(request, db)
     if not user:
@@ -146,9 +261,9 @@ def remove_default_address(request: Request, db: Session = Depends(get_db)):
     return RedirectResponse(url="/podsumowanie", status_code=303)
 
 # --- NOWOŚĆ: Składanie zamówienia z formularza HTML ---
-# Wklej to do main.py (upewnij się, że masz importy: uuid, datetime, json)
 
 @app.post("/order/submit")
+@db_endpoint
 def submit_order(
         request: Request,
         ulica: str = Form(...),
@@ -168,115 +283,71 @@ def submit_order(
         return "Jesteś zalogowany jako Pracownik. Zaloguj się jako Klient."
 
     try:
-        cart_items = json.loads(cart_json)
-        if not cart_items:
-            return "Twój koszyk jest pusty."
-
-        # 1. Adres
-        new_adres = models.Adres(
-            ulica=ulica, nr_domu=nr_domu, nr_lokalu=nr_lokalu,
-            kod_pocztowy=kod_pocztowy, miejscowosc=miejscowosc
+        order_id = checkout.place_order(
+            db, user,
+            adres_data={
+                "ulica": ulica, "nr_domu": nr_domu, "nr_lokalu": nr_lokalu,
+                "kod_pocztowy": kod_pocztowy, "miejscowosc": miejscowosc
+            },
+            cart_items=json.loads(cart_json)
         )
-        db.add(new_adres)
-        db.commit()
-        db.refresh(new_adres)
-
-        # 2. Obliczanie sumy
-        suma_calkowita = 0.0
-        order_items_data = []
-
-        for item in cart_items:
-            pid = int(item['id'])
-            qty = int(item['qty'])
-            prod = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu == pid).first()
-            if prod:
-                suma_calkowita += prod.cena_katalogowa * qty
-                order_items_data.append({"product": prod, "qty": qty, "price": prod.cena_katalogowa})
-
-        # 3. Zamówienie
-        numer_zam = f"ZAM-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:4].upper()}"
-
-        new_order = models.Zamowienie(
-            numer_zamowienia=numer_zam,
-            data_zlozenia=datetime.now(),
-            status_zamowienia="Nowe",
-            suma_calkowita=suma_calkowita,
-            id_klienta=user.id_klienta,
-            id_adresu=new_adres.id_adresu,
-            email_kontakt_do_zam=user.adres_email
-        )
-        db.add(new_order)
-        db.commit()
-        db.refresh(new_order)
-
-        # 4. Pozycje i stan magazynowy
-        for data in order_items_data:
-            prod = data["product"]
-            qty = data["qty"]
-            prod.stan_magazynowy -= qty  # Aktualizacja stanu
-
-            pozycja = models.PozycjaZamowienia(
-                ilosc=qty,
-                cena_w_chwili_zakupu=data["price"],
-                id_modelu=prod.id_modelu,
-                id_zamowienia=new_order.id_zamowienia
-            )
-            db.add(pozycja)
-
-        db.commit()
 
         # --- TU JEST KLUCZOWE PRZEKIEROWANIE ---
         # Kierujemy do endpointu, który wyświetla szczegóły zamówienia
         return RedirectResponse(
-            url=f"/zamowienie/{new_order.id_zamowienia}?clear_cart=1",
+            url=f"/zamowienie/{order_id}?clear_cart=1",
             status_code=303
         )
 
+    except json.JSONDecodeError:
+        return "Nieprawidłowa zawartość koszyka. Odśwież koszyk."
+
+    except checkout.CheckoutError as e:
+        db.rollback()
+        return str(e)
+
     except Exception as e:
         db.rollback()
-        print(f"Błąd zamówienia: {e}")
+        logger.exception("Błąd zamówienia")
         return f"Wystąpił błąd: {str(e)}"
 
 
 @app.get("/zamowienie/{order_id}")
-def order_details(request: Request, order_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def order_details(request: Request, order_id: int, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
     if not user:
         return RedirectResponse(url="/login.html")
 
+    # Adres dociągamy JOIN-em, pozycje razem z produktami jednym dodatkowym SELECT-em
+    # (bez tego szablon robił osobne zapytanie o produkt dla każdej pozycji)
+    query = db.query(models.Zamowienie).options(
+        joinedload(models.Zamowienie.adres),
+        selectinload(models.Zamowienie.pozycje).joinedload(models.PozycjaZamowienia.model)
+    ).filter(models.Zamowienie.id_zamowienia == order_id)
+
     # Rozróżniamy logikę dla Klienta i Pracownika
-    if hasattr(user, "id_roli"):
-        # PRACOWNIK: Widzi każde zamówienie po jego ID
-        order = db.query(models.Zamowienie).filter(
-            models.Zamowienie.id_zamowienia == order_id
-        ).first()
-    else:
-        # KLIENT: Widzi tylko SWOJE zamówienia
-        order = db.query(models.Zamowienie).filter(
-            models.Zamowienie.id_zamowienia == order_id,
-            models.Zamowienie.id_klienta == user.id_klienta
-        ).first()
+    if not hasattr(user, "id_roli"):
+        # KLIENT: Widzi tylko SWOJE zamówienia (PRACOWNIK widzi każde)
+        query = query.filter(models.Zamowienie.id_klienta == user.id_klienta)
+
+    order = query.first()
 
     if not order:
         return "Nie znaleziono zamówienia lub brak dostępu."
 
-    adres = db.query(models.Adres).filter(models.Adres.id_adresu == order.id_adresu).first()
-
-    items = db.query(models.PozycjaZamowienia).filter(
-        models.PozycjaZamowienia.id_zamowienia == order_id
-    ).all()
-
     return templates.TemplateResponse("szczegoly_zamowienia.html", {
         "request": request,
         "order": order,
-        "items": items,
-        "adres": adres,
+        "items": order.pozycje,
+        "adres": order.adres,
         "user": user
     })
 
 
 # --- ZMIANA STATUSU ZAMÓWIENIA (DLA WSZYSTKICH PRACOWNIKÓW) ---
 @app.post("/api/update-order-status")
+@db_endpoint
 def update_order_status(
         request: Request,
         order_id: int = Form(...),
@@ -301,58 +372,91 @@ def update_order_status(
         db.add(log)
 
         # 2. Zmień status
+        old_status = order.status_zamowienia
         order.status_zamowienia = new_status
+
+        # 3. Powiadomienie klienta - wysyła worker kolejki, zadanie zapisuje się razem ze zmianą
+        jobs.enqueue(db, "mail_zmiana_statusu", id_zamowienia=order.id_zamowienia, nowy_status=new_status)
         db.commit()
 
+        # 4. Panele i konto klienta na żywo
+        events.publish_order(order.id_zamowienia, order.numer_zamowienia, new_status, order.id_klienta)
+
+        # 5. Liczniki w tabelach analitycznych
+        analytics.record_status_change(db, order, old_status, new_status)
+        analytics.pending.flush_if_due(db)
+
     # Przekieruj z powrotem na odpowiedni panel
     referer = request.headers.get("referer")
     return RedirectResponse(url=referer or "/", status_code=303)
 
 
 # --- ZMIANA CENY (TYLKO SPRZEDAWCA I ADMIN) ---
+# Pojedyncze zmiany z formularzy idą tą samą drogą co zbiorcze (inventory) - z blokadą wiersza i logiem.
+# Endpointy zapisujące sprawdzają rolę w bazie (verified_principal), nie w ciasteczku sesji.
 @app.post("/api/update-price")
+@db_endpoint
 def update_price(
         request: Request,
         product_id: int = Form(...),
         new_price: float = Form(...),
+        user: Optional[Principal] = Depends(verified_principal),
         db: Session = Depends(get_db)
 ):
-    user = get_current_user(request, db)
     # Rola 1 (Admin) lub 2 (Sprzedawca)
-    if not user or getattr(user, "id_roli", 0) not in [1, 2]:
+    if not user or user.id_roli not in [1, 2]:
         return JSONResponse(status_code=403, content="Brak uprawnień")
 
-    product = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu == product_id).first()
-    if product:
-        product.cena_katalogowa = new_price
-        db.commit()
-
+    applied, results = inventory.apply_changes(
+        db, [{"id": product_id, "field": "cena_katalogowa", "op": "set", "value": new_price}], user)
+    if not applied:
+        return JSONResponse(status_code=422, content={"error": results[0]["message"]})
     return RedirectResponse(url=request.headers.get("referer"), status_code=303)
 
 
 # --- ZMIANA STANU MAGAZYNOWEGO (TYLKO MAGAZYNIER I ADMIN) ---
 @app.post("/api/update-stock")
+@db_endpoint
 def update_stock(
         request: Request,
         product_id: int = Form(...),
         new_stock: int = Form(...),
+        user: Optional[Principal] = Depends(verified_principal),
         db: Session = Depends(get_db)
 ):
-    user = get_current_user(request, db)
     # Rola 1 (Admin) lub 3 (Magazynier)
-    if not user or getattr(user, "id_roli", 0) not in [1, 3]:
+    if not user or user.id_roli not in [1, 3]:
         return JSONResponse(status_code=403, content="Brak uprawnień")
 
-    product = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu == product_id).first()
-    if product:
-        product.stan_magazynowy = new_stock
-        db.commit()
-
+    applied, results = inventory.apply_changes(
+        db, [{"id": product_id, "field": "stan_magazynowy", "op": "set", "value": new_stock}], user)
+    if not applied:
+        return JSONResponse(status_code=422, content={"error": results[0]["message"]})
     return RedirectResponse(url=request.headers.get("referer"), status_code=303)
 
 
+# --- ZBIORCZE ZMIANY STANÓW I CEN (SIATKA W PANELACH) ---
+# {"changes": [{"id": 5, "field": "stan_magazynowy", "op": "add", "value": -2}, ...]}
+# Jedna transakcja, wszystko albo nic; wynik dla każdej pozycji w kolejności zmian.
+@app.post("/api/products/batch")
+@db_endpoint
+def batch_update_products(
+        changes: list = Body(..., embed=True),
+        user: Optional[Principal] = Depends(verified_principal),
+        db: Session = Depends(get_db)
+):
+    if not user or not user.is_staff:
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+    try:
+        applied, results = inventory.apply_changes(db, changes, user)
+    except inventory.BatchError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return JSONResponse(status_code=200 if applied else 422, content={"applied": applied, "results": results})
+
+
 # --- PEŁNA EDYCJA PRODUKTU (ADMIN) ---
 @app.post("/admin/edit-product")
+@db_endpoint
 def edit_product_full(
         request: Request,
         product_id: int = Form(...),
@@ -362,9 +466,19 @@ def edit_product_full(
         category_id: int = Form(...),
         zdjecie_url: str = Form(""),
         opis: str = Form(""),
+        zdjecie: Optional[UploadFile] = File(None),
+        user: Optional[Principal] = Depends(verified_principal),
         db: Session = Depends(get_db)
 ):
-    # Tutaj zakładamy, że tylko admin ma dostęp do tego endpointu (można dodać check jak wyżej)
+    # Tylko admin - sprawdzane przed zapisem przesłanego zdjęcia
+    if not user or user.id_roli != 1:
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+    if zdjecie is not None and zdjecie.filename:
+        # Przesłane zdjęcie wygrywa z polem URL; warianty liczą się w tle (images.py)
+        try:
+            zdjecie_url = images.store(zdjecie.file)
+        except images.ImageError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
     product = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu == product_id).first()
     if product:
         product.nazwa_modelu = nazwa_modelu
@@ -374,6 +488,11 @@ def edit_product_full(
         product.zdjecie_url = zdjecie_url
         product.opis = opis
         db.commit()
+        catalog.cache.patch_product(
+            product_id, nazwa_modelu=nazwa_modelu, cena_katalogowa=cena, stan_magazynowy=stan,
+            id_kategorii=category_id, zdjecie_url=zdjecie_url, opis=opis
+        )
+        events.publish_products({product_id: {"stan_magazynowy": stan, "cena_katalogowa": cena}})
 
     return RedirectResponse(url="/admin.html", status_code=303)
 
@@ -381,40 +500,48 @@ def edit_product_full(
 def login_page(request: Request): return templates.TemplateResponse("login.html", {"request": request})
 
 
+# Logowanie i rejestracja są `async def`: weryfikacja hasła trwa kilkadziesiąt ms CPU
+# i idzie do puli procesów (passwords), a zapytania - przez database.run_db.
 @app.post("/login")
-def login_user(
+async def login_user(
         request: Request,
         identyfikator: str = Form(...),
         password: str = Form(...),
         db: Session = Depends(get_db)
 ):
-    # 1. Sprawdzamy KLIENTA
-    klient = db.query(models.Klient).filter(models.Klient.adres_email == identyfikator).first()
-    if klient and klient.haslo_hash == password:  # Pamiętaj o temacie hashowania później
-        request.session["user_id"] = klient.id_klienta
-        request.session["user_type"] = "klient"
-        return RedirectResponse(url="/", status_code=303)
+    # Próba liczy się od razu (przed await) - równoległe zgadywanie nie ominie limitu
+    if not passwords.login_limiter.reserve(identyfikator):
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": "Zbyt wiele nieudanych prób logowania. Spróbuj ponownie za kilka minut."
+        }, status_code=429)
+
+    credentials = await database.run_db(db, principal.find_credentials, identyfikator)
+    ok, new_hash = await passwords.check_password(password, credentials.haslo_hash if credentials else None)
+    if not ok:
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": "Błędny email/login lub hasło"
+        })
 
-    # 2. Sprawdzamy PRACOWNIKA
-    pracownik = db.query(models.Pracownik).filter(models.Pracownik.login == identyfikator).first()
-    if pracownik and pracownik.haslo_hash == password:
-        request.session["user_id"] = pracownik.id_pracownika
-        request.session["user_type"] = "pracownik"
-
-        # --- LOGIKA PRZEKIEROWAŃ WG ROLI ---
-        if pracownik.id_roli == 1:
-            return RedirectResponse(url="/admin.html", status_code=303)
-        elif pracownik.id_roli == 2:
-            return RedirectResponse(url="/sprzedawca.html", status_code=303)
-        elif pracownik.id_roli == 3:
-            return RedirectResponse(url="/magazynier.html", status_code=303)
-        else:
-            return "Nieznana rola pracownika"
+    passwords.login_limiter.reset(identyfikator)
+    logged_in = principal.remember(request, credentials.principal)
+    # Hasło zapisane otwartym tekstem albo skrót ze starymi parametrami - podmieniamy przy okazji
+    if new_hash:
+        await database.run_db(db, principal.save_password_hash, logged_in, new_hash)
 
-    return templates.TemplateResponse("login.html", {
-        "request": request,
-        "error": "Błędny email/login lub hasło"
-    })
+    if not logged_in.is_staff:
+        return RedirectResponse(url="/", status_code=303)
+
+    # --- LOGIKA PRZEKIEROWAŃ WG ROLI ---
+    if logged_in.id_roli == 1:
+        return RedirectResponse(url="/admin.html", status_code=303)
+    elif logged_in.id_roli == 2:
+        return RedirectResponse(url="/sprzedawca.html", status_code=303)
+    elif logged_in.id_roli == 3:
+        return RedirectResponse(url="/magazynier.html", status_code=303)
+    else:
+        return "Nieznana rola pracownika"
 
 @app.get("/logout")
 def logout(request: Request):
@@ -424,17 +551,27 @@ def logout(request: Request):
 @app.get("/rejestracja.html")
 def register_page(request: Request): return templates.TemplateResponse("rejestracja.html", {"request": request})
 
-@app.post("/register")
-def register_user(imie: str = Form(...), nazwisko: str = Form(...), email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    if db.query(models.Klient).filter(models.Klient.adres_email == email).first(): return "Email zajęty"
-    new_user = models.Klient(imie=imie, nazwisko=nazwisko, adres_email=email, haslo_hash=password, data_rejestracji=datetime.now())
+def _email_taken(db: Session, email: str) -> bool:
+    return db.query(models.Klient.id_klienta).filter(models.Klient.adres_email == email).first() is not None
+
+
+def _create_client(db: Session, imie, nazwisko, email, haslo_hash):
+    new_user = models.Klient(imie=imie, nazwisko=nazwisko, adres_email=email, haslo_hash=haslo_hash, data_rejestracji=datetime.now())
     try: db.add(new_user); db.commit()
     except: db.rollback()
+
+
+@app.post("/register")
+async def register_user(imie: str = Form(...), nazwisko: str = Form(...), email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+    if await database.run_db(db, _email_taken, email): return "Email zajęty"
+    haslo_hash = await passwords.make_hash(password)
+    await database.run_db(db, _create_client, imie, nazwisko, email, haslo_hash)
     return RedirectResponse(url="/login.html", status_code=303)
 
 
 @app.get("/konto.html")
-def account_page(request: Request, db: Session = Depends(get_db)):
+@db_endpoint
+def account_page(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
     if not user:
         return RedirectResponse(url="/login.html")
@@ -462,74 +599,261 @@ def account_page(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.get("/koszyk.html")
-def cart_page(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+def cart_page(request: Request, user: Optional[Principal] = Depends(current_principal)):
     return templates.TemplateResponse("koszyk.html", {"request": request, "user": user})
 
 @app.get("/szczegoly.html")
-def details_page(request: Request, id: int = None, db: Session = Depends(get_db)):
+@db_endpoint
+def details_page(request: Request, id: int = None, user: Optional[Principal] = Depends(current_principal),
+                 db: Session = Depends(get_read_db)):
     product = None
     if id: product = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu == id).first()
-    return templates.TemplateResponse("szczegoly.html", {"request": request, "product": product})
+    return templates.TemplateResponse("szczegoly.html", {"request": request, "product": product, "user": user})
 
 @app.get("/admin.html")
 @app.get("/admin.html")
-def admin_panel(request: Request, db: Session = Depends(get_db)):
+@db_endpoint
+def admin_panel(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
 
     # Zabezpieczenie: Tylko Admin (id_roli = 1)
     if not user or getattr(user, "id_roli", 0) != 1:
         return RedirectResponse(url="/login.html")
 
-    products = db.query(models.ModelProduktu).all()
+    # Kategoria produktu w tym samym zapytaniu (JOIN) - tabela pokazuje jej nazwę
+    products = db.query(models.ModelProduktu).options(joinedload(models.ModelProduktu.kategoria)).all()
     categories = db.query(models.Kategoria).all()
-    # NOWOŚĆ: Admin musi widzieć zamówienia
-    orders = db.query(models.Zamowienie).order_by(models.Zamowienie.data_zlozenia.desc()).all()
+    # NOWOŚĆ: Admin musi widzieć zamówienia - pierwsza strona, reszta doczytywana z /api/orders
+    orders_page = order_feed.fetch_page(db)
 
     return templates.TemplateResponse("admin.html", {
         "request": request,
         "user": user,  # Przekazujemy obiekt użytkownika
         "products": products,
         "categories": categories,
-        "orders": orders  # Przekazujemy zamówienia
+        "orders": orders_page.items,  # Przekazujemy zamówienia
+        "next_cursor": orders_page.next_cursor,
+        "orders_total": order_feed.count_orders(db),
+        "statusy": order_feed.STATUSY_ZAMOWIEN,
+        "panel": "admin",
+        "orders_order": "desc"
     })
 
 
 # --- PANEL SPRZEDAWCY ---
 @app.get("/sprzedawca.html")
-def sprzedawca_panel(request: Request, db: Session = Depends(get_db)):
+@db_endpoint
+def sprzedawca_panel(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
     if not user or getattr(user, "id_roli", None) != 2: return RedirectResponse(url="/login.html")
 
-    orders = db.query(models.Zamowienie).order_by(models.Zamowienie.data_zlozenia.desc()).all()
+    orders_page = order_feed.fetch_page(db)
     products = db.query(models.ModelProduktu).all()  # <--- DODANO
 
     return templates.TemplateResponse("sprzedawca.html", {
-        "request": request, "user": user, "orders": orders, "products": products  # <--- PRZEKAŻ PRODUKTY
+        "request": request, "user": user, "orders": orders_page.items, "products": products,  # <--- PRZEKAŻ PRODUKTY
+        "next_cursor": orders_page.next_cursor, "orders_total": order_feed.count_orders(db),
+        "statusy": order_feed.STATUSY_ZAMOWIEN, "panel": "sprzedawca", "orders_order": "desc"
     })
 
 
 @app.get("/magazynier.html")
-def magazynier_panel_page(request: Request, db: Session = Depends(get_db)):
+@db_endpoint
+def magazynier_panel_page(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
     if not user or getattr(user, "id_roli", None) != 3: return RedirectResponse(url="/login.html")
 
-    orders = db.query(models.Zamowienie).order_by(models.Zamowienie.data_zlozenia.asc()).all()
+    # Magazyn pracuje od najstarszych zamówień
+    orders_page = order_feed.fetch_page(db, ascending=True)
     products = db.query(models.ModelProduktu).all()  # <--- DODANO
 
     return templates.TemplateResponse("magazynier.html", {
-        "request": request, "user": user, "orders": orders, "products": products  # <--- PRZEKAŻ PRODUKTY
+        "request": request, "user": user, "orders": orders_page.items, "products": products,  # <--- PRZEKAŻ PRODUKTY
+        "next_cursor": orders_page.next_cursor, "ready_count": order_feed.count_orders(db, ["W magazynie"]),
+        "statusy": order_feed.STATUSY_ZAMOWIEN, "panel": "magazynier", "orders_order": "asc"
     })
 
 @app.get("/magazyn.html")
-def magazynier_panel(request: Request, db: Session = Depends(get_db)):
-    orders = db.query(models.Zamowienie).order_by(models.Zamowienie.data_zlozenia.desc()).all()
-    return templates.TemplateResponse("magazynier.html", {
-        "request": request, 
-        "orders": orders
-    })
+def magazynier_panel(request: Request):
+    # Stary adres panelu magazynu - renderował całą historię zamówień bez logowania
+    return RedirectResponse(url="/magazynier.html")
+
+
+# --- STATYSTYKI PULI POŁĄCZEŃ (TYLKO ADMIN) ---
+@app.get("/api/db-pool")
+@db_endpoint
+def db_pool_stats(request: Request, db: Session = Depends(get_db)):
+    user = get_current_user(request, db)
+    if not user or getattr(user, "id_roli", 0) != 1:
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+
+    stats = {"sync": database.pool_stats(database.engine)}
+    if database.async_engine is not None:
+        stats["async"] = database.pool_stats(database.async_engine.sync_engine)
+    replica = database.replica_engine or database.async_replica_engine
+    if replica is not None:
+        router = database.replica_router
+        stats["replica"] = {**database.pool_stats(getattr(replica, "sync_engine", replica)),
+                            "lag": router.lag, "usable": router.usable(), "reads": dict(router.reads)}
+    return stats
+
+
+# --- ANALITYKA DLA PANELI (JSON z tabel zbiorczych) ---
+def _analytics_allowed(user: Optional[Principal]) -> bool:
+    # Administrator i sprzedawca
+    return user is not None and user.is_staff and user.id_roli in (1, 2)
+
+
+@app.get("/api/analytics/sales")
+@db_endpoint
+def analytics_sales(days: int = analytics.DEFAULT_DAYS, user: Optional[Principal] = Depends(current_principal),
+                    db: Session = Depends(get_db)):
+    if not _analytics_allowed(user):
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+    analytics.pending.flush(db)
+    return analytics.sales_per_day(db, analytics.clamp_days(days))
+
+
+@app.get("/api/analytics/products")
+@db_endpoint
+def analytics_products(days: int = analytics.DEFAULT_DAYS, limit: int = 10,
+                       user: Optional[Principal] = Depends(current_principal), db: Session = Depends(get_db)):
+    if not _analytics_allowed(user):
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+    analytics.pending.flush(db)
+    return analytics.top_products(db, analytics.clamp_days(days), min(max(limit, 1), 100))
+
+
+@app.get("/api/analytics/categories")
+@db_endpoint
+def analytics_categories(days: int = analytics.DEFAULT_DAYS, user: Optional[Principal] = Depends(current_principal),
+                         db: Session = Depends(get_db)):
+    if not _analytics_allowed(user):
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+    analytics.pending.flush(db)
+    return analytics.sales_per_category(db, analytics.clamp_days(days))
+
+
+@app.get("/api/analytics/statuses")
+@db_endpoint
+def analytics_statuses(user: Optional[Principal] = Depends(current_principal), db: Session = Depends(get_db)):
+    if not _analytics_allowed(user):
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+    analytics.pending.flush(db)
+    return analytics.status_counts(db)
+
+
+# --- METRYKI (Prometheus) ---
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404)
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        return PlainTextResponse("Brak uprawnień", status_code=403)
+
+    engines = {"sync": database.engine}
+    if database.async_engine is not None:
+        engines["async"] = database.async_engine.sync_engine
+    replica = database.replica_engine or database.async_replica_engine
+    if replica is not None:
+        engines["replica"] = getattr(replica, "sync_engine", replica)
+    pools = {label: database.pool_stats(e) for label, e in engines.items()}
+    pool_gauges = {
+        f"sklep_db_pool_{name}": (opis, [({"engine": label}, stats[name]) for label, stats in pools.items() if name in stats])
+        for name, opis in (("size", "Rozmiar puli połączeń"),
+                           ("checkedout", "Połączenia wypożyczone z puli"),
+                           ("overflow", "Połączenia ponad rozmiar puli"))
+    }
+    with database.SessionLocal() as db:
+        job_counts = jobs.queue_stats(db)
+    pool_gauges["sklep_jobs"] = ("Zadania w kolejce wg rodzaju i statusu",
+                                 [({"rodzaj": rodzaj, "status": status}, liczba)
+                                  for (rodzaj, status), liczba in sorted(job_counts.items())])
+    pool_gauges["sklep_events_subscribers"] = ("Otwarte połączenia /api/events", [({}, len(events.broker))])
+    pool_gauges["sklep_page_cache"] = ("Cache stron: trafienia, chybienia i liczba wpisów",
+                                       [({"wynik": "hit"}, pagecache.cache.hits),
+                                        ({"wynik": "miss"}, pagecache.cache.misses),
+                                        ({"wynik": "entries"}, len(pagecache.cache))])
+    if replica is not None:
+        router = database.replica_router
+        pool_gauges["sklep_db_reads"] = ("Odczyty przez get_read_db wg bazy", [({"baza": k}, v) for k, v in router.reads.items()])
+        pool_gauges["sklep_db_replica_lag_seconds"] = ("Opóźnienie repliki przy ostatnim sprawdzeniu (-1 = niedostępna)",
+                                                       [({}, -1 if router.lag is None else router.lag)])
+    return PlainTextResponse(metrics.registry.render(pool_gauges), media_type="text/plain; version=0.0.4")
+
+
+# --- ZDARZENIA NA ŻYWO (SSE) ---
+# Zmiany stanów i cen widzą wszyscy (?products=5,7 zawęża do wybranych produktów),
+# zmiany zamówień - personel wszystkie, klient tylko swoje
+@app.get("/api/events")
+async def events_endpoint(request: Request, products: Optional[str] = None,
+                          user: Optional[Principal] = Depends(current_principal)):
+    if not events.EVENTS_ENABLED:
+        raise HTTPException(status_code=404)
+    if len(events.broker) >= events.EVENTS_MAX_SUBSCRIBERS:
+        # Przeglądarka spróbuje ponownie po czasie z nagłówka retry (domyślnie kilka sekund)
+        return PlainTextResponse("Za dużo połączeń", status_code=503)
+
+    try:
+        product_ids = catalog.normalize_ids(products.split(",")) if products else None
+    except ValueError:
+        return JSONResponse(status_code=400, content="Niepoprawna lista produktów")
+    subscriber = events.Subscriber(
+        loop=asyncio.get_running_loop(),
+        staff=user is not None and user.is_staff,
+        client_id=user.user_id if user is not None and not user.is_staff else None,
+        product_ids=frozenset(product_ids) if product_ids else None,
+    )
+    return StreamingResponse(
+        events.stream(subscriber, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx nie buforuje strumienia
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --- LISTA ZAMÓWIEŃ DLA PANELI (JSON, STRONICOWANA) ---
+ORDER_ROW_TEMPLATES = {
+    "admin": "_wiersze_zamowien_admin.html",
+    "sprzedawca": "_wiersze_zamowien_sprzedawca.html",
+    "magazynier": "_wiersze_zamowien_magazynier.html",
+}
+
+@app.get("/api/orders")
+@db_endpoint
+def orders_api(
+        request: Request,
+        status: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        client_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        order: str = "desc",
+        panel: Optional[str] = None,
+        ids: Optional[str] = None,
+        db: Session = Depends(get_read_db)
+):
+    user = get_current_user(request, db)
+    if not user or not hasattr(user, "id_roli"):
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+
+    # ?ids=12,15 - odświeżenie konkretnych wierszy po zdarzeniu z /api/events (z tymi samymi filtrami)
+    page = order_feed.fetch_page(
+        db, order_feed.parse_statuses(status), date_from, date_to, client_id,
+        cursor=cursor, limit=limit, ascending=(order == "asc"), order_ids=order_feed.parse_ids(ids)
+    )
+    result = {
+        "items": [order_feed.order_to_dict(o) for o in page.items],
+        "next_cursor": page.next_cursor
+    }
+    # Panele dostają od razu gotowe wiersze tabeli (ten sam szablon co przy pierwszym renderze)
+    if panel in ORDER_ROW_TEMPLATES:
+        result["html"] = templates.get_template(ORDER_ROW_TEMPLATES[panel]).render(orders=page.items)
+    return result
 
 @app.delete("/admin/delete-product/{product_id}")
+@db_endpoint
 def delete_product_endpoint(product_id: int, db: Session = Depends(get_db)):
     product = db.query(models.ModelProduktu).filter(models.ModelProduktu.id_modelu == product_id).first()
     
@@ -538,12 +862,14 @@ def delete_product_endpoint(product_id: int, db: Session = Depends(get_db)):
     try:
         db.delete(product)
         db.commit()
+        catalog.cache.remove_product(product_id)
         return {"status": "success", "message": "Produkt usunięty"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Nie można usunąć produktu (może jest w zamówieniach?): {str(e)}")
     
 @app.post("/admin/add-product")
+@db_endpoint
 def add_product_endpoint(
     request: Request,
     category_id: int = Form(...),
@@ -560,4 +886,45 @@ def add_product_endpoint(
     
     db.add(new_product)
     db.commit()
-    return RedirectResponse(url="/admin.html", status_code=303)
\ No newline at end of file
+    catalog.cache.add_product(new_product)
+    return RedirectResponse(url="/admin.html", status_code=303)
+
+
+# --- IMPORT / EKSPORT KATALOGU (ADMIN) ---
+# Zwykłe `def` bez db_endpoint i własna sesja: import tysięcy wierszy ma się wykonywać w puli
+# wątków także przy DB_ASYNC (run_sync trzymałby pętlę zdarzeń przez cały plik), a eksport
+# jest strumieniowany dłużej, niż żyje sesja requestu.
+@app.get("/admin/products/export")
+def export_products(format: str = "csv", user: Optional[Principal] = Depends(current_principal)):
+    if not user or user.id_roli != 1:
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+    if format not in product_io.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Nieznany format: {format}")
+    return StreamingResponse(
+        product_io.export_chunks(database.SessionLocal, format),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="produkty.{format}"'},
+    )
+
+
+@app.post("/admin/products/import")
+def import_products(
+        file: UploadFile = File(...),
+        key: str = Form("id"),
+        dry_run: bool = Form(False),
+        user: Optional[Principal] = Depends(verified_principal)
+):
+    if not user or user.id_roli != 1:
+        return JSONResponse(status_code=403, content="Brak uprawnień")
+
+    fmt = product_io.detect_format(file.filename)
+    with database.SessionLocal() as db:
+        try:
+            result = product_io.import_products(db, product_io.read_rows(file.file, fmt), key=key, dry_run=dry_run)
+        except product_io.ProductImportError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        finally:
+            # Paczki zapisane przed ewentualnym błędem pliku też muszą trafić na stronę główną
+            if not dry_run:
+                catalog.cache.invalidate()
+    return result.as_dict()
\ No newline at end of file
@@ -0,0 +1,187 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+import os
+import threading
+import time
+
+import querybudget
+
+logger = logging.getLogger("sklep.sql")
+
+# --- KONFIGURACJA ---
+# METRICS=0 wyłącza middleware i /metrics; SERVER_TIMING=0 wyłącza nagłówek Server-Timing
+# (zdradza czasy bazy, więc na produkcji można go wyłączyć).
+# SLOW_QUERY_MS - zapytania wolniejsze niż próg trafiają do logu "sklep.sql" razem z parametrami.
+# METRICS_TOKEN - jeśli ustawiony, /metrics wymaga nagłówka "Authorization: Bearer <token>".
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Progi histogramów (sekundy / liczba zapytań)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """Metryki procesu w formacie Prometheusa (bez zewnętrznej biblioteki).
+
+    Każdy worker uvicorna ma własny rejestr - Prometheus scrapuje je osobno.
+    Etykieta route to szablon ścieżki ("/zamowienie/{order_id}"), nie konkretny URL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = {}     # (method, route, status) -> Histogram
+        self.request_statements = {}  # (method, route) -> Histogram
+        self.request_db_time = {}     # (method, route) -> Histogram
+        self.slow_queries = 0
+
+    def _histogram(self, family: dict, labels: tuple, buckets) -> Histogram:
+        histogram = family.get(labels)
+        if histogram is None:
+            histogram = family[labels] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, method: str, route: str, status: int, duration: float, statements: int, db_time: float):
+        with self._lock:
+            self._histogram(self.request_latency, (method, route, str(status)), LATENCY_BUCKETS).observe(duration)
+            self._histogram(self.request_statements, (method, route), STATEMENT_BUCKETS).observe(statements)
+            self._histogram(self.request_db_time, (method, route), LATENCY_BUCKETS).observe(db_time)
+
+    def observe_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self, extra_gauges: dict = None) -> str:
+        lines = []
+        with self._lock:
+            _render_histograms(lines, "sklep_http_request_duration_seconds", "Czas obsługi requestu",
+                               ("method", "route", "status"), self.request_latency)
+            _render_histograms(lines, "sklep_http_request_sql_statements", "Liczba zapytań SQL na request",
+                               ("method", "route"), self.request_statements)
+            _render_histograms(lines, "sklep_http_request_db_seconds", "Łączny czas zapytań SQL na request",
+                               ("method", "route"), self.request_db_time)
+            lines.append("# HELP sklep_sql_slow_queries_total Zapytania wolniejsze niż SLOW_QUERY_MS")
+            lines.append("# TYPE sklep_sql_slow_queries_total counter")
+            lines.append(f"sklep_sql_slow_queries_total {self.slow_queries}")
+
+        # extra_gauges: {nazwa: (opis, [({etykieta: wartość}, wartość), ...])} - np. stan puli połączeń
+        for name, (help_text, samples) in (extra_gauges or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                base = ",".join(f'{k}="{_label_value(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{base}}} {value}" if base else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histograms(lines, name, help_text, label_names, family):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in sorted(family.items()):
+        base = ",".join(f'{k}="{_label_value(v)}"' for k, v in zip(label_names, labels))
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{base},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{base}}} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{{{base}}} {histogram.count}")
+
+
+registry = MetricsRegistry()
+
+
+# --- ZAPYTANIA SQL ---
+# Czas każdego zapytania: start odkładamy na stos w conn.info (zapytania na jednym połączeniu
+# nie przeplatają się), koniec liczymy w after_cursor_execute / handle_error.
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    _finish_query(conn, statement, parameters)
+
+
+@event.listens_for(Engine, "handle_error")
+def _query_failed(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        _finish_query(conn, exception_context.statement, exception_context.parameters)
+
+
+def _finish_query(conn, statement, parameters):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+
+    counter = querybudget.current_counter()
+    if counter is not None:
+        counter.add_time(elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        registry.observe_slow_query()
+        logger.warning("Wolne zapytanie (%.1f ms): %s | parametry: %r", elapsed * 1000, statement, parameters)
+
+
+# --- MIDDLEWARE ---
+# Czyste ASGI zamiast BaseHTTPMiddleware: bez dodatkowego zadania i kolejki na każdy request
+# (mierzalnie szybsze na stronie głównej) i nie buforuje odpowiedzi strumieniowych.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        with querybudget.count_statements() as counter:
+            async def send_with_timing(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if SERVER_TIMING_ENABLED:
+                        duration = time.perf_counter() - started
+                        headers = list(message.get("headers", []))
+                        headers.append((b"server-timing", (
+                            f'app;dur={duration * 1000:.1f}, '
+                            f'db;dur={counter.db_time * 1000:.1f};desc="{counter.count} SQL"'
+                        ).encode("latin-1")))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                # Requesty bez dopasowanej trasy (404) zbieramy pod jedną etykietą - inaczej
+                # każdy losowy URL tworzyłby nową serię
+                route = scope.get("route")
+                route_path = route.path if route is not None else "unmatched"
+                registry.observe_request(scope["method"], route_path, status,
+                                         time.perf_counter() - started, counter.count, counter.db_time)
@@ -0,0 +1,126 @@
+# Wersjonowane migracje schematu: skrypty migrations/NNNN_nazwa.py z funkcją upgrade(conn),
+# stosowane raz, przed wdrożeniem: python migrate.py upgrade
+#
+# Aplikacja i worker przy starcie nie wykonują DDL - check() odczytuje tylko numer wersji
+# z tabeli schemat_wersja i sprawdza indeks pełnotekstowy (dwa zapytania), a na nieaktualnej
+# bazie odmawia startu.
+# Baza nowsza niż kod (wdrażanie po kolei) jest w porządku - migracje tylko dodają.
+#
+# Na SQLite DDL wykonuje się poza transakcją (sterownik otwiera ją dopiero przed DML),
+# więc skrypty muszą dać się powtórzyć po przerwaniu: IF NOT EXISTS / checkfirst=True.
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from typing import List
+import importlib.util
+import os
+import re
+import sys
+
+import models
+import fulltext
+
+# --- KONFIGURACJA ---
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# SCHEMA_AUTO_MIGRATE=1: aplikacja sama stosuje migracje przy starcie - tylko dla jednego
+# procesu (lokalnie, testy); przy wielu workerach uruchamiaj python migrate.py upgrade
+SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "0") == "1"
+
+_SCRIPT_NAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+_wersja = models.WersjaSchematu.__table__
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    def load(self):
+        spec = importlib.util.spec_from_file_location(f"migrations_{self.version:04d}", self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+def available(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    # Tylko lista plików - skrypty są importowane dopiero przy upgrade
+    found = []
+    for filename in os.listdir(directory):
+        match = _SCRIPT_NAME.match(filename)
+        if match:
+            found.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    found.sort(key=lambda m: m.version)
+    if len({m.version for m in found}) != len(found):
+        raise RuntimeError(f"Powtórzony numer migracji w {directory}")
+    return found
+
+
+def current_version(conn) -> int:
+    try:
+        return conn.execute(select(func.max(_wersja.c.wersja))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # Baza sprzed wersjonowania (albo pusta) - brak tabeli schemat_wersja
+        conn.rollback()
+        return 0
+
+
+def upgrade(engine, target: int = None) -> List[Migration]:
+    """Stosuje brakujące migracje po kolei, każdą w osobnej transakcji. Zwraca zastosowane."""
+    applied = []
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for migration in available():
+        if migration.version <= version or (target is not None and migration.version > target):
+            continue
+        module = migration.load()
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            _wersja.create(bind=conn, checkfirst=True)
+            conn.execute(_wersja.insert().values(wersja=migration.version, nazwa=migration.name,
+                                                 zastosowano=datetime.now()))
+        applied.append(migration)
+    return applied
+
+
+def check(engine):
+    """Start aplikacji/workera: sprawdza wersję schematu i wykrywa indeks pełnotekstowy, bez DDL."""
+    if SCHEMA_AUTO_MIGRATE:
+        upgrade(engine)
+    latest = available()[-1].version
+    with engine.connect() as conn:
+        version = current_version(conn)
+        if version < latest:
+            raise SchemaOutdated(
+                f"Schemat bazy w wersji {version}, kod wymaga {latest} - uruchom: python migrate.py upgrade"
+            )
+        fulltext.detect_search_index(conn)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migracje schematu bazy")
+    parser.add_argument("command", choices=["upgrade", "status"])
+    parser.add_argument("--to", type=int, default=None, help="upgrade: zatrzymaj się na tej wersji")
+    args = parser.parse_args()
+
+    from database import engine
+
+    if args.command == "upgrade":
+        done = upgrade(engine, args.to)
+        for migration in done:
+            print(f"Zastosowano {migration.version:04d}_{migration.name}")
+        if not done:
+            print("Schemat jest aktualny.")
+    else:
+        with engine.connect() as conn:
+            version = current_version(conn)
+        for migration in available():
+            print(f"{'x' if migration.version <= version else ' '} {migration.version:04d}_{migration.name}")
+        sys.exit(0 if version >= available()[-1].version else 1)
@@ -0,0 +1,234 @@
+# Schemat sprzed wersjonowania: tabele i indeksy tak, jak tworzył je dotąd main.py przy starcie,
+# oraz indeks pełnotekstowy. Na pustej bazie tworzy wszystko, na istniejącym sklep.db tylko
+# brakujące tabele i indeksy.
+#
+# Definicje są zamrożone - nie importuj models.py ani fulltext.py. Zmiany modeli i wyszukiwarki
+# idą do kolejnych migracji, inaczej świeża baza i baza po upgrade różniłyby się ścieżką
+# (0002 dodaje indeksy do tego schematu).
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, text,
+)
+from sqlalchemy.exc import OperationalError
+import logging
+
+logger = logging.getLogger("sklep.search")
+
+metadata = MetaData()
+
+# --- TABELE ---
+
+Table(
+    "adres", metadata,
+    Column("id_adresu", Integer, primary_key=True, index=True),
+    Column("ulica", String(100)),
+    Column("nr_domu", String(10), nullable=False),
+    Column("nr_lokalu", String(10), nullable=True),
+    Column("kod_pocztowy", String(6), nullable=False),
+    Column("miejscowosc", String(50), nullable=False),
+)
+
+Table(
+    "rola", metadata,
+    Column("id_roli", Integer, primary_key=True, index=True),
+    Column("nazwa_roli", String(30), nullable=False),
+)
+
+Table(
+    "klient", metadata,
+    Column("id_klienta", Integer, primary_key=True, index=True),
+    Column("imie", String(50), nullable=False),
+    Column("drugie_imie", String(50), nullable=True),
+    Column("nazwisko", String(50), nullable=False),
+    Column("adres_email", String(40), unique=True, nullable=False),
+    Column("haslo_hash", String(255), nullable=False),
+    Column("data_rejestracji", DateTime, nullable=False),
+)
+
+Table(
+    "klient_adres", metadata,
+    Column("klient2id_klienta", Integer, ForeignKey("klient.id_klienta"), primary_key=True),
+    Column("adres2id_adresu", Integer, ForeignKey("adres.id_adresu"), primary_key=True),
+    Column("czy_domyslny", Boolean),
+)
+
+Table(
+    "pracownik", metadata,
+    Column("id_pracownika", Integer, primary_key=True, index=True),
+    Column("login", String(50), unique=True, nullable=False),
+    Column("haslo_hash", String(255), nullable=False),
+    Column("imie", String(50), nullable=False),
+    Column("nazwisko", String(50), nullable=False),
+    Column("plec", Text, nullable=True),
+    Column("id_roli", Integer, ForeignKey("rola.id_roli"), nullable=False),
+)
+
+Table(
+    "kategoria", metadata,
+    Column("id_kategorii", Integer, primary_key=True, index=True),
+    Column("nazwa_kategorii", String(50), nullable=False),
+    Column("opis_kategorii", String(255)),
+)
+
+Table(
+    "model_produktu", metadata,
+    Column("id_modelu", Integer, primary_key=True, index=True),
+    Column("nazwa_modelu", String(100), nullable=False),
+    Column("opis", Text, nullable=True),
+    Column("cena_katalogowa", Float, nullable=False),
+    Column("zdjecie_url", String(255), nullable=True),
+    Column("stan_magazynowy", Integer),
+    Column("id_kategorii", Integer, ForeignKey("kategoria.id_kategorii"), nullable=False),
+)
+
+Table(
+    "zamowienie", metadata,
+    Column("id_zamowienia", Integer, primary_key=True, index=True),
+    Column("numer_zamowienia", String(50), unique=True, nullable=False),
+    Column("data_zlozenia", DateTime, nullable=False, index=True),
+    Column("status_zamowienia", String(20), nullable=False),
+    Column("suma_calkowita", Float, nullable=False),
+    Column("telefon_kontakt_do_zam", String(9), nullable=True),
+    Column("email_kontakt_do_zam", String(40), nullable=True),
+    Column("id_klienta", Integer, ForeignKey("klient.id_klienta"), nullable=False, index=True),
+    Column("id_adresu", Integer, ForeignKey("adres.id_adresu"), nullable=False),
+    Index("ix_zamowienie_status_data", "status_zamowienia", "data_zlozenia"),
+)
+
+Table(
+    "pozycja_zamowienia", metadata,
+    Column("id_pozycji", Integer, primary_key=True, index=True),
+    Column("ilosc", Integer, nullable=False),
+    Column("cena_w_chwili_zakupu", Float, nullable=False),
+    Column("id_modelu", Integer, ForeignKey("model_produktu.id_modelu"), nullable=False),
+    Column("id_zamowienia", Integer, ForeignKey("zamowienie.id_zamowienia"), nullable=False),
+)
+
+Table(
+    "log_zmiana_statusu", metadata,
+    Column("id_logu", Integer, primary_key=True, index=True),
+    Column("stary_status", Text),
+    Column("nowy_status", Text),
+    Column("data_zmiany", Date),
+    Column("id_zamowienia", Integer, ForeignKey("zamowienie.id_zamowienia"), nullable=False),
+    Column("id_pracownika", Integer, ForeignKey("pracownik.id_pracownika"), nullable=False),
+)
+
+Table(
+    "log_zmiana_produktu", metadata,
+    Column("id_logu", Integer, primary_key=True, index=True),
+    Column("id_modelu", Integer, ForeignKey("model_produktu.id_modelu"), nullable=False, index=True),
+    Column("id_pracownika", Integer, ForeignKey("pracownik.id_pracownika"), nullable=False),
+    Column("pole", String(30), nullable=False),
+    Column("stara_wartosc", Float, nullable=True),
+    Column("nowa_wartosc", Float, nullable=False),
+    Column("data_zmiany", DateTime, nullable=False),
+)
+
+# --- ANALITYKA ---
+
+Table(
+    "statystyka_dzienna", metadata,
+    Column("dzien", Date, primary_key=True),
+    Column("liczba_zamowien", Integer, nullable=False),
+    Column("przychod", Float, nullable=False),
+)
+
+Table(
+    "sprzedaz_produktu_dzienna", metadata,
+    Column("dzien", Date, primary_key=True),
+    Column("id_modelu", Integer, ForeignKey("model_produktu.id_modelu"), primary_key=True),
+    Column("id_kategorii", Integer, nullable=False),
+    Column("sztuki", Integer, nullable=False),
+    Column("przychod", Float, nullable=False),
+)
+
+Table(
+    "sprzedaz_kategorii_dzienna", metadata,
+    Column("dzien", Date, primary_key=True),
+    Column("id_kategorii", Integer, ForeignKey("kategoria.id_kategorii"), primary_key=True),
+    Column("sztuki", Integer, nullable=False),
+    Column("przychod", Float, nullable=False),
+)
+
+Table(
+    "licznik_statusow", metadata,
+    Column("status_zamowienia", String(20), primary_key=True),
+    Column("liczba", Integer, nullable=False),
+)
+
+# --- NUMERY ZAMÓWIEŃ I KOLEJKA ZADAŃ ---
+
+Table(
+    "licznik_numerow", metadata,
+    Column("dzien", String(8), primary_key=True),
+    Column("ostatni", Integer, nullable=False),
+)
+
+Table(
+    "zadanie", metadata,
+    Column("id_zadania", Integer, primary_key=True, index=True),
+    Column("rodzaj", String(50), nullable=False),
+    Column("dane", Text, nullable=False),
+    Column("status", String(20), nullable=False),
+    Column("proby", Integer, nullable=False),
+    Column("uruchom_po", DateTime, nullable=False),
+    Column("zablokowane_do", DateTime, nullable=True),
+    Column("ostatni_blad", Text, nullable=True),
+    Column("utworzono", DateTime, nullable=False),
+    Column("zakonczono", DateTime, nullable=True),
+    Index("ix_zadanie_status_uruchom_po", "status", "uruchom_po"),
+)
+
+
+# --- INDEKS PEŁNOTEKSTOWY (nazwa_modelu + opis, zob. fulltext.py) ---
+# SQLite: wirtualna tabela FTS5 (external content) utrzymywana triggerami
+_SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE model_produktu_fts USING fts5(
+        nazwa_modelu, opis,
+        content='model_produktu', content_rowid='id_modelu',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS model_produktu_fts_ai AFTER INSERT ON model_produktu BEGIN
+        INSERT INTO model_produktu_fts(rowid, nazwa_modelu, opis) VALUES (new.id_modelu, new.nazwa_modelu, new.opis);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS model_produktu_fts_ad AFTER DELETE ON model_produktu BEGIN
+        INSERT INTO model_produktu_fts(model_produktu_fts, rowid, nazwa_modelu, opis) VALUES ('delete', old.id_modelu, old.nazwa_modelu, old.opis);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS model_produktu_fts_au AFTER UPDATE OF nazwa_modelu, opis ON model_produktu BEGIN
+        INSERT INTO model_produktu_fts(model_produktu_fts, rowid, nazwa_modelu, opis) VALUES ('delete', old.id_modelu, old.nazwa_modelu, old.opis);
+        INSERT INTO model_produktu_fts(rowid, nazwa_modelu, opis) VALUES (new.id_modelu, new.nazwa_modelu, new.opis);
+    END""",
+    "INSERT INTO model_produktu_fts(model_produktu_fts) VALUES ('rebuild')",
+]
+# PostgreSQL: indeks GIN na wyrażeniu to_tsvector (aktualizuje się sam)
+_PG_FTS = [
+    "CREATE INDEX IF NOT EXISTS ix_model_produktu_fts ON model_produktu USING GIN "
+    "(to_tsvector('simple', coalesce(nazwa_modelu, '') || ' ' || coalesce(opis, '')))",
+]
+
+
+def _create_search_index(conn):
+    dialect = conn.dialect.name
+    try:
+        if dialect == "sqlite":
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'model_produktu_fts'"
+            )).first() is not None
+            if not exists:
+                for statement in _SQLITE_FTS:
+                    conn.execute(text(statement))
+        elif dialect == "postgresql":
+            for statement in _PG_FTS:
+                conn.execute(text(statement))
+    except OperationalError as e:
+        # Np. SQLite skompilowany bez FTS5 - wyszukiwarka działa wtedy na LIKE
+        logger.warning("Indeks wyszukiwania niedostępny (%s): %s", dialect, e)
+
+
+def upgrade(conn):
+    # create_all pomija istniejące tabele, ale nie dodaje do nich indeksów (stary sklep.db)
+    metadata.create_all(bind=conn, checkfirst=True)
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+    _create_search_index(conn)
@@ -0,0 +1,21 @@
+# Indeksy pod najczęstsze zapytania:
+# - zamowienie.id_klienta: zamówienia klienta (konto.html),
+# - zamowienie.data_zlozenia: stronicowanie paneli pracowników i zakresy dat w analityce,
+# - pozycja_zamowienia.id_zamowienia: pozycje zamówienia (szczegóły, mail, selectinload),
+# - model_produktu.id_kategorii: filtr kategorii na stronie głównej i liczniki faset,
+# - klient_adres (klient, czy_domyslny): adres domyślny w podsumowaniu zamówienia.
+# Nazwy jak w models.py; dwa pierwsze tworzy już 0001 (index=True), stąd IF NOT EXISTS.
+from sqlalchemy import text
+
+INDEXES = [
+    ("ix_zamowienie_id_klienta", "zamowienie", "id_klienta"),
+    ("ix_zamowienie_data_zlozenia", "zamowienie", "data_zlozenia"),
+    ("ix_pozycja_zamowienia_id_zamowienia", "pozycja_zamowienia", "id_zamowienia"),
+    ("ix_model_produktu_id_kategorii", "model_produktu", "id_kategorii"),
+    ("ix_klient_adres_klient_domyslny", "klient_adres", "klient2id_klienta, czy_domyslny"),
+]
+
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, Numeric, DateTime, Text, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, Boolean, Float, Numeric, DateTime, Text, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -31,6 +31,10 @@ class Klient(Base):
 
 class KlientAdres(Base):
     __tablename__ = "klient_adres"
+    # Adres domyślny klienta: WHERE klient2id_klienta = ? AND czy_domyslny
+    __table_args__ = (
+        Index("ix_klient_adres_klient_domyslny", "klient2id_klienta", "czy_domyslny"),
+    )
     # Klucz złożony (composite key) zgodnie z Twoim SQL
     klient2id_klienta = Column(Integer, ForeignKey("klient.id_klienta"), primary_key=True)
     adres2id_adresu = Column(Integer, ForeignKey("adres.id_adresu"), primary_key=True)
@@ -60,22 +64,33 @@ class ModelProduktu(Base):
     cena_katalogowa = Column(Float, nullable=False) 
     zdjecie_url = Column(String(255), nullable=True)
     stan_magazynowy = Column(Integer, default=100)
-    id_kategorii = Column(Integer, ForeignKey("kategoria.id_kategorii"), nullable=False)
+    id_kategorii = Column(Integer, ForeignKey("kategoria.id_kategorii"), nullable=False, index=True)
+
+    kategoria = relationship("Kategoria")
 
 class Zamowienie(Base):
     __tablename__ = "zamowienie"
+    # Panele pracowników filtrują po statusie i stronicują po dacie
+    __table_args__ = (
+        Index("ix_zamowienie_status_data", "status_zamowienia", "data_zlozenia"),
+    )
     id_zamowienia = Column(Integer, primary_key=True, index=True)
     numer_zamowienia = Column(String(50), unique=True, nullable=False)
-    data_zlozenia = Column(DateTime, nullable=False)
+    data_zlozenia = Column(DateTime, nullable=False, index=True)
     status_zamowienia = Column(String(20), nullable=False)
     suma_calkowita = Column(Float, nullable=False)
     
     telefon_kontakt_do_zam = Column(String(9), nullable=True)
     email_kontakt_do_zam = Column(String(40), nullable=True)
 
-    id_klienta = Column(Integer, ForeignKey("klient.id_klienta"), nullable=False)
+    id_klienta = Column(Integer, ForeignKey("klient.id_klienta"), nullable=False, index=True)
     id_adresu = Column(Integer, ForeignKey("adres.id_adresu"), nullable=False)
 
+    # Relacje - ładowane jawnie (selectinload/joinedload) w endpointach, które ich potrzebują
+    pozycje = relationship("PozycjaZamowienia", back_populates="zamowienie", order_by="PozycjaZamowienia.id_pozycji")
+    adres = relationship("Adres")
+    klient = relationship("Klient")
+
 class PozycjaZamowienia(Base):
     __tablename__ = "pozycja_zamowienia"
     id_pozycji = Column(Integer, primary_key=True, index=True)
@@ -83,9 +98,10 @@ class PozycjaZamowienia(Base):
     cena_w_chwili_zakupu = Column(Float, nullable=False)
     
     id_modelu = Column(Integer, ForeignKey("model_produktu.id_modelu"), nullable=False)
-    id_zamowienia = Column(Integer, ForeignKey("zamowienie.id_zamowienia"), nullable=False)
+    id_zamowienia = Column(Integer, ForeignKey("zamowienie.id_zamowienia"), nullable=False, index=True)
 
     model = relationship("ModelProduktu")
+    zamowienie = relationship("Zamowienie", back_populates="pozycje")
 
 class LogZmianaStatusu(Base):
     __tablename__ = "log_zmiana_statusu"
@@ -94,4 +110,82 @@ class LogZmianaStatusu(Base):
     nowy_status = Column(Text)
     data_zmiany = Column(Date)
     id_zamowienia = Column(Integer, ForeignKey("zamowienie.id_zamowienia"), nullable=False)
-    id_pracownika = Column(Integer, ForeignKey("pracownik.id_pracownika"), nullable=False)
\ No newline at end of file
+    id_pracownika = Column(Integer, ForeignKey("pracownik.id_pracownika"), nullable=False)
+
+class LogZmianaProduktu(Base):
+    # Kto i kiedy zmienił stan albo cenę produktu (inventory.apply_changes)
+    __tablename__ = "log_zmiana_produktu"
+    id_logu = Column(Integer, primary_key=True, index=True)
+    id_modelu = Column(Integer, ForeignKey("model_produktu.id_modelu"), nullable=False, index=True)
+    id_pracownika = Column(Integer, ForeignKey("pracownik.id_pracownika"), nullable=False)
+    pole = Column(String(30), nullable=False)
+    stara_wartosc = Column(Float, nullable=True)
+    nowa_wartosc = Column(Float, nullable=False)
+    data_zmiany = Column(DateTime, nullable=False, default=datetime.now)
+
+
+# --- ANALITYKA (tabele zbiorcze, utrzymywane przyrostowo przez analytics.py) ---
+# Zamówienia anulowane nie wliczają się do sprzedaży; licznik statusów obejmuje wszystkie.
+
+class StatystykaDzienna(Base):
+    __tablename__ = "statystyka_dzienna"
+    dzien = Column(Date, primary_key=True)
+    liczba_zamowien = Column(Integer, nullable=False, default=0)
+    przychod = Column(Float, nullable=False, default=0.0)
+
+class SprzedazProduktuDzienna(Base):
+    __tablename__ = "sprzedaz_produktu_dzienna"
+    dzien = Column(Date, primary_key=True)
+    id_modelu = Column(Integer, ForeignKey("model_produktu.id_modelu"), primary_key=True)
+    id_kategorii = Column(Integer, nullable=False)
+    sztuki = Column(Integer, nullable=False, default=0)
+    przychod = Column(Float, nullable=False, default=0.0)
+
+class SprzedazKategoriiDzienna(Base):
+    __tablename__ = "sprzedaz_kategorii_dzienna"
+    dzien = Column(Date, primary_key=True)
+    id_kategorii = Column(Integer, ForeignKey("kategoria.id_kategorii"), primary_key=True)
+    sztuki = Column(Integer, nullable=False, default=0)
+    przychod = Column(Float, nullable=False, default=0.0)
+
+class LicznikStatusow(Base):
+    __tablename__ = "licznik_statusow"
+    status_zamowienia = Column(String(20), primary_key=True)
+    liczba = Column(Integer, nullable=False, default=0)
+
+
+# --- NUMERY ZAMÓWIEŃ (order_numbers.py) ---
+# Jeden wiersz na dzień: ostatni numer wydany (zarezerwowany) którymkolwiek workerom
+class LicznikNumerow(Base):
+    __tablename__ = "licznik_numerow"
+    dzien = Column(String(8), primary_key=True)  # YYYYMMDD
+    ostatni = Column(Integer, nullable=False, default=0)
+
+# --- KOLEJKA ZADAŃ W TLE (jobs.py) ---
+# Zadanie jest dodawane w tej samej transakcji co zmiana, która je wywołała - jeśli zamówienie
+# się nie zapisze, mail też nie wyjdzie.
+class Zadanie(Base):
+    __tablename__ = "zadanie"
+    # Worker wybiera najstarsze gotowe zadania: WHERE status = ? AND uruchom_po <= ? ORDER BY id
+    __table_args__ = (
+        Index("ix_zadanie_status_uruchom_po", "status", "uruchom_po"),
+    )
+    id_zadania = Column(Integer, primary_key=True, index=True)
+    rodzaj = Column(String(50), nullable=False)
+    dane = Column(Text, nullable=False)  # argumenty w JSON
+    status = Column(String(20), nullable=False, default="oczekuje")
+    proby = Column(Integer, nullable=False, default=0)
+    uruchom_po = Column(DateTime, nullable=False, default=datetime.now)
+    zablokowane_do = Column(DateTime, nullable=True)  # dzierżawa workera - po jej upływie zadanie wraca do puli
+    ostatni_blad = Column(Text, nullable=True)
+    utworzono = Column(DateTime, nullable=False, default=datetime.now)
+    zakonczono = Column(DateTime, nullable=True)
+
+
+# --- WERSJA SCHEMATU (migrate.py) ---
+# Jeden wiersz na zastosowany skrypt z katalogu migrations/
+class WersjaSchematu(Base):
+    __tablename__ = "schemat_wersja"
+    wersja = Column(Integer, primary_key=True)
+    nazwa = Column(String(100), nullable=False)
+    zastosowano = Column(DateTime, nullable=False, default=datetime.now)
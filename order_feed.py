@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from typing import Optional, List
+import os
+
+import models
+import pagination
+
+# --- KONFIGURACJA ---
+ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", "50"))
+MAX_ORDERS_PAGE_SIZE = 200
+
+STATUSY_ZAMOWIEN = ["Nowe", "Opłacone", "W magazynie", "W realizacji", "Wysłane", "Dostarczone", "Anulowane"]
+
+
+@dataclass
+class OrderFeedPage:
+    items: List[models.Zamowienie]
+    next_cursor: Optional[str] = None
+
+
+def parse_statuses(status: Optional[str]) -> Optional[List[str]]:
+    # ?status=Nowe,Opłacone -> ["Nowe", "Opłacone"]
+    if not status:
+        return None
+    return [s.strip() for s in status.split(",") if s.strip()] or None
+
+
+def parse_ids(ids: Optional[str]) -> Optional[List[int]]:
+    # ?ids=12,15 -> [12, 15]; śmieci pomijamy
+    if not ids:
+        return None
+    return [int(i) for i in ids.split(",") if i.strip().isdigit()][:MAX_ORDERS_PAGE_SIZE] or None
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    # Jak pagination.clamp_limit: ?limit=0 albo ujemny - domyślny rozmiar strony
+    if not limit or limit < 1:
+        return ORDERS_PAGE_SIZE
+    return min(limit, MAX_ORDERS_PAGE_SIZE)
+
+
+def _filtered(db: Session, statuses=None, date_from: Optional[date] = None, date_to: Optional[date] = None,
+              client_id: Optional[int] = None, order_ids=None):
+    query = db.query(models.Zamowienie)
+    if order_ids:
+        query = query.filter(models.Zamowienie.id_zamowienia.in_(order_ids))
+    if statuses:
+        query = query.filter(models.Zamowienie.status_zamowienia.in_(statuses))
+    if date_from:
+        query = query.filter(models.Zamowienie.data_zlozenia >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        # date_to włącznie - do północy następnego dnia
+        query = query.filter(models.Zamowienie.data_zlozenia < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if client_id:
+        query = query.filter(models.Zamowienie.id_klienta == client_id)
+    return query
+
+
+def fetch_page(db: Session, statuses=None, date_from=None, date_to=None, client_id=None,
+               cursor: Optional[str] = None, limit: Optional[int] = None, ascending: bool = False,
+               order_ids=None) -> OrderFeedPage:
+    """Jedna strona zamówień, keyset po (data_zlozenia, id_zamowienia) - bez OFFSET."""
+    limit = clamp_limit(limit)
+    query = _filtered(db, statuses, date_from, date_to, client_id, order_ids)
+
+    data = models.Zamowienie.data_zlozenia
+    id_zam = models.Zamowienie.id_zamowienia
+
+    after = pagination.decode_keyset(cursor)
+    if after and len(after) == 2:
+        try:
+            last_date, last_id = datetime.fromisoformat(after[0]), int(after[1])
+        except (TypeError, ValueError):
+            last_date = None
+        if last_date is not None:
+            if ascending:
+                query = query.filter(or_(data > last_date, and_(data == last_date, id_zam > last_id)))
+            else:
+                query = query.filter(or_(data < last_date, and_(data == last_date, id_zam < last_id)))
+
+    if ascending:
+        query = query.order_by(data.asc(), id_zam.asc())
+    else:
+        query = query.order_by(data.desc(), id_zam.desc())
+
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = pagination.encode_keyset([last.data_zlozenia.isoformat(), last.id_zamowienia])
+    return OrderFeedPage(items=items, next_cursor=next_cursor)
+
+
+def count_orders(db: Session, statuses=None, date_from=None, date_to=None, client_id=None) -> int:
+    return _filtered(db, statuses, date_from, date_to, client_id).count()
+
+
+def order_to_dict(order: models.Zamowienie) -> dict:
+    return {
+        "id": order.id_zamowienia,
+        "number": order.numer_zamowienia,
+        "date": order.data_zlozenia.isoformat(),
+        "status": order.status_zamowienia,
+        "total": order.suma_calkowita,
+        "email": order.email_kontakt_do_zam,
+        "client_id": order.id_klienta,
+    }
@@ -0,0 +1,179 @@
+# Numery zamówień "ZAM-YYYYMMDD-NNNNNN": licznik dzienny w tabeli licznik_numerow.
+#
+# Worker nie pyta bazy przy każdym zamówieniu - rezerwuje od razu ORDER_NUMBER_BLOCK numerów
+# (jeden UPDATE licznika w osobnej, krótkiej transakcji) i wydaje je z pamięci. Bloki różnych
+# workerów są rozłączne, więc numery nigdy się nie powtarzają; w obrębie workera rosną.
+# Między workerami kolejność numerów nie odpowiada kolejności złożenia (od tego jest data
+# i id zamówienia), a niewykorzystana końcówka bloku przepada przy restarcie - numery mogą
+# mieć luki. To samo działa na SQLite i PostgreSQL (sekwencja nie zeruje się co dzień).
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, Tuple
+import os
+import threading
+
+import models
+
+# --- KONFIGURACJA ---
+ORDER_NUMBER_BLOCK = int(os.getenv("ORDER_NUMBER_BLOCK", "100"))
+RESERVE_ATTEMPTS = 3
+
+_licznik = models.LicznikNumerow.__table__
+
+
+def format_number(day: str, n: int) -> str:
+    # 6 cyfr - nie myli się ze starymi numerami (4 znaki hex z UUID)
+    return f"ZAM-{day}-{n:06d}"
+
+
+def reserve(bind, day: str, size: int) -> Tuple[int, int]:
+    """Rezerwuje `size` kolejnych numerów dnia we własnej transakcji; zwraca (pierwszy, ostatni).
+
+    Wołać przed pierwszym zapisem w sesji zamówienia - na SQLite osobne połączenie czekałoby
+    na blokadę zapisu trzymaną przez tę samą sesję.
+    """
+    for attempt in range(RESERVE_ATTEMPTS):
+        try:
+            with bind.begin() as conn:
+                updated = conn.execute(
+                    _licznik.update().where(_licznik.c.dzien == day).values(ostatni=_licznik.c.ostatni + size)
+                ).rowcount
+                if not updated:
+                    # Pierwsze zamówienie dnia; równoległy INSERT innego workera -> IntegrityError i ponowienie
+                    conn.execute(_licznik.insert().values(dzien=day, ostatni=size))
+                last = conn.execute(select(_licznik.c.ostatni).where(_licznik.c.dzien == day)).scalar_one()
+            return last - size + 1, last
+        except IntegrityError:
+            if attempt == RESERVE_ATTEMPTS - 1:
+                raise
+
+
+@dataclass
+class _Block:
+    day: str
+    next: int
+    last: int
+
+
+class OrderNumberAllocator:
+    def __init__(self, block_size: int = ORDER_NUMBER_BLOCK):
+        self.block_size = block_size
+        self._block: Optional[_Block] = None
+        self._lock = threading.Lock()
+        self.reserved_blocks = 0
+
+    def next_number(self, bind, when: Optional[datetime] = None) -> str:
+        return self.next_for_day(bind, (when or datetime.now()).strftime("%Y%m%d"))
+
+    def next_for_day(self, bind, day: str) -> str:
+        while True:
+            with self._lock:
+                block = self._block
+                if block is not None and block.day == day and block.next <= block.last:
+                    block.next += 1
+                    return format_number(day, block.next - 1)
+            # Rezerwacja bez trzymania blokady - w trybie async kilka requestów dzieli jeden wątek
+            # i czekanie na threading.Lock w trakcie cudzego I/O zablokowałoby pętlę zdarzeń
+            first, last = reserve(bind, day, self.block_size)
+            with self._lock:
+                self.reserved_blocks += 1
+                block = self._block
+                # Dwa wątki zarezerwowały naraz - zostaje nowszy blok, starszy przepada (luka),
+                # żeby numery wydawane przez workera dalej rosły
+                if block is None or block.day != day or block.last < first:
+                    self._block = _Block(day, first, last)
+
+
+allocator = OrderNumberAllocator()
+
+
+# --- SPRAWDZENIE: KILKA PROCESÓW NARAZ (python order_numbers.py check) ---
+_CHECK_DAY = "00000000"
+
+
+def _check_engine(url: str, pool_size: int):
+    import database
+    from sqlalchemy import create_engine
+
+    check_engine = create_engine(url, **dict(database.engine_options(url), pool_size=pool_size,
+                                             max_overflow=pool_size))
+    if database._is_sqlite(url):
+        database.install_sqlite_pragmas(check_engine)
+    return check_engine
+
+
+def _check_worker(args) -> list:
+    # Osobny proces: własny silnik i własny alokator, kilka wątków naraz
+    url, count, threads, block_size = args
+    from concurrent.futures import ThreadPoolExecutor
+
+    check_engine = _check_engine(url, threads)
+    local = OrderNumberAllocator(block_size)
+
+    def run(_):
+        return [local.next_for_day(check_engine, _CHECK_DAY) for _ in range(count // threads)]
+
+    try:
+        with ThreadPoolExecutor(threads) as pool:
+            return list(pool.map(run, range(threads)))
+    finally:
+        check_engine.dispose()
+
+
+def check(url: str, processes: int, count: int, threads: int, block_size: int) -> int:
+    """Wydaje numery z kilku procesów na raz i sprawdza, że się nie powtarzają; zwraca ich liczbę.
+
+    Baza pod `url` musi być zmigrowana; licznik dnia testowego (00000000) jest w niej kasowany.
+    """
+    import multiprocessing
+
+    check_engine = _check_engine(url, 1)
+    try:
+        with check_engine.begin() as conn:
+            conn.execute(_licznik.delete().where(_licznik.c.dzien == _CHECK_DAY))
+        try:
+            with multiprocessing.get_context("spawn").Pool(processes) as pool:
+                results = pool.map(_check_worker, [(url, count, threads, block_size)] * processes)
+        finally:
+            with check_engine.begin() as conn:
+                conn.execute(_licznik.delete().where(_licznik.c.dzien == _CHECK_DAY))
+    finally:
+        check_engine.dispose()
+
+    numbers = [n for per_process in results for per_thread in per_process for n in per_thread]
+    for per_process in results:
+        for per_thread in per_process:
+            if per_thread != sorted(per_thread):
+                raise AssertionError("Numery wydane przez wątek nie rosną")
+    if len(set(numbers)) != len(numbers):
+        raise AssertionError(f"Powtórzone numery: {len(numbers) - len(set(numbers))}")
+    return len(numbers)
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Numery zamówień")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--count", type=int, default=5000, help="numerów na proces")
+    parser.add_argument("--threads", type=int, default=4, help="wątków na proces")
+    parser.add_argument("--block", type=int, default=10, help="rozmiar bloku (mały = więcej rywalizacji o licznik)")
+    parser.add_argument("--url", default=None,
+                        help="baza do sprawdzenia (np. PostgreSQL) - zostanie zmigrowana; domyślnie tymczasowy plik SQLite")
+    args = parser.parse_args()
+
+    import migrate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{os.path.join(tmp, 'check.db')}"
+        setup_engine = _check_engine(url, 1)
+        try:
+            migrate.upgrade(setup_engine)
+        finally:
+            setup_engine.dispose()
+        total = check(url, args.processes, args.count, args.threads, args.block)
+    print(f"OK: {total} numerów z {args.processes} procesów, bez powtórzeń")
@@ -0,0 +1,184 @@
+# Cache wyrenderowanych stron dla niezalogowanych (strona główna z filtrami, szczegóły produktu).
+# Czyste ASGI, wpięte tuż przed routingiem (wewnątrz SessionMiddleware): trafienie nie dotyka
+# FastAPI, zależności, bazy ani Jinja2.
+#
+# Klucz: host + ścieżka + posortowane parametry + wersja snapshotu katalogu. Każda zmiana
+# katalogu (cena, stan po zamówieniu, import) podbija wersję, więc stare wpisy po prostu
+# przestają pasować. Bez aktualnego snapshotu (TTL minął, katalog za duży na cache) strony
+# renderujemy zwyczajnie - wtedy nie wiadomo, czy wpis jest aktualny.
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from starlette.concurrency import run_in_threadpool
+from urllib.parse import parse_qsl, urlencode
+import hashlib
+import os
+import threading
+import time
+
+import assets
+import catalog
+
+# --- KONFIGURACJA ---
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE", "1") == "1"
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "1000"))
+# Górny limit wieku wpisu - treść niezależna od katalogu (np. szablony po wdrożeniu) też się odświeży
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "300"))
+
+CACHEABLE_PATHS = {"/", "/index.html", "/szczegoly.html"}
+# Przeglądarka zawsze pyta (If-None-Match) - ta sama strona zalogowanemu wygląda inaczej
+CACHE_CONTROL = "no-cache"
+VARY = "Cookie, Accept-Encoding"
+
+
+class _Entry:
+    __slots__ = ("body", "variants", "content_type", "etag", "last_modified", "created")
+
+    def __init__(self, body: bytes, content_type: bytes, variants: dict = None):
+        self.body = body
+        # Warianty gzip/br tylko dla wpisów trafiających do cache (assets.compress poza pętlą zdarzeń)
+        self.variants = variants or {}
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.created = time.time()
+        self.last_modified = formatdate(self.created, usegmt=True)
+
+
+class PageCache:
+    def __init__(self, max_entries: int = PAGE_CACHE_MAX_ENTRIES, ttl: float = PAGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry.created > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry: _Entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = PageCache()
+
+
+def _not_modified(entry: _Entry, headers: dict) -> bool:
+    if_none_match = headers.get(b"if-none-match")
+    if if_none_match is not None:
+        return entry.etag in [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+    if_modified_since = headers.get(b"if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(if_modified_since.decode("latin-1")).timestamp() >= int(entry.created)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def _send_entry(send, entry: _Entry, headers: dict):
+    response_headers = [
+        (b"etag", entry.etag.encode()),
+        (b"last-modified", entry.last_modified.encode()),
+        (b"cache-control", CACHE_CONTROL.encode()),
+        (b"vary", VARY.encode()),
+    ]
+    if _not_modified(entry, headers):
+        await send({"type": "http.response.start", "status": 304, "headers": response_headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    encoding = assets.pick_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"), entry.variants)
+    body = entry.variants[encoding] if encoding else entry.body
+    response_headers.append((b"content-type", entry.content_type))
+    response_headers.append((b"content-length", str(len(body)).encode()))
+    if encoding:
+        response_headers.append((b"content-encoding", encoding.encode()))
+    await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class _Route:
+    # Etykieta trasy dla metryk przy trafieniu w cache (routing FastAPI się nie wykonuje)
+    def __init__(self, path: str):
+        self.path = path
+
+
+class PageCacheMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in CACHEABLE_PATHS
+                or scope.get("session", {}).get("user_id")):
+            await self.app(scope, receive, send)
+            return
+
+        version = catalog.cache.fresh_version()
+        headers = dict(scope["headers"])
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        # Host w kluczu: szablony budują absolutne adresy (url_for, linki stronicowania)
+        key = (headers.get(b"host", b""), scope["path"], query, version)
+
+        entry = cache.get(key) if version is not None else None
+        if entry is not None:
+            scope["route"] = _Route(scope["path"])
+            await _send_entry(send, entry, headers)
+            return
+
+        # Chybienie: renderujemy i buforujemy odpowiedź. Zapisujemy ją tylko, jeśli wersja katalogu
+        # nie zmieniła się w trakcie renderowania - inaczej nie wiadomo, którą wersję pokazuje strona
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                # Rozszerzenia ASGI (np. http.response.debug z TemplateResponse w testach)
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            response_headers = dict(start.get("headers", []))
+            cacheable = (
+                start["status"] == 200
+                and b"set-cookie" not in response_headers
+                and b"content-encoding" not in response_headers
+                and response_headers.get(b"content-type", b"").startswith(b"text/html")
+            )
+            if not cacheable:
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks)})
+                return
+            body = b"".join(chunks)
+            if version is not None and catalog.cache.fresh_version() == version:
+                entry = _Entry(body, response_headers[b"content-type"], await run_in_threadpool(assets.compress, body))
+                # Kompresja trwała chwilę - wersja katalogu mogła się zmienić także w jej trakcie
+                if catalog.cache.fresh_version() == version:
+                    cache.put(key, entry)
+            else:
+                entry = _Entry(body, response_headers[b"content-type"])
+            await _send_entry(send, entry, headers)
+
+        await self.app(scope, receive, capture)
@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+from typing import Optional, List
+from sqlalchemy import and_, or_
+import base64
+import json
+import os
+
+import models
+
+# --- KONFIGURACJA ---
+PRODUCTS_PER_PAGE = int(os.getenv("PRODUCTS_PER_PAGE", "24"))
+MAX_PRODUCTS_PER_PAGE = 100
+
+# Tryby ?sort= ze strony głównej: (kolumna, malejąco).
+# Każdy tryb ma id_modelu jako drugi klucz w tym samym kierunku - kolejność jest
+# deterministyczna nawet przy równych cenach/nazwach, więc kursor jest stabilny.
+SORT_MODES = {
+    '1': ("cena_katalogowa", False),
+    '2': ("cena_katalogowa", True),
+    '3': ("nazwa_modelu", False),
+    '4': ("nazwa_modelu", True),
+}
+DEFAULT_SORT_MODE = ("id_modelu", True)
+
+
+def sort_mode(sort):
+    return SORT_MODES.get(sort, DEFAULT_SORT_MODE)
+
+
+def sort_key(sort):
+    column, descending = sort_mode(sort)
+    return (lambda p: (getattr(p, column), p.id_modelu)), descending
+
+
+@dataclass
+class Page:
+    items: List
+    total: int
+    page: int
+    limit: int
+    has_more: bool = False
+    next_cursor: Optional[str] = None
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.limit))
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 1
+
+    @property
+    def has_next(self) -> bool:
+        return self.has_more
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return PRODUCTS_PER_PAGE
+    return min(limit, MAX_PRODUCTS_PER_PAGE)
+
+
+# --- KURSORY ---
+# Kursor to lista wartości klucza ostatniego wiersza na stronie, zakodowana base64
+# - klient traktuje go jako nieprzezroczysty napis.
+
+def encode_keyset(values: list) -> str:
+    raw = json.dumps(values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_keyset(cursor: Optional[str]) -> Optional[list]:
+    # None, gdy kursor jest pusty albo uszkodzony
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        return None
+    return values if isinstance(values, list) else None
+
+
+# Kursor produktów: (tryb sortowania, wartość klucza, id)
+def encode_cursor(sort, product) -> str:
+    column, _ = sort_mode(sort)
+    return encode_keyset([sort or "0", getattr(product, column), product.id_modelu])
+
+
+# Typ wartości klucza w kursorze - porównanie z innym typem (albo null) kończyło się
+# TypeError przy sortowaniu listy i błędem 500
+_KEY_TYPES = {
+    "cena_katalogowa": (int, float),
+    "nazwa_modelu": (str,),
+    "id_modelu": (int,),
+}
+
+
+def _is_key_value(value, types) -> bool:
+    # bool to w Pythonie podklasa int, a w JSON osobny typ
+    return isinstance(value, types) and not isinstance(value, bool)
+
+
+def decode_cursor(sort, cursor: Optional[str]):
+    # Zwraca (wartość, id) albo None, gdy kursor jest pusty/uszkodzony/z innego sortowania
+    values = decode_keyset(cursor)
+    if not values or len(values) != 3 or values[0] != (sort or "0"):
+        return None
+    column, _ = sort_mode(sort)
+    if not _is_key_value(values[1], _KEY_TYPES[column]) or not _is_key_value(values[2], (int,)):
+        return None
+    return values[1], values[2]
+
+
+def _page_result(items, total, page, limit, sort, has_more, keyset=True):
+    next_cursor = encode_cursor(sort, items[-1]) if keyset and has_more and items else None
+    return Page(items=items, total=total, page=page, limit=limit, has_more=has_more, next_cursor=next_cursor)
+
+
+def paginate_list(products, sort, page: int = 1, limit: Optional[int] = None, cursor: Optional[str] = None,
+                  keyset: bool = True) -> Page:
+    # products muszą być już posortowane wg sort_key(sort).
+    # keyset=False dla kolejności spoza SORT_MODES (np. trafność wyszukiwania) - tylko page/limit.
+    limit = clamp_limit(limit)
+    page = max(page or 1, 1)
+    total = len(products)
+
+    after = decode_cursor(sort, cursor) if keyset else None
+    if after is not None:
+        key, descending = sort_key(sort)
+        if descending:
+            start = next((i for i, p in enumerate(products) if key(p) < after), total)
+        else:
+            start = next((i for i, p in enumerate(products) if key(p) > after), total)
+    else:
+        start = (page - 1) * limit
+
+    items = list(products[start:start + limit])
+    return _page_result(items, total, page, limit, sort, start + limit < total, keyset)
+
+
+def paginate_query(query, sort, page: int = 1, limit: Optional[int] = None, cursor: Optional[str] = None) -> Page:
+    # Wersja dla zapytania SQLAlchemy - keyset zamiast OFFSET, gdy podano kursor
+    limit = clamp_limit(limit)
+    page = max(page or 1, 1)
+    total = query.order_by(None).count()
+
+    column_name, descending = sort_mode(sort)
+    column = getattr(models.ModelProduktu, column_name)
+    id_column = models.ModelProduktu.id_modelu
+
+    if descending:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+
+    after = decode_cursor(sort, cursor)
+    if after is not None:
+        value, last_id = after
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, id_column > last_id)))
+    else:
+        query = query.offset((page - 1) * limit)
+
+    # Jeden wiersz więcej mówi, czy istnieje następna strona
+    rows = query.limit(limit + 1).all()
+    return _page_result(rows[:limit], total, page, limit, sort, len(rows) > limit)
@@ -0,0 +1,237 @@
+# Hasła: skróty odporne na ataki sprzętowe (scrypt z biblioteki standardowej albo argon2id),
+# liczone w osobnej puli procesów, żeby logowania nie zajmowały GIL-a i puli wątków
+# obsługujących resztę sklepu.
+#
+# Ten moduł jest importowany także przez procesy puli (start "spawn"), więc na poziomie
+# modułu nie może importować aplikacji (bazy, modeli).
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+
+# --- KONFIGURACJA ---
+# PASSWORD_HASHER: scrypt (domyślnie, bez dodatkowych zależności) albo argon2 (wymaga argon2-cffi)
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "scrypt")
+# scrypt: N = 2**PASSWORD_SCRYPT_LN, pamięć ~ 128 * N * r bajtów (domyślnie 16 MB na skrót)
+PASSWORD_SCRYPT_LN = int(os.getenv("PASSWORD_SCRYPT_LN", "14"))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+# argon2id: koszt czasowy, pamięć w KiB, równoległość
+PASSWORD_ARGON2_T = int(os.getenv("PASSWORD_ARGON2_T", "2"))
+PASSWORD_ARGON2_M = int(os.getenv("PASSWORD_ARGON2_M", "19456"))
+PASSWORD_ARGON2_P = int(os.getenv("PASSWORD_ARGON2_P", "1"))
+# Procesy liczące skróty; 0 = w bieżącym procesie (dev, testy)
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Limit nieudanych logowań na identyfikator (email/login) w oknie czasowym
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "300"))
+
+
+class PasswordConfigError(Exception):
+    pass
+
+
+# --- SKRÓTY ---
+# Format scrypt: $scrypt$ln=14,r=8,p=1$<sól base64>$<skrót base64>; argon2 ma własny format $argon2id$...
+# Stare hasła zapisane otwartym tekstem rozpoznaje is_legacy (zob. _HASH_PREFIXES).
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, ln: int, r: int, p: int) -> bytes:
+    n = 2 ** ln
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + 1024 * 1024, dklen=32)
+
+
+def _argon2():
+    try:
+        from argon2 import PasswordHasher
+    except ImportError:
+        raise PasswordConfigError("PASSWORD_HASHER=argon2 wymaga pakietu argon2-cffi")
+    return PasswordHasher(time_cost=PASSWORD_ARGON2_T, memory_cost=PASSWORD_ARGON2_M,
+                          parallelism=PASSWORD_ARGON2_P)
+
+
+def hash_password(password: str) -> str:
+    if PASSWORD_HASHER == "argon2":
+        return _argon2().hash(password)
+    if PASSWORD_HASHER != "scrypt":
+        raise PasswordConfigError(f"Nieznany PASSWORD_HASHER: {PASSWORD_HASHER}")
+    salt = os.urandom(16)
+    digest = _scrypt(password, salt, PASSWORD_SCRYPT_LN, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    params = f"ln={PASSWORD_SCRYPT_LN},r={PASSWORD_SCRYPT_R},p={PASSWORD_SCRYPT_P}"
+    return f"$scrypt${params}${_b64(salt)}${_b64(digest)}"
+
+
+# Prefiksy skrótów, które umiemy zweryfikować; wszystko inne to stare hasło w otwartym tekście
+# (także takie, które samo zaczyna się od "$")
+_HASH_PREFIXES = ("$scrypt$", "$argon2")
+
+
+def is_legacy(stored: str) -> bool:
+    return not stored.startswith(_HASH_PREFIXES)
+
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """Zwraca (hasło poprawne, skrót trzeba przeliczyć - stary format albo inne parametry)."""
+    if is_legacy(stored):
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+
+    if stored.startswith("$scrypt$"):
+        try:
+            _, _, params, salt, digest = stored.split("$")
+            values = dict(item.split("=") for item in params.split(","))
+            ln, r, p = int(values["ln"]), int(values["r"]), int(values["p"])
+        except (ValueError, KeyError):
+            return False, False
+        ok = hmac.compare_digest(_scrypt(password, _unb64(salt), ln, r, p), _unb64(digest))
+        current = (PASSWORD_HASHER == "scrypt"
+                   and (ln, r, p) == (PASSWORD_SCRYPT_LN, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P))
+        return ok, ok and not current
+
+    if stored.startswith("$argon2"):
+        from argon2.exceptions import VerificationError, InvalidHashError
+        hasher = _argon2()
+        try:
+            hasher.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False, False
+        return True, PASSWORD_HASHER != "argon2" or hasher.check_needs_rehash(stored)
+
+    return False, False
+
+
+def _verify_and_rehash(password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+    # Jedno zadanie w puli: weryfikacja i - gdy trzeba - nowy skrót, bez drugiego kursu do procesu
+    if stored is None:
+        # Nieznany identyfikator: liczymy skrót tak samo, żeby czas odpowiedzi nie zdradzał,
+        # czy konto istnieje
+        verify_password(password, _dummy_hash())
+        return False, None
+    ok, needs_rehash = verify_password(password, stored)
+    return ok, (hash_password(password) if ok and needs_rehash else None)
+
+
+_DUMMY_HASH = None
+
+
+def _dummy_hash() -> str:
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = hash_password("nieistniejace-konto")
+    return _DUMMY_HASH
+
+
+# --- PULA PROCESÓW ---
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PASSWORD_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn zamiast fork - proces aplikacji ma już wątki i połączenia z bazą
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+async def _run(fn, *args):
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args)
+    return await asyncio.wrap_future(pool.submit(fn, *args))
+
+
+async def check_password(password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Weryfikacja poza pętlą zdarzeń. Zwraca (poprawne, nowy skrót do zapisania albo None)."""
+    if stored is not None and is_legacy(stored):
+        # Stare hasło w otwartym tekście: porównanie jest natychmiastowe, w puli liczymy tylko nowy skrót
+        if not hmac.compare_digest(password.encode(), stored.encode()):
+            return False, None
+        return True, await _run(hash_password, password)
+    return await _run(_verify_and_rehash, password, stored)
+
+
+async def make_hash(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# --- LIMIT PRÓB LOGOWANIA ---
+class LoginRateLimiter:
+    """Próby logowania per identyfikator w przesuwanym oknie (w pamięci procesu).
+
+    Próba jest rezerwowana przed weryfikacją hasła (reserve) i liczy się jako nieudana, dopóki
+    udane logowanie nie wyczyści licznika (reset) - równoległe zgadywanie tego samego
+    identyfikatora nie przejdzie ponad limit, zanim pierwsze weryfikacje się skończą.
+    Przy kilku workerach każdy ma własny licznik, więc efektywny limit to
+    LOGIN_MAX_FAILURES * liczba workerów.
+    """
+
+    def __init__(self, max_failures: int = LOGIN_MAX_FAILURES, window: float = LOGIN_FAILURE_WINDOW,
+                 max_keys: int = 100_000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(identifier: str) -> str:
+        return identifier.strip().lower()
+
+    def _recent(self, key: str, now: float) -> list:
+        attempts = [t for t in self._failures.get(key, ()) if now - t < self.window]
+        if attempts:
+            self._failures[key] = attempts
+        else:
+            self._failures.pop(key, None)
+        return attempts
+
+    def reserve(self, identifier: str) -> bool:
+        """Zapisuje próbę przed weryfikacją hasła; False, gdy limit jest wyczerpany."""
+        now = time.monotonic()
+        with self._lock:
+            key = self._key(identifier)
+            attempts = self._recent(key, now)
+            if len(attempts) >= self.max_failures:
+                return False
+            if key not in self._failures and len(self._failures) >= self.max_keys:
+                # Ochrona pamięci przy zalewie losowych identyfikatorów - najpierw wyrzucamy wygasłe
+                for other in list(self._failures):
+                    self._recent(other, now)
+                if len(self._failures) >= self.max_keys:
+                    self._failures.pop(next(iter(self._failures)))
+            self._failures[key] = attempts + [now]
+            return True
+
+    def reset(self, identifier: str):
+        with self._lock:
+            self._failures.pop(self._key(identifier), None)
+
+
+login_limiter = LoginRateLimiter()
@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+from fastapi import Request
+from sqlalchemy import select, literal, null, union_all, Integer
+from typing import Optional
+import os
+import time
+
+import models
+import database
+
+# --- KONFIGURACJA ---
+# Po ilu sekundach dane zalogowanego użytkownika zapisane w sesji są odświeżane z bazy
+# (zmiana roli, usunięte konto). Do tego czasu nagłówek strony nie robi żadnego zapytania.
+PRINCIPAL_TTL = float(os.getenv("PRINCIPAL_TTL", "300"))
+
+_SESSION_KEY = "principal"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Zalogowany użytkownik w wersji "do nagłówka": id, typ, rola i nazwa.
+
+    Trzymany w podpisanym ciasteczku sesji, więc odczyt nie wymaga bazy.
+    Endpointy potrzebujące pełnego wiersza (konto, zamówienia) dalej używają get_current_user.
+    """
+    user_id: int
+    user_type: str
+    imie: str
+    nazwisko: str
+    id_roli: Optional[int] = None
+
+    @property
+    def is_staff(self) -> bool:
+        return self.user_type == "pracownik"
+
+
+def _principal_from_user(user) -> Principal:
+    if isinstance(user, Principal):
+        return user
+    if isinstance(user, models.Pracownik):
+        return Principal(user.id_pracownika, "pracownik", user.imie, user.nazwisko, user.id_roli)
+    return Principal(user.id_klienta, "klient", user.imie, user.nazwisko)
+
+
+def remember(request: Request, user) -> Principal:
+    # Zapisuje użytkownika (wiersz Klient/Pracownik albo Principal) w sesji - wołane przy
+    # logowaniu i po każdym pełnym odczycie z bazy
+    principal = _principal_from_user(user)
+    request.session["user_id"] = principal.user_id
+    request.session["user_type"] = principal.user_type
+    request.session[_SESSION_KEY] = {
+        "imie": principal.imie,
+        "nazwisko": principal.nazwisko,
+        "rola": principal.id_roli,
+        "at": time.time(),
+    }
+    return principal
+
+
+def is_fresh(request: Request) -> bool:
+    data = request.session.get(_SESSION_KEY)
+    return data is not None and time.time() - data.get("at", 0) < PRINCIPAL_TTL
+
+
+def _from_session(request: Request) -> Principal:
+    data = request.session.get(_SESSION_KEY)
+    return Principal(
+        user_id=request.session["user_id"],
+        user_type=request.session.get("user_type") or "klient",
+        imie=data["imie"],
+        nazwisko=data["nazwisko"],
+        id_roli=data.get("rola"),
+    )
+
+
+# --- DANE LOGOWANIA ---
+# Klient loguje się emailem, pracownik loginem. Oba typy kont czytamy jednym zapytaniem
+# (UNION ALL - każda gałąź idzie po swoim unikalnym indeksie) o tych samych kolumnach,
+# więc logowanie i odświeżanie sesji nie muszą zgadywać typu konta.
+@dataclass(frozen=True)
+class Credentials:
+    principal: Principal
+    haslo_hash: str
+
+
+def _klient_credentials():
+    return select(
+        literal(0).label("kolejnosc"),
+        literal("klient").label("user_type"),
+        models.Klient.id_klienta.label("user_id"),
+        models.Klient.haslo_hash,
+        models.Klient.imie,
+        models.Klient.nazwisko,
+        null().cast(Integer).label("id_roli"),
+    )
+
+
+def _pracownik_credentials():
+    return select(
+        literal(1).label("kolejnosc"),
+        literal("pracownik").label("user_type"),
+        models.Pracownik.id_pracownika.label("user_id"),
+        models.Pracownik.haslo_hash,
+        models.Pracownik.imie,
+        models.Pracownik.nazwisko,
+        models.Pracownik.id_roli,
+    )
+
+
+def _credentials(row) -> Optional[Credentials]:
+    if row is None:
+        return None
+    return Credentials(
+        Principal(row.user_id, row.user_type, row.imie, row.nazwisko, row.id_roli),
+        row.haslo_hash,
+    )
+
+
+def find_credentials(db, identyfikator: str) -> Optional[Credentials]:
+    # Ten sam identyfikator jako email klienta i login pracownika - wygrywa klient (jak dotąd)
+    query = union_all(
+        _klient_credentials().where(models.Klient.adres_email == identyfikator),
+        _pracownik_credentials().where(models.Pracownik.login == identyfikator),
+    ).order_by("kolejnosc").limit(1)
+    return _credentials(db.execute(query).first())
+
+
+def load_credentials(db, user_id, user_type) -> Optional[Credentials]:
+    if user_type == "pracownik":
+        query = _pracownik_credentials().where(models.Pracownik.id_pracownika == user_id)
+    else:
+        query = _klient_credentials().where(models.Klient.id_klienta == user_id)
+    return _credentials(db.execute(query).first())
+
+
+def save_password_hash(db, principal: Principal, haslo_hash: str):
+    if principal.is_staff:
+        model, key = models.Pracownik, models.Pracownik.id_pracownika
+    else:
+        model, key = models.Klient, models.Klient.id_klienta
+    db.query(model).filter(key == principal.user_id).update({"haslo_hash": haslo_hash}, synchronize_session=False)
+    db.commit()
+
+
+def load_user(db, user_id, user_type):
+    if user_type == "pracownik":
+        return db.query(models.Pracownik).filter(models.Pracownik.id_pracownika == user_id).first()
+    return db.query(models.Klient).filter(models.Klient.id_klienta == user_id).first()
+
+
+# --- DEPENDENCY ---
+def current_principal(request: Request) -> Optional[Principal]:
+    """Zalogowany użytkownik bez zapytania do bazy (Depends(current_principal)).
+
+    Tylko gdy dane w sesji są starsze niż PRINCIPAL_TTL (albo sesja sprzed tej zmiany)
+    pobieramy wiersz z bazy - na krótkiej, synchronicznej sesji, więc działa
+    tak samo w trybie DB_ASYNC (FastAPI wykonuje tę funkcję w puli wątków).
+    """
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return None
+    if is_fresh(request):
+        return _from_session(request)
+    return _reload(request, user_id)
+
+
+def verified_principal(request: Request) -> Optional[Principal]:
+    """Zalogowany użytkownik zawsze odczytany z bazy (Depends(verified_principal)) - dla endpointów
+    zapisujących: odebrana rola albo usunięte konto działa od razu, a nie po PRINCIPAL_TTL.
+    Przy okazji odświeża dane w sesji."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return None
+    return _reload(request, user_id)
+
+
+def _reload(request: Request, user_id) -> Optional[Principal]:
+    db = database.SessionLocal()
+    try:
+        credentials = load_credentials(db, user_id, request.session.get("user_type"))
+    finally:
+        db.close()
+
+    if credentials is None:
+        # Konto usunięte - sesja jest już nieważna
+        request.session.clear()
+        return None
+    return remember(request, credentials.principal)
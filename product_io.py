@@ -0,0 +1,295 @@
+# Hurtowy import i eksport katalogu produktów (CSV albo JSON Lines), strumieniowo:
+# plik jest czytany wiersz po wierszu i zapisywany paczkami po IMPORT_BATCH_SIZE wierszy
+# (jedna transakcja na paczkę, UPDATE-y jako executemany, nowe produkty jednym INSERT-em),
+# a eksport wysyła wiersze generatorem, bez ładowania całej tabeli do pamięci.
+#
+#   python product_io.py export produkty.csv
+#   python product_io.py import cennik.csv --key nazwa --dry-run
+#
+# Kolumny pliku to nazwy kolumn model_produktu; wystarczy klucz i kolumny do zmiany
+# (np. "id_modelu;cena_katalogowa" dla cennika). CSV może być rozdzielany przecinkiem
+# albo średnikiem, ceny mogą mieć przecinek dziesiętny.
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+import models
+
+# --- KONFIGURACJA ---
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Ile błędów walidacji zwracamy w podsumowaniu (liczone są wszystkie)
+MAX_REPORTED_ERRORS = 100
+
+COLUMNS = ["id_modelu", "nazwa_modelu", "opis", "cena_katalogowa", "stan_magazynowy", "id_kategorii", "zdjecie_url"]
+KEYS = ("id", "nazwa")
+FORMATS = ("csv", "jsonl")
+
+_produkty = models.ModelProduktu.__table__
+
+
+class ProductImportError(Exception):
+    # Błąd całego pliku (zły format, nieznane kolumny) - w odróżnieniu od błędów pojedynczych wierszy
+    pass
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[dict] = field(default_factory=list)
+    dry_run: bool = False
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "message": message})
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "updated": self.updated, "failed": self.failed,
+                "errors": sorted(self.errors, key=lambda e: e["line"]), "dry_run": self.dry_run}
+
+
+# --- ODCZYT PLIKU ---
+def read_rows(stream, fmt: str) -> Iterator[tuple]:
+    """(numer linii, słownik) dla każdego wiersza; stream to plik binarny."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "jsonl":
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ProductImportError(f"Linia {line_no}: niepoprawny JSON ({e})")
+            if not isinstance(row, dict):
+                raise ProductImportError(f"Linia {line_no}: oczekiwano obiektu JSON")
+            yield line_no, row
+        return
+
+    if fmt != "csv":
+        raise ProductImportError(f"Nieznany format: {fmt}")
+    header = text.readline()
+    # Excel z polskimi ustawieniami zapisuje CSV ze średnikiem
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    columns = [c.strip() for c in next(csv.reader([header], delimiter=delimiter), [])]
+    unknown = [c for c in columns if c not in COLUMNS]
+    if unknown:
+        raise ProductImportError(f"Nieznane kolumny: {', '.join(unknown)} (dozwolone: {', '.join(COLUMNS)})")
+    reader = csv.reader(text, delimiter=delimiter)
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        # line_num czytnika liczy od drugiej linii pliku (nagłówek przeczytaliśmy sami)
+        yield reader.line_num + 1, dict(zip(columns, values))
+
+
+# --- WALIDACJA ---
+def _number(value, cast):
+    text = value.strip().replace(" ", "").replace(",", ".") if isinstance(value, str) else value
+    try:
+        return cast(text)
+    except (TypeError, ValueError):
+        raise ValueError(f"Niepoprawna liczba: {value!r}")
+
+
+def _validate(raw: dict, key: str, category_ids: set) -> dict:
+    row = {}
+    for column, value in raw.items():
+        column = (column or "").strip()
+        if column not in COLUMNS:
+            raise ValueError(f"Nieznana kolumna: {column!r}")
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            continue
+        row[column] = value
+
+    if "id_modelu" in row:
+        row["id_modelu"] = _number(row["id_modelu"], int)
+    if "cena_katalogowa" in row:
+        row["cena_katalogowa"] = round(_number(row["cena_katalogowa"], float), 2)
+        if row["cena_katalogowa"] < 0:
+            raise ValueError("Cena nie może być ujemna")
+    if "stan_magazynowy" in row:
+        row["stan_magazynowy"] = _number(row["stan_magazynowy"], int)
+        if row["stan_magazynowy"] < 0:
+            raise ValueError("Stan magazynowy nie może być ujemny")
+    if "id_kategorii" in row:
+        row["id_kategorii"] = _number(row["id_kategorii"], int)
+        if row["id_kategorii"] not in category_ids:
+            raise ValueError(f"Nie ma kategorii {row['id_kategorii']}")
+    if len(row.get("nazwa_modelu", "")) > 100:
+        raise ValueError("Nazwa dłuższa niż 100 znaków")
+    if len(row.get("zdjecie_url", "")) > 255:
+        raise ValueError("Adres zdjęcia dłuższy niż 255 znaków")
+    if key == "nazwa" and "nazwa_modelu" not in row:
+        raise ValueError("Brak nazwy produktu (klucz importu: nazwa)")
+    return row
+
+
+# --- IMPORT ---
+def _existing_ids(db: Session, rows: list, key: str) -> dict:
+    # Jedno zapytanie IN (...) na paczkę: wartość klucza -> id_modelu (None, gdy nazwa niejednoznaczna)
+    if key == "id":
+        ids = {row["id_modelu"] for _, row in rows if "id_modelu" in row}
+        found = db.execute(select(_produkty.c.id_modelu).where(_produkty.c.id_modelu.in_(ids))).scalars() if ids else []
+        return {i: i for i in found}
+
+    names = {row["nazwa_modelu"] for _, row in rows}
+    existing = {}
+    for id_modelu, nazwa in db.execute(
+            select(_produkty.c.id_modelu, _produkty.c.nazwa_modelu).where(_produkty.c.nazwa_modelu.in_(names))):
+        existing[nazwa] = None if nazwa in existing else id_modelu
+    return existing
+
+
+def _apply_batch(db: Session, rows: list, key: str, result: ImportResult):
+    existing = _existing_ids(db, rows, key)
+    updates, inserts = {}, {}
+    for line_no, row in rows:
+        lookup = row.get("id_modelu") if key == "id" else row["nazwa_modelu"]
+        if lookup is not None and lookup in existing:
+            if existing[lookup] is None:
+                result.error(line_no, f"Kilka produktów o nazwie {lookup!r} - użyj klucza id")
+                continue
+            # Powtórzony produkt w pliku: ostatni wiersz wygrywa, kolumny się sumują
+            updates.setdefault(existing[lookup], {}).update(row)
+        elif key == "id" and lookup is not None:
+            result.error(line_no, f"Nie ma produktu o id {lookup}")
+        else:
+            missing = [c for c in ("nazwa_modelu", "cena_katalogowa", "id_kategorii") if c not in row]
+            if missing:
+                result.error(line_no, f"Nowy produkt wymaga kolumn: {', '.join(missing)}")
+                continue
+            new_key = row["nazwa_modelu"] if key == "nazwa" else line_no
+            inserts.setdefault(new_key, {"stan_magazynowy": 0}).update(row)
+
+    # executemany wymaga tych samych kolumn w każdym wierszu - grupujemy UPDATE-y wg zestawu kolumn
+    by_columns = {}
+    for id_modelu, row in updates.items():
+        columns = tuple(sorted(c for c in row if c != "id_modelu"))
+        if columns:
+            by_columns.setdefault(columns, []).append({"b_id": id_modelu, **{f"b_{c}": row[c] for c in columns}})
+
+    if not result.dry_run:
+        for columns, params in by_columns.items():
+            db.execute(
+                update(_produkty)
+                .where(_produkty.c.id_modelu == bindparam("b_id"))
+                .values({c: bindparam(f"b_{c}") for c in columns}),
+                params,
+            )
+        if inserts:
+            db.execute(insert(_produkty), [{c: row.get(c) for c in COLUMNS if c != "id_modelu"}
+                                           for row in inserts.values()])
+        db.commit()
+    result.updated += len(updates)
+    result.inserted += len(inserts)
+
+
+def import_products(db: Session, rows: Iterable[tuple], key: str = "id", dry_run: bool = False,
+                    batch_size: int = IMPORT_BATCH_SIZE) -> ImportResult:
+    """Upsert produktów z (numer linii, słownik). Każda paczka to osobna transakcja -
+    błąd bazy odrzuca tylko swoją paczkę (jej wiersze trafiają do błędów)."""
+    if key not in KEYS:
+        raise ProductImportError(f"Nieznany klucz importu: {key}")
+    result = ImportResult(dry_run=dry_run)
+    category_ids = set(db.execute(select(models.Kategoria.id_kategorii)).scalars())
+
+    def apply(batch):
+        try:
+            _apply_batch(db, batch, key, result)
+        except SQLAlchemyError as e:
+            # Odrzucamy tylko tę paczkę; kolejne próbujemy zapisać
+            db.rollback()
+            for line_no, _ in batch:
+                result.error(line_no, f"Błąd bazy w paczce: {e.__class__.__name__}")
+
+    batch = []
+    for line_no, raw in rows:
+        try:
+            batch.append((line_no, _validate(raw, key, category_ids)))
+        except (ValueError, TypeError) as e:
+            result.error(line_no, str(e))
+        if len(batch) >= batch_size:
+            apply(batch)
+            batch = []
+    if batch:
+        apply(batch)
+    return result
+
+
+# --- EKSPORT ---
+def export_rows(db: Session) -> Iterator[tuple]:
+    # yield_per: kursor jest czytany porcjami, w pamięci jest naraz najwyżej EXPORT_BATCH_SIZE wierszy
+    query = (
+        select(*(_produkty.c[c] for c in COLUMNS))
+        .order_by(_produkty.c.id_modelu)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    for row in db.execute(query):
+        yield tuple(row)
+
+
+def export_chunks(session_factory, fmt: str) -> Iterator[str]:
+    """Plik eksportu w kawałkach tekstu. Sesję otwiera sam - odpowiedź strumieniowa trwa
+    dłużej niż sesja requestu."""
+    with session_factory() as db:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=";") if fmt == "csv" else None
+        if writer:
+            writer.writerow(COLUMNS)
+        for count, values in enumerate(export_rows(db), start=1):
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(COLUMNS, values)), ensure_ascii=False) + "\n")
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt
+    return "jsonl" if (filename or "").lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import / eksport katalogu produktów")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="plik CSV albo JSON Lines (- = stdin/stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="domyślnie wg rozszerzenia pliku")
+    parser.add_argument("--key", choices=KEYS, default="id", help="import: dopasowanie po id_modelu albo nazwie")
+    parser.add_argument("--dry-run", action="store_true", help="import: tylko walidacja, bez zapisu")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    fmt = detect_format(args.path, args.format)
+    if args.command == "export":
+        out = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+        with out:
+            for chunk in export_chunks(SessionLocal, fmt):
+                out.write(chunk)
+    else:
+        source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+        with source, SessionLocal() as session:
+            try:
+                summary = import_products(session, read_rows(source, fmt), key=args.key, dry_run=args.dry_run)
+            except ProductImportError as e:
+                sys.exit(str(e))
+        print(json.dumps(summary.as_dict(), ensure_ascii=False, indent=2))
+        print("Po imporcie zrestartuj aplikację albo poczekaj CATALOG_CACHE_TTL, żeby strona główna pokazała zmiany.",
+              file=sys.stderr)
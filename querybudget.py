@@ -0,0 +1,237 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Optional
+import json
+import logging
+import os
+
+# --- KONFIGURACJA ---
+# QUERY_BUDGET=1 włącza liczenie zapytań SQL na request (dev/CI),
+# QUERY_BUDGET_STRICT=1 dodatkowo zwraca błąd 500, gdy endpoint przekroczy budżet.
+QUERY_BUDGET_ENABLED = os.getenv("QUERY_BUDGET", "0") == "1"
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "0") == "1"
+
+# Maksymalna liczba zapytań na request, wg szablonu ścieżki.
+# Liczba nie może zależeć od liczby pozycji/zamówień - to łapie N+1.
+QUERY_BUDGETS = {
+    "/login": 2,                   # konto (klient i pracownik jednym zapytaniem), UPDATE skrótu przy przeliczeniu hasła
+    "/order/submit": 15,           # użytkownik, produkty, UPDATE stanów, INSERT adres/zamówienie/pozycje/zadanie, nowe stany (+4 co kilka s - analityka, +3 co ORDER_NUMBER_BLOCK zamówień - numery)
+    "/zamowienie/{order_id}": 3,   # użytkownik, zamówienie + adres, pozycje + produkty
+    "/podsumowanie": 2,            # użytkownik, adres domyślny
+    "/konto.html": 2,              # użytkownik, zamówienia
+    "/koszyk.html": 1,             # użytkownik z sesji - zapytanie tylko przy odświeżeniu (PRINCIPAL_TTL)
+    "/admin.html": 5,              # użytkownik, produkty + kategorie produktów, kategorie, strona zamówień, COUNT
+    "/sprzedawca.html": 4,         # użytkownik, strona zamówień, COUNT, produkty
+    "/magazynier.html": 4,         # użytkownik, strona zamówień, COUNT, produkty
+    "/api/products/batch": 8,      # blokada + odczyt wierszy, UPDATE-y wg pola i operacji (do 4), INSERT logu; rola z bazy (verified_principal)
+    "/api/orders": 2,              # użytkownik, strona zamówień
+    "/api/events": 1,              # użytkownik z sesji - zapytanie tylko przy odświeżeniu (PRINCIPAL_TTL); strumień bez bazy
+    "/api/analytics/sales": 5,     # zapis bufora analityki (do 4), tabela zbiorcza; użytkownik z sesji
+    "/api/analytics/products": 5,
+    "/api/analytics/categories": 5,
+    "/api/analytics/statuses": 5,
+}
+
+
+logger = logging.getLogger("sklep.querybudget")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class StatementCounter:
+    def __init__(self, parent: Optional["StatementCounter"] = None):
+        self.count = 0
+        self.db_time = 0.0
+        self.statements = []
+        # Zagnieżdżone liczniki (np. benchmark wokół middleware) - zapytanie liczy się w każdym
+        self.parent = parent
+
+    def record(self, statement):
+        self.count += 1
+        self.statements.append(statement)
+        if self.parent is not None:
+            self.parent.record(statement)
+
+    def add_time(self, seconds: float):
+        self.db_time += seconds
+        if self.parent is not None:
+            self.parent.add_time(seconds)
+
+
+_current_counter: ContextVar[Optional[StatementCounter]] = ContextVar("sql_statement_counter", default=None)
+
+
+def current_counter() -> Optional[StatementCounter]:
+    return _current_counter.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record(statement)
+
+
+class count_statements:
+    """Liczy zapytania SQL wykonane w bloku `with` (także w wątkach puli FastAPI)."""
+
+    def __enter__(self) -> StatementCounter:
+        self.counter = StatementCounter(parent=_current_counter.get())
+        self._token = _current_counter.set(self.counter)
+        return self.counter
+
+    def __exit__(self, *exc):
+        _current_counter.reset(self._token)
+        return False
+
+
+def check_budget(route_path: str, counter: StatementCounter):
+    budget = QUERY_BUDGETS.get(route_path)
+    if budget is None or counter.count <= budget:
+        return
+    message = f"{route_path}: {counter.count} zapytań SQL (budżet {budget})"
+    if QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message + "\n" + "\n".join(counter.statements))
+    logger.warning(message)
+
+
+class QueryBudgetMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        with count_statements() as counter:
+            response = await call_next(request)
+
+        route = request.scope.get("route")
+        if route is not None:
+            check_budget(route.path, counter)
+        return response
+
+
+# --- SPRAWDZENIE: WSZYSTKIE TRASY Z BUDŻETEM (python querybudget.py check) ---
+# Zasiewa tymczasową bazę (benchmark.seed_database), przechodzi każdą trasę z QUERY_BUDGETS
+# kilka razy jako odpowiedni użytkownik i kończy się kodem 1, gdy któraś przekroczy budżet.
+# Trasa z budżetem bez requestu w _check_requests też jest błędem - nowy budżet wymaga requestu.
+def _check_requests():
+    # (szablon trasy, kto, metoda, ścieżka, dane formularza, JSON); ścieżka None - właśnie złożone zamówienie
+    cart = json.dumps([{"id": 1, "qty": 1}, {"id": 2, "qty": 2}])
+    address = {"ulica": "Testowa", "nr_domu": "1", "kod_pocztowy": "00-001", "miejscowosc": "Warszawa"}
+    batch = {"changes": [{"id": 1, "field": "stan_magazynowy", "op": "add", "value": 1},
+                         {"id": 2, "field": "cena_katalogowa", "op": "set", "value": 99.0}]}
+    return [
+        ("/login", None, "POST", "/login", {"identyfikator": "bench1@sklep.test", "password": "bench"}, None),
+        ("/koszyk.html", "bench1@sklep.test", "GET", "/koszyk.html", None, None),
+        ("/podsumowanie", "bench1@sklep.test", "GET", "/podsumowanie", None, None),
+        ("/order/submit", "bench1@sklep.test", "POST", "/order/submit", dict(address, cart_json=cart), None),
+        ("/zamowienie/{order_id}", "bench1@sklep.test", "GET", None, None, None),
+        ("/konto.html", "bench1@sklep.test", "GET", "/konto.html", None, None),
+        ("/admin.html", "bench_admin", "GET", "/admin.html", None, None),
+        ("/sprzedawca.html", "bench_sprzedawca", "GET", "/sprzedawca.html", None, None),
+        ("/magazynier.html", "bench_magazynier", "GET", "/magazynier.html", None, None),
+        ("/api/products/batch", "bench_admin", "POST", "/api/products/batch", None, batch),
+        ("/api/orders", "bench_sprzedawca", "GET", "/api/orders?status=Nowe", None, None),
+        ("/api/events", "bench_sprzedawca", "GET", "/api/events", None, None),
+        ("/api/analytics/sales", "bench_sprzedawca", "GET", "/api/analytics/sales?days=30", None, None),
+        ("/api/analytics/products", "bench_sprzedawca", "GET", "/api/analytics/products?days=30", None, None),
+        ("/api/analytics/categories", "bench_sprzedawca", "GET", "/api/analytics/categories?days=30", None, None),
+        ("/api/analytics/statuses", "bench_sprzedawca", "GET", "/api/analytics/statuses?days=30", None, None),
+    ]
+
+
+async def _run_check(app, repeat: int) -> dict:
+    import httpx
+
+    clients = {}
+    worst = {}
+
+    async def client_for(who):
+        if who not in clients:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check")
+            if who is not None:
+                response = await client.post("/login", data={"identyfikator": who, "password": "bench"})
+                if response.status_code != 303:
+                    raise RuntimeError(f"Logowanie {who} nie powiodło się ({response.status_code})")
+            clients[who] = client
+        return clients[who]
+
+    order_path = None
+    try:
+        for _ in range(repeat):
+            for route, who, method, path, data, body in _check_requests():
+                client = await client_for(who)
+                path = path or order_path
+                with count_statements() as counter:
+                    response = await client.request(method, path, data=data, json=body)
+                if response.status_code >= 400 or (method == "POST" and response.status_code not in (200, 303)):
+                    raise RuntimeError(f"{method} {path}: HTTP {response.status_code}")
+                if route == "/order/submit":
+                    order_path = response.headers["location"].split("?")[0]
+                previous = worst.get(route)
+                if previous is None or counter.count > previous.count:
+                    worst[route] = counter
+    finally:
+        for client in clients.values():
+            await client.aclose()
+    return worst
+
+
+def check(repeat: int = 3, orders: int = 2000) -> list:
+    """Przechodzi trasy z QUERY_BUDGETS na zasianej bazie; zwraca listę przekroczeń (pusta = OK)."""
+    import asyncio
+    import random
+    from argparse import Namespace
+
+    import benchmark
+    import database
+    import migrate
+
+    migrate.upgrade(database.engine)
+    import main
+
+    # Dużo zamówień i pozycji - zapytanie na wiersz (N+1) od razu przekroczy budżet
+    sizes = Namespace(categories=10, products=500, clients=50, orders=orders)
+    benchmark.seed_database(database.engine, sizes, random.Random(1234))
+    worst = asyncio.run(_run_check(main.app, repeat))
+
+    problems = []
+    for route, budget in QUERY_BUDGETS.items():
+        counter = worst.get(route)
+        if counter is None:
+            problems.append(f"{route}: brak requestu w sprawdzeniu")
+            continue
+        print(f"{'OK' if counter.count <= budget else 'ZA DUŻO':<8}{route}: {counter.count} / {budget}")
+        if counter.count > budget:
+            problems.append(f"{route}: {counter.count} zapytań SQL (budżet {budget})\n    " +
+                            "\n    ".join(" ".join(st.split()) for st in counter.statements))
+    return problems
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Budżety zapytań SQL na trasę")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--repeat", type=int, default=3, help="ile razy przejść każdą trasę (liczy się najgorszy wynik)")
+    parser.add_argument("--orders", type=int, default=2000, help="zamówień w zasianej bazie")
+    args = parser.parse_args()
+
+    # Baza tymczasowa i konfiguracja przed importem aplikacji (database.py czyta ją przy imporcie)
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'querybudget.db')}"
+    os.environ.setdefault("PASSWORD_WORKERS", "0")
+    os.environ.setdefault("IMAGE_WORKERS", "0")
+    os.environ["PAGE_CACHE"] = "0"
+    os.environ["EVENTS_MAX_STREAM_SECONDS"] = "0.2"  # strumień /api/events kończy się sam
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    problems = check(args.repeat, args.orders)
+    if problems:
+        print("\nPRZEKROCZONE BUDŻETY:")
+        for line in problems:
+            print(f"- {line}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,80 @@
+// --- PANELE PRACOWNIKÓW: STATYSTYKI SPRZEDAŻY ---
+// Dane z /api/analytics/* (tabele zbiorcze) - pobierane przy pierwszym otwarciu zakładki
+// i przy zmianie okresu. Wykresy to zwykłe słupki w CSS, bez biblioteki.
+document.addEventListener('DOMContentLoaded', () => {
+    const section = document.getElementById('statystyki');
+    const tabLink = document.querySelector('a[href="#statystyki"]');
+    if (!section || !tabLink) return;
+
+    const daysSelect = document.getElementById('analytics-days');
+    const salesBox = document.getElementById('analytics-sales');
+    const productsBody = document.getElementById('analytics-products');
+    const categoriesBox = document.getElementById('analytics-categories');
+    const statusesBox = document.getElementById('analytics-statuses');
+    let loaded = false;
+
+    const money = value => `${value.toFixed(2)} zł`;
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function renderBars(box, rows) {
+        const max = Math.max(1, ...rows.map(r => r.value));
+        box.innerHTML = rows.length ? rows.map(r => `
+            <div class="analytics-bar-row">
+                <span class="analytics-bar-label">${escapeHtml(r.label)}</span>
+                <span class="analytics-bar"><span style="width: ${(r.value / max * 100).toFixed(1)}%"></span></span>
+                <span class="analytics-bar-value">${r.text}</span>
+            </div>`).join('') : '<p class="analytics-empty">Brak danych</p>';
+    }
+
+    function renderSales(days) {
+        const max = Math.max(1, ...days.map(d => d.revenue));
+        salesBox.innerHTML = days.map(d => `
+            <div class="analytics-column" title="${d.day}: ${money(d.revenue)} (${d.orders} zam.)">
+                <span style="height: ${(d.revenue / max * 100).toFixed(1)}%"></span>
+            </div>`).join('');
+    }
+
+    function renderProducts(products) {
+        productsBody.innerHTML = products.length ? products.map(p => `
+            <tr>
+                <td>${escapeHtml(p.name)}</td>
+                <td>${p.units}</td>
+                <td>${money(p.revenue)}</td>
+                <td>${p.stock}</td>
+                <td>${p.days_of_stock ?? '-'}</td>
+            </tr>`).join('') : '<tr><td colspan="5">Brak sprzedaży w tym okresie</td></tr>';
+    }
+
+    async function getJson(url) {
+        const response = await fetch(url);
+        if (!response.ok) throw new Error(response.status);
+        return response.json();
+    }
+
+    async function loadAnalytics() {
+        const days = daysSelect.value;
+        try {
+            const [sales, products, categories, statuses] = await Promise.all([
+                getJson(`/api/analytics/sales?days=${days}`),
+                getJson(`/api/analytics/products?days=${days}`),
+                getJson(`/api/analytics/categories?days=${days}`),
+                getJson('/api/analytics/statuses'),
+            ]);
+            renderSales(sales);
+            renderProducts(products);
+            renderBars(categoriesBox, categories.map(c => ({label: c.name, value: c.revenue, text: money(c.revenue)})));
+            renderBars(statusesBox, Object.entries(statuses).map(([status, count]) => ({label: status, value: count, text: count})));
+            loaded = true;
+        } catch (error) {
+            console.error("Błąd pobierania statystyk:", error);
+        }
+    }
+
+    tabLink.addEventListener('click', () => { if (!loaded) loadAnalytics(); });
+    daysSelect.addEventListener('change', loadAnalytics);
+});
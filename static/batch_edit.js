@@ -0,0 +1,148 @@
+// --- PANELE PRACOWNIKÓW: EDYCJA WIELU PRODUKTÓW NARAZ ---
+// Tabela z klasą .batch-grid (data-batch-field = pole produktu) zbiera zmienione wiersze:
+// pole .batch-set to nowa wartość, .batch-add to zmiana względna (+/-). "Zapisz zmiany"
+// wysyła wszystko jednym żądaniem do /api/products/batch - jedna transakcja, wszystko albo nic.
+// Przycisk przy wierszu (zwykły formularz) dalej zapisuje pojedynczy produkt.
+// Zmiany zrobione przez innych (zamówienia, inni pracownicy) przychodzą z live.js jako 'sklep:product'.
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.batch-grid').forEach(table => {
+        const field = table.dataset.batchField;
+        const isInt = field === 'stan_magazynowy';
+        const toolbar = document.querySelector(`.batch-toolbar[data-for="${table.id}"]`);
+        if (!toolbar) return;
+        const saveButton = toolbar.querySelector('.batch-save');
+        const resetButton = toolbar.querySelector('.batch-reset');
+        const counter = toolbar.querySelector('.batch-count');
+        const message = toolbar.querySelector('.batch-message');
+        const rows = Array.from(table.querySelectorAll('tbody tr[data-id]'));
+
+        const parse = text => (isInt ? parseInt(text, 10) : parseFloat(text));
+        const format = value => (isInt ? `${value} szt.` : `${value.toFixed(2)} zł`);
+
+        function rowChanges(row) {
+            const current = parse(row.dataset.value);
+            const setValue = parse(row.querySelector('.batch-set').value);
+            const addValue = parse(row.querySelector('.batch-add').value);
+            const changes = [];
+            if (!Number.isNaN(setValue) && setValue !== current) {
+                changes.push({ id: Number(row.dataset.id), field, op: 'set', value: setValue });
+            }
+            if (!Number.isNaN(addValue) && addValue !== 0) {
+                changes.push({ id: Number(row.dataset.id), field, op: 'add', value: addValue });
+            }
+            return changes;
+        }
+
+        function refresh() {
+            let dirty = 0;
+            rows.forEach(row => {
+                const changed = rowChanges(row).length > 0;
+                row.classList.toggle('batch-dirty', changed);
+                if (changed) dirty += 1;
+            });
+            counter.textContent = dirty;
+            saveButton.disabled = dirty === 0;
+        }
+
+        function setStatus(row, text, ok) {
+            const status = row.querySelector('.batch-status');
+            status.textContent = text;
+            status.classList.toggle('batch-status-error', !ok);
+        }
+
+        function showValue(row, value) {
+            row.dataset.value = value;
+            row.querySelector('.batch-set').value = value;
+            row.querySelector('.batch-add').value = '';
+            const current = row.querySelector('.batch-current');
+            current.textContent = format(value);
+            if (current.dataset.lowBelow) {
+                current.classList.toggle('stock-low', value < Number(current.dataset.lowBelow));
+            }
+        }
+
+        // Zmiana z zewnątrz: bieżąca wartość zawsze, pole "nowa wartość" tylko gdy wiersz nie jest edytowany
+        document.addEventListener('sklep:product', event => {
+            const value = event.detail[field];
+            if (value === undefined) return;
+            const row = table.querySelector(`tbody tr[data-id="${event.detail.id}"]`);
+            if (!row || parse(row.dataset.value) === value) return;
+            if (row.classList.contains('batch-dirty')) {
+                row.dataset.value = value;
+                const current = row.querySelector('.batch-current');
+                current.textContent = format(value);
+                if (current.dataset.lowBelow) {
+                    current.classList.toggle('stock-low', value < Number(current.dataset.lowBelow));
+                }
+                refresh();
+            } else {
+                showValue(row, value);
+            }
+            row.classList.remove('live-updated');
+            void row.offsetWidth; // restart animacji przy kolejnych zmianach
+            row.classList.add('live-updated');
+        });
+
+        table.addEventListener('input', event => {
+            if (event.target.matches('.batch-set, .batch-add')) refresh();
+        });
+
+        resetButton.addEventListener('click', () => {
+            rows.forEach(row => {
+                row.querySelector('.batch-set').value = row.dataset.value;
+                row.querySelector('.batch-add').value = '';
+                setStatus(row, '', true);
+            });
+            message.textContent = '';
+            refresh();
+        });
+
+        saveButton.addEventListener('click', async () => {
+            const changes = [];
+            const changedRows = [];
+            rows.forEach(row => {
+                rowChanges(row).forEach(change => {
+                    changes.push(change);
+                    changedRows.push(row);
+                });
+            });
+            if (!changes.length) return;
+
+            saveButton.disabled = true;
+            message.textContent = 'Zapisywanie...';
+            try {
+                const response = await fetch('/api/products/batch', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ changes }),
+                });
+                const data = await response.json();
+                if (response.status !== 200 && response.status !== 422) {
+                    message.textContent = `Błąd: ${data.error || data}`;
+                    return;
+                }
+                changedRows.forEach(row => setStatus(row, '', true));
+                data.results.forEach((result, i) => {
+                    const row = changedRows[i];
+                    if (data.applied) {
+                        showValue(row, result.new);
+                        setStatus(row, 'zapisano', true);
+                    } else if (result.status === 'error') {
+                        setStatus(row, result.message, false);
+                    } else if (!row.querySelector('.batch-status-error')) {
+                        setStatus(row, 'nie zapisano', false);
+                    }
+                });
+                message.textContent = data.applied
+                    ? `Zapisano ${changes.length} zmian.`
+                    : 'Nic nie zapisano - popraw zaznaczone wiersze.';
+            } catch (err) {
+                message.textContent = 'Nie udało się wysłać zmian.';
+            } finally {
+                refresh();
+            }
+        });
+
+        refresh();
+    });
+});
@@ -0,0 +1,77 @@
+// --- ZDARZENIA NA ŻYWO (/api/events, Server-Sent Events) ---
+// Jedno połączenie na stronę; zdarzenia trafiają do dokumentu jako 'sklep:product'
+// i 'sklep:order' (detail = dane zdarzenia), a obsługują je skrypty paneli (batch_edit.js,
+// orders.js) i poniższy kod strony szczegółów produktu.
+// <script src="live.js" data-products="5"> zawęża strumień do wybranych produktów.
+(() => {
+    if (!window.EventSource) return;
+    const script = document.currentScript;
+    const products = script && script.dataset.products;
+    const source = new EventSource('/api/events' + (products ? `?products=${encodeURIComponent(products)}` : ''));
+
+    ['product', 'order'].forEach(kind => {
+        source.addEventListener(kind, message => {
+            document.dispatchEvent(new CustomEvent(`sklep:${kind}`, { detail: JSON.parse(message.data) }));
+        });
+    });
+
+    // Serwer nie ma zaległych zdarzeń dla tego połączenia: restart, długa przerwa albo ponowne
+    // połączenie z innym workerem uvicorna (każdy ma własną historię). Zamiast przeładowania
+    // strony pobieramy bieżący stan - produkty z /api/products-details trafiają do skryptów
+    // jako zwykłe 'sklep:product', a listy zamówień odświeżają się na 'sklep:resync' (orders.js).
+    const RESYNC_CHUNK = 100; // tyle ids przyjmuje /api/products-details (catalog.MAX_CART_IDS)
+
+    async function resyncProducts() {
+        const ids = new Set();
+        document.querySelectorAll('.batch-grid tbody tr[data-id]').forEach(row => ids.add(Number(row.dataset.id)));
+        document.querySelectorAll('.price-section[data-product-id]').forEach(section => ids.add(Number(section.dataset.productId)));
+        const all = Array.from(ids);
+        for (let i = 0; i < all.length; i += RESYNC_CHUNK) {
+            const response = await fetch('/api/products-details', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(all.slice(i, i + RESYNC_CHUNK)),
+            });
+            if (!response.ok) throw new Error(response.status);
+            (await response.json()).forEach(p => {
+                const detail = { id: p.id, stan_magazynowy: p.stock, cena_katalogowa: p.price };
+                document.dispatchEvent(new CustomEvent('sklep:product', { detail }));
+            });
+        }
+    }
+
+    source.addEventListener('reset', () => {
+        resyncProducts().catch(error => console.error("Błąd odświeżania produktów:", error));
+        document.dispatchEvent(new CustomEvent('sklep:resync'));
+    });
+
+    // --- STRONA SZCZEGÓŁÓW: DOSTĘPNOŚĆ I CENA ---
+    document.addEventListener('sklep:product', event => {
+        const section = document.querySelector('.price-section[data-product-id]');
+        if (!section || Number(section.dataset.productId) !== event.detail.id) return;
+        const data = event.detail;
+
+        if (data.cena_katalogowa !== undefined) {
+            section.querySelector('.price-value').textContent = `${data.cena_katalogowa} zł`;
+        }
+        if (data.stan_magazynowy === undefined) return;
+        const stock = data.stan_magazynowy;
+        const availability = section.querySelector('.availability');
+        availability.style.color = stock > 0 ? '#28a745' : '#dc3545';
+        availability.innerHTML = stock > 0
+            ? `<i class="fa-solid fa-check"></i> Dostępny (${stock} szt.)`
+            : '<i class="fa-solid fa-xmark"></i> Wyprzedany';
+
+        const button = document.querySelector('.add-to-cart-big');
+        const qtyInput = document.querySelector('.purchase-section .qty-input');
+        if (qtyInput) qtyInput.max = stock;
+        if (!button) return;
+        button.disabled = stock <= 0;
+        button.dataset.stock = stock;
+        button.style.backgroundColor = stock > 0 ? '' : '#ccc';
+        button.style.cursor = stock > 0 ? '' : 'not-allowed';
+        button.innerHTML = stock > 0
+            ? '<i class="fa-solid fa-cart-shopping"></i> DODAJ DO KOSZYKA'
+            : 'PRODUKT NIEDOSTĘPNY';
+    });
+})();
@@ -0,0 +1,94 @@
+// --- PANELE PRACOWNIKÓW: DOCZYTYWANIE ZAMÓWIEŃ ---
+// Serwer renderuje pierwszą stronę zamówień, kolejne przychodzą z /api/orders
+// (gotowe wiersze tabeli, te same co w szablonie panelu). Zmiany na żywo (live.js)
+// odświeżają tylko dotknięte wiersze - też przez /api/orders, z bieżącymi filtrami.
+document.addEventListener('DOMContentLoaded', () => {
+    const filters = document.querySelector('.orders-filters');
+    const tbody = document.getElementById('orders-body');
+    const loadMoreBtn = document.getElementById('orders-load-more');
+    if (!filters || !tbody || !loadMoreBtn) return;
+
+    const statusSelect = document.getElementById('orders-status');
+    const dateFrom = document.getElementById('orders-date-from');
+    const dateTo = document.getElementById('orders-date-to');
+    const applyBtn = document.getElementById('orders-apply');
+
+    function buildParams(cursor) {
+        const params = new URLSearchParams();
+        params.set('panel', filters.dataset.panel);
+        params.set('order', filters.dataset.order);
+        if (statusSelect.value) params.set('status', statusSelect.value);
+        if (dateFrom.value) params.set('date_from', dateFrom.value);
+        if (dateTo.value) params.set('date_to', dateTo.value);
+        if (cursor) params.set('cursor', cursor);
+        return params;
+    }
+
+    async function loadOrders(cursor, replace) {
+        loadMoreBtn.disabled = true;
+        try {
+            const response = await fetch(`/api/orders?${buildParams(cursor)}`);
+            if (!response.ok) throw new Error(response.status);
+            const data = await response.json();
+
+            if (replace) tbody.innerHTML = '';
+            tbody.insertAdjacentHTML('beforeend', data.html);
+
+            loadMoreBtn.dataset.nextCursor = data.next_cursor || '';
+            loadMoreBtn.hidden = !data.next_cursor;
+        } catch (error) {
+            console.error("Błąd pobierania zamówień:", error);
+        } finally {
+            loadMoreBtn.disabled = false;
+        }
+    }
+
+    loadMoreBtn.addEventListener('click', () => loadOrders(loadMoreBtn.dataset.nextCursor, false));
+    applyBtn.addEventListener('click', () => loadOrders(null, true));
+
+    // Zdarzenia z kilkuset ms zbieramy w jedno żądanie
+    const changedIds = new Set();
+    let refreshTimer = null;
+
+    async function refreshRows() {
+        const ids = Array.from(changedIds);
+        changedIds.clear();
+        refreshTimer = null;
+        const params = buildParams(null);
+        params.set('ids', ids.join(','));
+        try {
+            const response = await fetch(`/api/orders?${params}`);
+            if (!response.ok) throw new Error(response.status);
+            const data = await response.json();
+            const fresh = document.createElement('tbody');
+            fresh.innerHTML = data.html;
+            const rows = new Map(Array.from(fresh.children).map(row => [Number(row.dataset.orderId), row]));
+
+            ids.forEach(id => {
+                const current = tbody.querySelector(`tr[data-order-id="${id}"]`);
+                const updated = rows.get(id);
+                if (current && updated) {
+                    current.replaceWith(updated);
+                } else if (current) {
+                    current.remove(); // nie pasuje już do filtrów
+                } else if (updated && filters.dataset.order === 'asc') {
+                    // Najstarsze na górze - nowe dopisujemy tylko, gdy lista jest wczytana do końca
+                    if (loadMoreBtn.hidden) tbody.append(updated);
+                } else if (updated) {
+                    tbody.prepend(updated);
+                }
+                if (updated && updated.isConnected) updated.classList.add('live-updated');
+            });
+        } catch (error) {
+            console.error("Błąd odświeżania zamówień:", error);
+        }
+    }
+
+    document.addEventListener('sklep:order', event => {
+        changedIds.add(event.detail.id);
+        if (!refreshTimer) refreshTimer = setTimeout(refreshRows, 300);
+    });
+
+    // Zdarzenia przepadły (live.js: reset) - pierwsza strona od nowa, z bieżącymi filtrami
+    document.addEventListener('sklep:resync', () => loadOrders(null, true));
+});
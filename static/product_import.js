@@ -0,0 +1,40 @@
+// --- PANEL ADMINA: IMPORT KATALOGU ---
+// Formularz wysyłany fetch-em, żeby podsumowanie (ile dodano / zmieniono, błędy wierszy)
+// pokazać w panelu zamiast surowego JSON-a. Bez JS formularz dalej działa zwykłym POST-em.
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('catalog-import-form');
+    const resultBox = document.getElementById('catalog-import-result');
+    if (!form || !resultBox) return;
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    form.addEventListener('submit', async event => {
+        event.preventDefault();
+        const button = form.querySelector('button[type="submit"]');
+        button.disabled = true;
+        resultBox.textContent = 'Importowanie...';
+
+        try {
+            const response = await fetch(form.action, { method: 'POST', body: new FormData(form) });
+            const data = await response.json();
+            if (!response.ok) {
+                resultBox.innerHTML = `<strong>Błąd:</strong> ${escapeHtml(data.error || String(data))}`;
+                return;
+            }
+            const prefix = data.dry_run ? 'Sprawdzono (bez zapisu): ' : '';
+            const errors = data.errors.map(e => `<li>linia ${e.line}: ${escapeHtml(e.message)}</li>`).join('');
+            const more = data.failed > data.errors.length ? `<li>... i ${data.failed - data.errors.length} więcej</li>` : '';
+            resultBox.innerHTML = `${prefix}nowe: <strong>${data.inserted}</strong>, zmienione: <strong>${data.updated}</strong>, `
+                + `błędne wiersze: <strong>${data.failed}</strong>`
+                + (errors ? `<ul>${errors}${more}</ul>` : '');
+        } catch (err) {
+            resultBox.textContent = 'Nie udało się wysłać pliku.';
+        } finally {
+            button.disabled = false;
+        }
+    });
+});
@@ -113,11 +113,8 @@ if (togglePassword && passwordInput) {
         const ids = cart.map(item => item.id);
         
         try {
-            const response = await fetch('/api/products-details', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(ids)
-            });
+            // GET z ETagiem - przy odświeżeniu koszyka przeglądarka dostaje 304 zamiast danych
+            const response = await fetch(`/api/products-details?ids=${ids.join(',')}`);
             const products = await response.json();
 
             cartTableBody.innerHTML = '';
@@ -263,8 +260,15 @@ if (togglePassword && passwordInput) {
         }
     }
 
+    // Zmiana filtrów/sortowania zaczyna listę od pierwszej strony
+    function resetPaging(urlParams) {
+        urlParams.delete('page');
+        urlParams.delete('cursor');
+    }
+
     function applyAllFilters() {
         const urlParams = new URLSearchParams(window.location.search);
+        resetPaging(urlParams);
         
         const min = document.getElementById('price-min').value;
         const max = document.getElementById('price-max').value;
@@ -302,6 +306,7 @@ if (togglePassword && passwordInput) {
             urlParams.delete('price_min');
             urlParams.delete('price_max');
             urlParams.delete('sort');
+            resetPaging(urlParams);
             window.location.search = urlParams.toString();
         });
     }
@@ -309,6 +314,7 @@ if (togglePassword && passwordInput) {
     function performSearch() {
         const query = searchInput.value.trim();
         const urlParams = new URLSearchParams(window.location.search);
+        resetPaging(urlParams);
         
         if (query) {
             urlParams.set('search', query);
@@ -331,6 +337,70 @@ if (togglePassword && passwordInput) {
         });
     }
 
+    // --- PODPOWIEDZI WYSZUKIWANIA (TYPEAHEAD) ---
+    if (searchInput) {
+        const searchBar = searchInput.closest('.search-bar');
+        const suggestionsBox = document.createElement('ul');
+        suggestionsBox.className = 'search-suggestions';
+        searchBar.appendChild(suggestionsBox);
+
+        let suggestTimer = null;
+        let lastQuery = '';
+
+        function hideSuggestions() {
+            suggestionsBox.innerHTML = '';
+            suggestionsBox.classList.remove('active');
+        }
+
+        searchInput.addEventListener('input', () => {
+            clearTimeout(suggestTimer);
+            const query = searchInput.value.trim();
+            if (query.length < 2) {
+                hideSuggestions();
+                return;
+            }
+            // Czekamy chwilę, aż użytkownik przestanie pisać
+            suggestTimer = setTimeout(async () => {
+                lastQuery = query;
+                try {
+                    const response = await fetch(`/api/search/suggest?q=${encodeURIComponent(query)}`);
+                    const suggestions = await response.json();
+                    if (query !== lastQuery) return;
+
+                    if (suggestions.length === 0) {
+                        hideSuggestions();
+                        return;
+                    }
+                    // Węzły zamiast innerHTML - nazwa i adres zdjęcia pochodzą z edycji/importu produktów
+                    suggestionsBox.replaceChildren(...suggestions.map(p => {
+                        const link = document.createElement('a');
+                        link.href = `/szczegoly.html?id=${encodeURIComponent(p.id)}`;
+                        const img = document.createElement('img');
+                        img.src = p.image || 'https://placehold.co/40x30';
+                        img.alt = '';
+                        const name = document.createElement('span');
+                        name.className = 'suggestion-name';
+                        name.textContent = p.name;
+                        const price = document.createElement('span');
+                        price.className = 'suggestion-price';
+                        price.textContent = `${p.price} zł`;
+                        link.append(img, name, price);
+                        const li = document.createElement('li');
+                        li.append(link);
+                        return li;
+                    }));
+                    suggestionsBox.classList.add('active');
+                } catch (error) {
+                    console.error("Błąd podpowiedzi:", error);
+                }
+            }, 200);
+        });
+
+        document.addEventListener('click', (e) => {
+            if (!searchBar.contains(e.target)) hideSuggestions();
+        });
+    }
+
     // --- 10. OBSŁUGA ILOŚCI NA STRONIE SZCZEGÓŁÓW (NOWOŚĆ) ---
     // Ten kod działa TYLKO na stronie szczegoly.html, gdzie jest .purchase-section
     const detailQtyControl = document.querySelector('.purchase-section .qty-control');